@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Run a fleet controller against hundreds of simulated agents and inject correlated failures.
+
+Agents run as threads spread over several worker processes, each with its
+own simulated /proc and fake service manager (see heal_bench.py). Waves of
+failures hit a share of the fleet at once; the report shows how many
+model calls the controller made per host failure and how long hosts took
+to be detected and healed.
+
+Usage: python3 benchmarks/fleet_bench.py [--agents 200] [--processes 8] [--duration 30]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import healing_daemon
+from heal_bench import FakeProc, FakeServiceManager, StubMessagesAPI, summarize
+from diagnosis_client import DiagnosisClient
+from fleet import FleetAgent, FleetController
+from rules import RuleEngine
+
+SERVICES = {"ssh": "sshd", "apache2": "apache2"}
+
+
+def run_agents(hosts, address, root, args, schedule_queue, stop, results):
+    """Worker process: one agent thread per simulated host, then apply the fault schedule to them"""
+    logging.getLogger().handlers = [logging.StreamHandler(sys.stderr)]
+    logging.getLogger("self-healing").setLevel(logging.ERROR)
+    random.seed(args.seed)
+
+    procs, agents = {}, []
+    for host in hosts:
+        proc = procs[host] = FakeProc(os.path.join(root, host))
+        for i in range(args.background):
+            proc.spawn(f"worker{i}", 2048)
+        for process_name in SERVICES.values():
+            proc.spawn(process_name, 8192)
+        manager = FakeServiceManager(proc, SERVICES, args.start_delay)
+        agent = FleetAgent(address, host, SERVICES, proc_root=proc.root, interval=args.interval,
+                           dns_interval=0, run=manager.run)
+        agents.append(agent)
+        threading.Thread(target=agent.run, daemon=True).start()
+
+    injections = []
+    for at, target, chosen in schedule_queue.get():
+        if stop.wait(max(at - time.time(), 0)):
+            break
+        for host in chosen:
+            proc = procs.get(host)
+            if proc is None:
+                continue
+            if target == "memory":
+                if proc.pids("leaky-worker"):
+                    continue
+                proc.spawn("leaky-worker", int(proc.total_kb * (98 - proc.used_percent()) / 100))
+            else:
+                pids = proc.pids(SERVICES[target])
+                if not pids:
+                    continue
+                for pid in pids:
+                    proc.kill(pid)
+            injections.append((host, target, time.time()))
+
+    stop.wait()
+    for agent in agents:
+        agent.stop()
+    results.put(injections)
+
+
+def build_schedule(args, hosts, start):
+    """Waves of failures: each wave hits one target on a random share of the fleet"""
+    rng = random.Random(args.seed)
+    schedule = []
+    at = args.wave_interval
+    while at < args.duration:
+        target = rng.choice(list(SERVICES) + ["memory"])
+        share = args.memory_blast if target == "memory" else args.blast
+        chosen = rng.sample(hosts, max(1, int(len(hosts) * share)))
+        schedule.append((start + at, target, chosen))
+        at += args.wave_interval
+    return schedule
+
+
+def match_injections(injections, history):
+    """Pair each injected fault with the controller's record of the failure it caused"""
+    closed = {}
+    for record in history:
+        closed.setdefault((record['host'], record['target']), []).append(record)
+
+    detection, heal, unhealed = [], [], 0
+    for host, target, injected_at in injections:
+        records = [r for r in closed.get((host, target), [])
+                   if r['closed_at'] >= injected_at and (r['detected_at'] or 0) >= injected_at - 0.5]
+        if not records:
+            unhealed += 1
+            continue
+        record = min(records, key=lambda r: r['closed_at'])
+        closed[(host, target)].remove(record)
+        if record['detected_at']:
+            detection.append((record['detected_at'] - injected_at) * 1000)
+        if record['healed']:
+            heal.append((record['closed_at'] - injected_at) * 1000)
+        else:
+            unhealed += 1
+    return detection, heal, unhealed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=8, help="worker processes hosting the agents")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of fault injection")
+    parser.add_argument("--drain", type=float, default=20, help="seconds to wait for open failures to heal")
+    parser.add_argument("--interval", type=float, default=1.0, help="agent report interval in seconds")
+    parser.add_argument("--wave-interval", type=float, default=5.0, help="seconds between failure waves")
+    parser.add_argument("--blast", type=float, default=0.3, help="share of hosts hit by a service wave")
+    parser.add_argument("--memory-blast", type=float, default=0.05, help="share of hosts hit by a memory wave")
+    parser.add_argument("--window", type=float, default=2.0, help="controller correlation window in seconds")
+    parser.add_argument("--background", type=int, default=20, help="idle simulated processes per host")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub API latency in seconds")
+    parser.add_argument("--start-delay", type=float, default=0.05, help="seconds a service start takes")
+    parser.add_argument("--no-rules", action="store_true", help="send every service failure to the model")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.getLogger().handlers = [logging.StreamHandler(sys.stderr)]
+    logging.getLogger("self-healing").setLevel(logging.WARNING)
+    state_dir = tempfile.mkdtemp(prefix="fleet-bench-")
+    stub = StubMessagesAPI(args.llm_latency)
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    results = ctx.Queue()
+    workers = []
+    try:
+        diagnoser = healing_daemon.SelfHealingDaemon(api_key="bench", state_dir=state_dir)
+        diagnoser.diagnosis_client = DiagnosisClient("bench", stub.url, read_timeout=5, backoff=0.05)
+        if args.no_rules:
+            diagnoser.rule_engine = RuleEngine([])
+
+        controller = FleetController(diagnoser, ("127.0.0.1", 0), correlation_window=args.window,
+                                     retry_delay=max(args.interval * 3, 1))
+        controller.start()
+        loop_cpu = {}
+
+        def serve():
+            start = time.thread_time()
+            controller.serve_forever()
+            loop_cpu['seconds'] = time.thread_time() - start
+
+        loop = threading.Thread(target=serve, daemon=True)
+        loop.start()
+
+        hosts = [f"node{i:04d}" for i in range(args.agents)]
+        schedule_queues = []
+        for n in range(args.processes):
+            schedule_queue = ctx.Queue()
+            worker = ctx.Process(target=run_agents, args=(hosts[n::args.processes], controller.address, state_dir,
+                                                          args, schedule_queue, stop, results))
+            worker.start()
+            workers.append(worker)
+            schedule_queues.append(schedule_queue)
+
+        deadline = time.time() + 60
+        while len(controller.connections) < args.agents and time.time() < deadline:
+            time.sleep(0.2)
+        connected = len(controller.connections)
+
+        started = time.time()
+        cpu_start = time.process_time()
+        reports_start = controller.counts['reports']
+        schedule = build_schedule(args, hosts, started)
+        for schedule_queue in schedule_queues:
+            schedule_queue.put(schedule)
+
+        time.sleep(args.duration)
+        deadline = time.time() + args.drain
+        while controller.failing and time.time() < deadline:
+            time.sleep(0.2)
+        elapsed = time.time() - started
+
+        stop.set()
+        injections = []
+        for _ in workers:
+            injections.extend(results.get(timeout=30))
+        controller.stop()
+        loop.join(timeout=5)
+
+        detection, heal, unhealed = match_injections(injections, list(controller.history))
+        diagnoses = sum(controller.counts['diagnoses'].values())
+        output = {
+            "config": vars(args),
+            "agents_connected": connected,
+            "reports_per_s": round((controller.counts['reports'] - reports_start) / elapsed, 1),
+            "controller_loop_cpu_s": round(loop_cpu.get('seconds', 0), 3),
+            "process_cpu_s": round(time.process_time() - cpu_start, 3),
+            "host_failures": len(injections),
+            "failure_groups": controller.counts['groups'],
+            "diagnoses": controller.counts['diagnoses'],
+            "model_calls": stub.requests,
+            "host_failures_per_diagnosis": round(len(injections) / diagnoses, 2) if diagnoses else None,
+            "remediations": controller.counts['remediations'],
+            "detection_latency_ms": summarize(detection),
+            "time_to_heal_ms": summarize(heal),
+            "unhealed": unhealed,
+            "gave_up": controller.counts['gave_up'],
+        }
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        stub.close()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""Drive SelfHealingDaemon against injected failures and report how fast it heals.
+
+Runs the real probes, rules, cache, diagnosis client and remediation code
+against a simulated /proc, a fake service manager standing in for
+`service`/`kill`, and a local stub of the messages API. Service crashes and
+memory hogs are injected at a controlled rate; detection latency, time to
+heal, per-probe CPU cost and memory footprint are printed as JSON. With
+--crash-loop, some services die shortly after every start instead, to
+show how often the daemon retries them before its circuit breaker opens.
+
+Usage: python3 benchmarks/heal_bench.py [--duration 20] [--fault-rate 0.5]
+       [--baseline results.json] [--output results.json]
+"""
+
+import argparse
+import copy
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import healing_daemon
+from cgroup_memory import CgroupMemory
+from diagnosis_client import DiagnosisClient
+from kmsg import KernelLogTailer
+from proc_scanner import PAGE_KB
+from rules import RuleEngine
+from service_config import DEFAULT_CONFIG
+
+
+class FakeProc:
+    """A minimal /proc: meminfo plus comm, cmdline, statm and cgroup for each simulated process"""
+
+    def __init__(self, root, total_kb=8 * 1024 * 1024, base_used_percent=50):
+        self.root = root
+        self.total_kb = total_kb
+        self.base_used_kb = total_kb * base_used_percent // 100
+        self.processes = {}  # pid -> (comm, rss_kb)
+        self.next_pid = 200000  # well clear of the harness's own PID
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._write_meminfo()
+
+    def _write_meminfo(self):
+        used_kb = self.base_used_kb + sum(rss_kb for _, rss_kb in self.processes.values())
+        available_kb = max(self.total_kb - used_kb, 0)
+        tmp_path = os.path.join(self.root, ".meminfo")
+        with open(tmp_path, "w") as f:
+            f.write(f"MemTotal: {self.total_kb} kB\nMemFree: {available_kb} kB\nMemAvailable: {available_kb} kB\n")
+        os.replace(tmp_path, os.path.join(self.root, "meminfo"))
+
+    def spawn(self, comm, rss_kb=4096, cmdline=None):
+        """Add a process; its directory appears atomically so scans never see half of it"""
+        with self.lock:
+            pid = self.next_pid
+            self.next_pid += 1
+            tmp_dir = os.path.join(self.root, f".{pid}")
+            os.mkdir(tmp_dir)
+            files = {
+                "comm": f"{comm}\n",
+                "cmdline": "\0".join(cmdline or [f"/usr/sbin/{comm}"]) + "\0",
+                "statm": f"{rss_kb // PAGE_KB * 2} {rss_kb // PAGE_KB} 0 0 0 0 0\n",
+                "cgroup": f"0::/system.slice/{comm}.service\n",
+            }
+            for name, content in files.items():
+                with open(os.path.join(tmp_dir, name), "w") as f:
+                    f.write(content)
+            os.rename(tmp_dir, os.path.join(self.root, str(pid)))
+            self.processes[pid] = (comm, rss_kb)
+            self._write_meminfo()
+            return pid
+
+    def kill(self, pid):
+        with self.lock:
+            if pid not in self.processes:
+                return False
+            del self.processes[pid]
+            doomed = os.path.join(self.root, f".dead-{pid}")
+            os.rename(os.path.join(self.root, str(pid)), doomed)
+            shutil.rmtree(doomed)
+            self._write_meminfo()
+            return True
+
+    def pids(self, comm):
+        with self.lock:
+            return [pid for pid, (name, _) in self.processes.items() if name == comm]
+
+    def used_percent(self):
+        with self.lock:
+            used_kb = self.base_used_kb + sum(rss_kb for _, rss_kb in self.processes.values())
+        return used_kb * 100 / self.total_kb
+
+
+class FakeServiceManager:
+    """Stands in for the `service` and `kill` commands the daemon runs, acting on a FakeProc"""
+
+    def __init__(self, proc, service_processes, start_delay=0.0, start_failure_rate=0.0, crash_after=None):
+        self.proc = proc
+        self.service_processes = service_processes
+        self.start_delay = start_delay
+        self.start_failure_rate = start_failure_rate
+        self.crash_after = crash_after or {}  # service -> seconds its process lives after each start
+        self.calls = {}
+        self.starts = {}
+        self.lock = threading.Lock()
+
+    def run(self, args, check=False, **kwargs):
+        with self.lock:
+            self.calls[args[0]] = self.calls.get(args[0], 0) + 1
+        returncode, stderr = 0, ""
+
+        if args[0] == "service" and len(args) == 3:
+            service, action = args[1], args[2]
+            process_name = self.service_processes.get(service, service)
+            if action in ("start", "restart"):
+                time.sleep(self.start_delay)
+                if random.random() < self.start_failure_rate:
+                    returncode, stderr = 1, f"Job for {service}.service failed\n"
+                else:
+                    if action == "restart":
+                        for pid in self.proc.pids(process_name):
+                            self.proc.kill(pid)
+                    if not self.proc.pids(process_name):
+                        pid = self.proc.spawn(process_name)
+                        if service in self.crash_after:
+                            crash = threading.Timer(self.crash_after[service], self.proc.kill, (pid,))
+                            crash.daemon = True
+                            crash.start()
+                    with self.lock:
+                        self.starts[service] = self.starts.get(service, 0) + 1
+            elif action == "stop":
+                for pid in self.proc.pids(process_name):
+                    self.proc.kill(pid)
+            else:
+                returncode, stderr = 1, f"Unknown action {action}\n"
+        elif args[0] == "kill":
+            if not self.proc.kill(int(args[-1])):
+                returncode, stderr = 1, f"kill: ({args[-1]}) - No such process\n"
+        else:
+            returncode, stderr = 127, f"{args[0]}: not simulated\n"
+
+        if check and returncode:
+            raise subprocess.CalledProcessError(returncode, args, "", stderr)
+        return subprocess.CompletedProcess(args, returncode, "", stderr)
+
+
+def stub_reply(prompt):
+    """Answer like a sensible model would, in the format each diagnosis prompt asks for"""
+    if "Top Memory-Consuming Processes" in prompt:
+        table = prompt.split("Top Memory-Consuming Processes:", 1)[1].strip().splitlines()[1:]
+        victims = [row.split()[0] for row in table if len(row.split()) > 2 and row.split()[2] == "expendable"]
+        if victims:
+            return (f"DIAGNOSIS: PID {victims[0]} is using most of the memory\n"
+                    f"ACTIONS:\n- kill {victims[0]}\n"
+                    "EXPLANATION: It is the largest expendable process. Killing it releases its resident memory "
+                    "at once, and no essential or protected workload depends on it.")
+        return "DIAGNOSIS: Only essential processes are large\nACTIONS: none\nEXPLANATION: Nothing safe to kill"
+    services = [line.split(":", 1)[1].strip() for line in prompt.splitlines() if line.startswith("SERVICE: ")]
+    if len(services) > 1:
+        return "\n\n".join(f"SERVICE: {service}\nDIAGNOSIS: The {service} process is not running\n"
+                           "COMMAND: start\nEXPLANATION: Starting the service brings its process back. The logs "
+                           "show a clean exit rather than a configuration error, so a plain start should hold."
+                           for service in services)
+    if services:
+        return ("DIAGNOSIS: The service process is not running\nCOMMAND: start\n"
+                "EXPLANATION: Starting the service brings its process back. The logs show a clean exit "
+                "rather than a configuration error, so a plain start should hold.")
+    return ("DIAGNOSIS: resolv.conf has no working nameserver\nCOMMAND: check_resolv\n"
+            "EXPLANATION: Resetting resolv.conf restores resolution")
+
+
+class StubMessagesAPI:
+    """Local stand-in for the messages API with configurable latency, output speed and overload errors.
+
+    latency is the time to the first token; the reply is then generated at
+    output_rate characters per second (instantly if None) and, for requests
+    with "stream": true, sent as server-sent events while it is generated.
+    """
+
+    def __init__(self, latency=0.2, error_rate=0.0, output_rate=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.output_rate = output_rate
+        self.requests = 0
+        self.errors = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Streams go out chunked, as the real API sends them
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                prompt = body["messages"][0]["content"]
+                stub.requests += 1
+                time.sleep(stub.latency)
+                if random.random() < stub.error_rate:
+                    stub.errors += 1
+                    self._reply(529, {"type": "error", "error": {"type": "overloaded_error"}})
+                    return
+                text = stub_reply(prompt)
+                usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4}
+                if body.get("stream"):
+                    self._stream(text, usage)
+                    return
+                if stub.output_rate:
+                    time.sleep(len(text) / stub.output_rate)
+                self._reply(200, {"content": [{"type": "text", "text": text}], "usage": usage})
+
+            def _stream(self, text, usage, chunk_chars=16):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                self._event("message_start", {"message": {"usage": {"input_tokens": usage["input_tokens"]}}})
+                for i in range(0, len(text), chunk_chars):
+                    chunk = text[i:i + chunk_chars]
+                    if stub.output_rate:
+                        time.sleep(len(chunk) / stub.output_rate)
+                    self._event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": chunk}})
+                self._event("message_delta", {"usage": {"output_tokens": usage["output_tokens"]}})
+                self._event("message_stop", {})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _event(self, kind, payload):
+                data = f"event: {kind}\ndata: {json.dumps(dict(payload, type=kind))}\n\n".encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/messages"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+class FaultTracker:
+    """Times each injected fault from injection to first detection and to a successful heal"""
+
+    def __init__(self):
+        self.open = {}  # target -> {'injected': t, 'detected': t or None}
+        self.detection = []
+        self.heal = []
+        self.heal_by_kind = {}
+        self.injected = 0
+        self.lock = threading.Lock()
+
+    def inject(self, target):
+        with self.lock:
+            if target in self.open:
+                return False
+            self.open[target] = {'injected': time.monotonic(), 'detected': None}
+            self.injected += 1
+            return True
+
+    def detected(self, target):
+        with self.lock:
+            fault = self.open.get(target)
+            if fault and fault['detected'] is None:
+                fault['detected'] = time.monotonic()
+                self.detection.append((fault['detected'] - fault['injected']) * 1000)
+
+    def healed(self, kind, target, success):
+        with self.lock:
+            fault = self.open.get(target)
+            if success and fault:
+                self.heal.append((time.monotonic() - fault['injected']) * 1000)
+                self.heal_by_kind.setdefault(kind, []).append(self.heal[-1])
+                del self.open[target]
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "max": None}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": round(values[len(values) // 2], 3),
+        "p95": round(values[min(int(len(values) * 0.95), len(values) - 1)], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_KB
+
+
+def timed(func, samples):
+    """Wrap a probe so each run's CPU time (on its worker thread) is recorded in ms"""
+    def run():
+        start = time.thread_time()
+        try:
+            return func()
+        finally:
+            samples.append((time.thread_time() - start) * 1000)
+    return run
+
+
+def write_config(args, state_dir):
+    """Service config for the run: the shipped defaults, or N simulated services, logging into state_dir"""
+    if args.services:
+        services = {f"svc{i:02d}": {"probe": {"type": "process", "name": f"svc{i:02d}d"}}
+                    for i in range(args.services)}
+    else:
+        services = copy.deepcopy(DEFAULT_CONFIG["services"])
+    for service, spec in services.items():
+        log_path = os.path.join(state_dir, f"{service}.log")
+        with open(log_path, "w") as f:
+            f.writelines(f"{service}[{1000 + i}]: worker {i} ready\n" for i in range(50))
+        spec["logs"] = [log_path]
+        spec["interval"] = args.interval
+        spec.pop("pidfile", None)
+    config_path = os.path.join(state_dir, "services.json")
+    with open(config_path, "w") as f:
+        json.dump({"services": services}, f)
+    return config_path
+
+
+def build_daemon(args, state_dir, proc, stub):
+    daemon = healing_daemon.SelfHealingDaemon(api_key="bench", auto_fix=True, state_dir=state_dir,
+                                              proc_root=proc.root, config_path=write_config(args, state_dir))
+    daemon.diagnosis_client = DiagnosisClient("bench", stub.url, read_timeout=5, backoff=0.05,
+                                              stream=not args.no_stream)
+    # No /dev/kmsg in a simulation
+    daemon.kernel_log = KernelLogTailer(path=os.path.join(state_dir, "kmsg"),
+                                        cursor_path=os.path.join(state_dir, "kmsg.cursor"))
+    # No cgroup v2 hierarchy either; memory is attributed per process only
+    daemon.cgroup_memory = CgroupMemory(os.path.join(state_dir, "cgroup"))
+    if args.no_rules:
+        daemon.rule_engine = RuleEngine([])
+    if args.no_cache:
+        daemon.diagnosis_cache.max_entries = 0
+    # Crash-loop timings scaled from minutes to the simulation's probe interval
+    guard = daemon.crash_loops
+    guard.window, guard.base_delay, guard.max_delay = args.interval * 120, args.interval * 2, args.interval * 20
+    guard.cooldown, guard.stable_after = args.interval * 40, args.interval * 4
+    # The PSI trigger and pidfd watcher need real processes; detection here is by probe only
+    return daemon
+
+
+def inject_faults(args, proc, daemon, tracker, stop, healthy):
+    """Crash random services or start a memory hog, fault_rate times per second on average"""
+    targets = healthy + ["memory"]
+    # A hog big enough to push usage past the detector's hard limit
+    hog_kb = int(proc.total_kb * (args.hog_percent - proc.used_percent()) / 100)
+    while not stop.wait(random.expovariate(args.fault_rate)):
+        target = random.choice(targets)
+        if target == "memory":
+            if tracker.inject(target):
+                proc.spawn("leaky-worker", hog_kb, ["/usr/bin/python3", "leaky_worker.py"])
+            continue
+        # A burst takes down several services at once, as a shared dependency failing would
+        for service in random.sample(healthy, min(args.burst, len(healthy))):
+            if not tracker.inject(service):
+                continue  # the last fault on this service has not healed yet
+            for pid in proc.pids(daemon.service_processes.get(service, service)):
+                proc.kill(pid)
+
+
+def compare(results, baseline, tolerance):
+    """Return the metrics that got worse than baseline by more than tolerance"""
+    checks = [
+        ("detection_latency_ms.p95", results["detection_latency_ms"]["p95"],
+         baseline["detection_latency_ms"]["p95"]),
+        ("time_to_heal_ms.p95", results["time_to_heal_ms"]["p95"], baseline["time_to_heal_ms"]["p95"]),
+        ("memory_kb.rss_end", results["memory_kb"]["rss_end"], baseline["memory_kb"]["rss_end"]),
+    ]
+    for probe, summary in results["tick_cpu_ms"].items():
+        if probe in baseline["tick_cpu_ms"]:
+            checks.append((f"tick_cpu_ms.{probe}.p50", summary["p50"], baseline["tick_cpu_ms"][probe]["p50"]))
+
+    regressions = []
+    for name, value, reference in checks:
+        if value is not None and reference and value > reference * (1 + tolerance):
+            regressions.append({"metric": name, "value": value, "baseline": reference})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20, help="seconds of fault injection")
+    parser.add_argument("--drain", type=float, default=10, help="seconds to wait for open faults to heal")
+    parser.add_argument("--fault-rate", type=float, default=0.5, help="faults injected per second")
+    parser.add_argument("--interval", type=float, default=0.25, help="probe interval in seconds")
+    parser.add_argument("--services", type=int, default=0, help="simulate N services instead of the daemon's own")
+    parser.add_argument("--burst", type=int, default=1, help="services taken down by each service fault")
+    parser.add_argument("--background", type=int, default=200, help="idle simulated processes")
+    parser.add_argument("--hog-percent", type=float, default=98, help="memory used while a hog runs")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub API latency in seconds")
+    parser.add_argument("--llm-output-rate", type=float, default=300,
+                        help="stub API output speed in characters per second")
+    parser.add_argument("--no-stream", action="store_true", help="wait for whole replies instead of streaming")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of stub API calls that fail")
+    parser.add_argument("--start-delay", type=float, default=0.05, help="seconds a service start takes")
+    parser.add_argument("--start-failure-rate", type=float, default=0.0)
+    parser.add_argument("--crash-loop", type=int, default=0, help="services that die shortly after every start")
+    parser.add_argument("--crash-after", type=float, default=0.5, help="seconds a crash-looping service lives")
+    parser.add_argument("--no-rules", action="store_true", help="send every service failure to the model")
+    parser.add_argument("--no-cache", action="store_true", help="disable the diagnosis cache")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results file to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # Keep stdout for the JSON results
+    logging.getLogger().handlers = [logging.StreamHandler(sys.stderr)]
+    logging.getLogger("self-healing").setLevel(logging.WARNING)
+    state_dir = tempfile.mkdtemp(prefix="heal-bench-")
+    stub = StubMessagesAPI(args.llm_latency, args.llm_error_rate, args.llm_output_rate)
+    try:
+        proc = FakeProc(os.path.join(state_dir, "proc"))
+        for i in range(args.background):
+            proc.spawn(f"worker{i % 20}", 2048)
+        daemon = build_daemon(args, state_dir, proc, stub)
+        for service in daemon.monitored_services:
+            proc.spawn(daemon.service_processes.get(service, service), 8192)
+
+        # Crash-looping services never heal, so they are kept out of the fault tracking
+        crash_looping = daemon.monitored_services[:args.crash_loop]
+        healthy = daemon.monitored_services[args.crash_loop:]
+        manager = FakeServiceManager(proc, daemon.service_processes, args.start_delay, args.start_failure_rate,
+                                     {service: args.crash_after for service in crash_looping})
+        healing_daemon.run_command = manager.run
+        for service in crash_looping:
+            for pid in proc.pids(daemon.service_processes.get(service, service)):
+                proc.kill(pid)
+
+        tracker = FaultTracker()
+        mark_failure, record_heal = daemon.mark_failure, daemon.record_heal
+
+        def on_failure(target):
+            tracker.detected(target)
+            mark_failure(target)
+
+        def on_heal(kind, target, success):
+            tracker.healed(kind, target, success)
+            record_heal(kind, target, success)
+
+        daemon.mark_failure, daemon.record_heal = on_failure, on_heal
+
+        cpu = {"services": [], "memory": [], "status": [], "timeseries": []}
+        daemon.scheduler.every("services", args.interval, timed(daemon.check_services, cpu["services"]))
+        daemon.scheduler.every("memory", args.interval, timed(daemon.check_memory, cpu["memory"]))
+        daemon.scheduler.every("status", args.interval, timed(daemon.save_status, cpu["status"]))
+        daemon.scheduler.every("timeseries", args.interval, timed(daemon.record_timeseries, cpu["timeseries"]))
+
+        rss_start = rss_kb()
+        loop = threading.Thread(target=daemon.scheduler.run_forever, daemon=True)
+        loop.start()
+
+        stop_injecting = threading.Event()
+        injector = threading.Thread(target=inject_faults, args=(args, proc, daemon, tracker, stop_injecting, healthy),
+                                    daemon=True)
+        injector.start()
+        time.sleep(args.duration)
+        stop_injecting.set()
+        injector.join()
+
+        deadline = time.monotonic() + args.drain
+        while tracker.open and time.monotonic() < deadline:
+            time.sleep(0.1)
+        daemon.scheduler.stop()
+        loop.join(timeout=5)
+
+        results = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+            "services": len(daemon.monitored_services),
+            "faults": {
+                "injected": tracker.injected,
+                "detected": len(tracker.detection),
+                "healed": len(tracker.heal),
+                "unhealed": sorted(tracker.open),
+            },
+            "detection_latency_ms": summarize(tracker.detection),
+            "time_to_heal_ms": summarize(tracker.heal),
+            "time_to_heal_ms_by_kind": {kind: summarize(samples) for kind, samples in tracker.heal_by_kind.items()},
+            "tick_cpu_ms": {probe: summarize(samples) for probe, samples in cpu.items()},
+            "memory_kb": {
+                "rss_start": rss_start,
+                "rss_end": rss_kb(),
+                "rss_peak": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            },
+            "llm": {"requests": stub.requests, "injected_errors": stub.errors,
+                    "latency": daemon.diagnosis_client.latency_report()},
+            "commands": manager.calls,
+            "rules": daemon.rule_engine.stats(),
+            "diagnosis_cache": daemon.diagnosis_cache.stats(),
+            "crash_loops": {service: dict(stats, starts=manager.starts.get(service, 0))
+                            for service, stats in daemon.crash_loops.stats().items()},
+        }
+    finally:
+        stub.close()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    # Worker threads may still be parked in the pool; do not wait for them
+    sys.stdout.flush()
+    os._exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Compare per-service pgrep forks against a single /proc snapshot per tick.
+
+Usage: python3 benchmarks/proc_scan_bench.py [--services 60] [--ticks 20]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proc_scanner import ProcessTable
+
+
+def pgrep_tick(names):
+    """The old monitor_services loop: one pgrep fork per service"""
+    forks = 0
+    for name in names:
+        subprocess.run(["pgrep", name], capture_output=True, text=True, check=False)
+        forks += 1
+    return forks
+
+
+def snapshot_tick(table, names):
+    """One /proc walk answers every service"""
+    table.refresh()
+    for name in names:
+        table.is_running(name)
+    return 0
+
+
+def measure(tick, ticks):
+    durations = []
+    forks = 0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        forks += tick()
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return {
+        "forks_per_tick": forks / ticks,
+        "tick_ms_p50": durations[len(durations) // 2] * 1000,
+        "tick_ms_max": durations[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--services", type=int, default=60)
+    parser.add_argument("--ticks", type=int, default=20)
+    args = parser.parse_args()
+
+    # Mix real process names with names that will not match, like a real host
+    table = ProcessTable().refresh()
+    present = sorted(table.by_name)[:args.services // 2]
+    names = present + [f"missing-service-{i}" for i in range(args.services - len(present))]
+
+    results = {
+        "services": len(names),
+        "processes": table.pid_count,
+        "snapshot": measure(lambda: snapshot_tick(table, names), args.ticks),
+    }
+    if shutil.which("pgrep"):
+        results["pgrep"] = measure(lambda: pgrep_tick(names), args.ticks)
+    else:
+        results["pgrep"] = None
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
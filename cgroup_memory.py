@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import errno
+import heapq
+import logging
+import os
+import threading
+
+from memory_pressure import read_psi
+from proc_scanner import _read_text
+
+logger = logging.getLogger("self-healing")
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+MEMORY_EVENTS = ("high", "max", "oom", "oom_kill")
+
+
+def parse_flat_keyed(content):
+    """Parse a flat-keyed cgroup file (memory.stat, memory.events) into a dict of ints"""
+    values = {}
+    for line in (content or "").splitlines():
+        key, _, value = line.partition(" ")
+        try:
+            values[key] = int(value)
+        except ValueError:
+            continue
+    return values
+
+
+def parse_limit(content):
+    """A memory.high / memory.max value in kB, or None for "max" (no limit)"""
+    content = (content or "").strip()
+    if not content or content == "max":
+        return None
+    return int(content) // 1024
+
+
+class CgroupMemory:
+    """Per-cgroup memory accounting and targeted reclaim on the unified (v2) hierarchy.
+
+    collect ranks the leaf cgroups (services, scopes, containers) by
+    memory.current and reads memory.stat, memory.events and memory.pressure
+    for the ones that make the ranking, so the daemon can tell which
+    workload drives host-wide pressure. reclaim and throttle relieve that
+    pressure without killing anything: the first asks the kernel to reclaim
+    from one cgroup through memory.reclaim, the second lowers its
+    memory.high. Throttles are remembered and undone by release_throttles.
+    """
+
+    def __init__(self, root=CGROUP_ROOT, max_depth=3):
+        self.root = root
+        self.max_depth = max_depth
+        self.throttled = {}  # cgroup path -> memory.high before it was lowered
+        self.lock = threading.Lock()
+
+    def available(self):
+        return os.path.exists(os.path.join(self.root, "cgroup.controllers"))
+
+    def resolve(self, path):
+        """Directory of a cgroup path like /system.slice/foo.service; None if it is outside the hierarchy"""
+        relative = os.path.normpath("/" + path.strip()).lstrip("/")
+        if not relative or relative == "." or relative.startswith(".."):
+            return None
+        directory = os.path.join(self.root, relative)
+        if not os.path.exists(os.path.join(directory, "memory.current")):
+            return None
+        return directory
+
+    def _leaves(self):
+        """(current_kb, path) for every leaf cgroup down to max_depth"""
+        leaves = []
+        stack = [("", 0)]
+        while stack:
+            path, depth = stack.pop()
+            children = []
+            if depth < self.max_depth:
+                try:
+                    with os.scandir(os.path.join(self.root, path.lstrip("/"))) as entries:
+                        children = [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+                except OSError:
+                    continue
+            if children:
+                stack.extend((f"{path}/{child}", depth + 1) for child in children)
+            elif path:
+                current = _read_text(os.path.join(self.root, path.lstrip("/"), "memory.current"))
+                if current and current.strip().isdigit():
+                    leaves.append((int(current) // 1024, path))
+        return leaves
+
+    def pids(self, path):
+        """PIDs in a cgroup (not its descendants)"""
+        directory = self.resolve(path)
+        content = _read_text(os.path.join(directory, "cgroup.procs")) if directory else None
+        return [int(pid) for pid in (content or "").split()]
+
+    def collect(self, limit=10, is_essential=None):
+        """Return records for the limit leaf cgroups using the most memory; [] without cgroup v2.
+
+        Only memory.current is read for every leaf; the detailed files are
+        read for the cgroups that make the ranking.
+        """
+        if not self.available():
+            return []
+        records = []
+        for current_kb, path in heapq.nlargest(limit, self._leaves()):
+            directory = os.path.join(self.root, path.lstrip("/"))
+            stat = parse_flat_keyed(_read_text(os.path.join(directory, "memory.stat")))
+            events = parse_flat_keyed(_read_text(os.path.join(directory, "memory.events")))
+            psi = read_psi(os.path.join(directory, "memory.pressure")) or {}
+            unit = os.path.basename(path)
+            records.append({
+                'path': path,
+                'service': unit[:-len(".service")] if unit.endswith(".service") else None,
+                'current_kb': current_kb,
+                'anon_kb': stat.get('anon', 0) // 1024,
+                'file_kb': stat.get('file', 0) // 1024,
+                'high_kb': parse_limit(_read_text(os.path.join(directory, "memory.high"))),
+                'max_kb': parse_limit(_read_text(os.path.join(directory, "memory.max"))),
+                'events': {name: events.get(name, 0) for name in MEMORY_EVENTS},
+                'psi_some_avg10': psi.get('some', {}).get('avg10', 0.0),
+                'psi_full_avg10': psi.get('full', {}).get('avg10', 0.0),
+                'essential': bool(is_essential and is_essential(path)),
+            })
+        return records
+
+    def current_kb(self, path):
+        directory = self.resolve(path)
+        content = _read_text(os.path.join(directory, "memory.current")) if directory else None
+        return int(content) // 1024 if content and content.strip().isdigit() else None
+
+    def reclaim(self, path, megabytes):
+        """Ask the kernel to reclaim up to megabytes from a cgroup; returns the kB actually freed"""
+        directory = self.resolve(path)
+        if directory is None:
+            raise ValueError(f"no such cgroup: {path}")
+        before = self.current_kb(path)
+        try:
+            with open(os.path.join(directory, "memory.reclaim"), "w") as f:
+                f.write(f"{int(megabytes)}M")
+        except OSError as e:
+            # EAGAIN: less than the full amount could be reclaimed, which still helps
+            if e.errno != errno.EAGAIN:
+                raise
+        after = self.current_kb(path)
+        return max((before or 0) - (after or 0), 0)
+
+    def throttle(self, path, megabytes):
+        """Lower a cgroup's memory.high to megabytes, remembering the old value for release_throttles"""
+        directory = self.resolve(path)
+        if directory is None:
+            raise ValueError(f"no such cgroup: {path}")
+        high_path = os.path.join(directory, "memory.high")
+        with self.lock:
+            if path not in self.throttled:
+                self.throttled[path] = (_read_text(high_path) or "max").strip()
+        with open(high_path, "w") as f:
+            f.write(str(int(megabytes) * 1024 * 1024))
+
+    def release_throttles(self):
+        """Restore memory.high on every cgroup throttled so far; returns the paths released"""
+        with self.lock:
+            throttled, self.throttled = self.throttled, {}
+        released = []
+        for path, high in throttled.items():
+            directory = self.resolve(path)
+            if directory is None:
+                continue  # The cgroup went away with its workload
+            try:
+                with open(os.path.join(directory, "memory.high"), "w") as f:
+                    f.write(high)
+                released.append(path)
+            except OSError as e:
+                logger.error(f"Error restoring memory.high of {path}: {str(e)}")
+        return released
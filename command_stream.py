@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import logging
+import time
+
+import metrics
+
+logger = logging.getLogger("self-healing")
+
+
+class CommandStream:
+    """Starts fixes from a streamed diagnosis reply as soon as each command line is complete.
+
+    Feed on_line the reply line by line (DiagnosisClient.complete's on_line).
+    It reads the same formats the daemon's parse methods do: COMMAND: lines,
+    grouped under SERVICE: lines in a combined service diagnosis, and
+    "- action" lines under ACTIONS: in a memory diagnosis. Each command that
+    passes is_valid(target, command) is handed to start(target, command),
+    at most once per target, while the explanation is still being written.
+    """
+
+    def __init__(self, kind, start, is_valid, targets=None):
+        self.kind = kind
+        self.start = start
+        self.is_valid = is_valid
+        self.targets = targets
+        # A single-service reply has no SERVICE: line
+        self.current = targets[0] if targets and len(targets) == 1 else None
+        self.in_actions = False
+        self.seen = set()
+        self.started = {}  # target -> (command, whatever start returned)
+        self.began = time.perf_counter()
+
+    def _dispatch(self, target, command):
+        # Only the first command per target counts, as in the parse methods
+        if target in self.seen:
+            return
+        self.seen.add(target)
+        if not self.is_valid(target, command):
+            return
+        if not self.started:
+            metrics.LLM_TIME_TO_ACTION.labels(self.kind).observe(time.perf_counter() - self.began)
+        logger.info(f"Starting {command} for {target or self.kind} before the diagnosis has finished")
+        self.started[target] = (command, self.start(target, command))
+
+    def on_line(self, line):
+        if line.startswith("SERVICE:"):
+            self.current = line.replace("SERVICE:", "").strip().strip("'\"")
+        elif line.startswith("COMMAND:"):
+            if self.targets is None or self.current in self.targets:
+                self._dispatch(self.current, line.replace("COMMAND:", "").strip())
+        elif line.startswith("ACTIONS:"):
+            self.in_actions = True
+        elif line.startswith("EXPLANATION:"):
+            self.in_actions = False
+        elif self.in_actions and line.strip().startswith("-"):
+            action = line.strip("- ").strip()
+            if action and action.lower() != "none":
+                self._dispatch(action, action)
+
+    def take(self, target, command):
+        """The fix already started for target if it was for command, else None"""
+        started = self.started.get(target)
+        if started and started[0] == command:
+            return started[1]
+        return None
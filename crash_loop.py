@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("self-healing")
+
+# Circuit breaker states, with their value in the sentinel_circuit_breaker_state gauge
+CLOSED = "closed"        # heals run, subject to backoff
+HALF_OPEN = "half_open"  # cooldown is over; one trial heal decides
+OPEN = "open"            # no heals until the cooldown has passed
+BREAKER_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CrashLoopGuard:
+    """Per-service failure history that spaces out heal attempts and stops them for crash loops.
+
+    Every outage and every failed heal is a failure event; events older than
+    window seconds fall out of the history. After each failure the next heal
+    waits until base_delay, doubled for every further failure in the window
+    and capped at max_delay, has passed since the previous heal attempt, so
+    crashes far apart are still healed at once. A heal whose fix was
+    verified but whose service fails again within stable_after seconds
+    counts as a failed verification too. After max_failed_heals failed
+    verifications in a row the breaker opens and no heal is attempted for
+    cooldown seconds; then one trial heal is allowed, which closes the
+    breaker if it holds and reopens it if not. A service that comes back up
+    by other means and stays up for stable_after seconds closes its breaker
+    as well.
+    """
+
+    def __init__(self, window=300, base_delay=5, max_delay=300, max_failed_heals=3, cooldown=600,
+                 stable_after=30, on_change=None):
+        self.window = window
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_failed_heals = max_failed_heals
+        self.cooldown = cooldown
+        self.stable_after = stable_after
+        self.on_change = on_change  # (service, state) on every breaker transition
+        self.history = {}  # service -> record
+        self.lock = threading.Lock()
+        self.wall_offset = time.time() - time.monotonic()  # turns monotonic times into epoch seconds
+
+    def _record(self, service):
+        record = self.history.get(service)
+        if record is None:
+            record = self.history[service] = {
+                'failures': deque(),  # monotonic times of failure events in the window
+                'failed_heals': 0,  # consecutive failed verifications
+                'last_attempt': None,
+                'next_attempt': 0.0,
+                'state': CLOSED,
+                'opened_at': None,
+                'healed_at': None,  # last verified heal not yet known to be stable
+                'up_since': None,
+                'down': False,
+            }
+        return record
+
+    def _prune(self, record, now):
+        failures = record['failures']
+        while failures and now - failures[0] > self.window:
+            failures.popleft()
+
+    def _set_state(self, service, record, state, now):
+        """Move the breaker to state; returns the transition for _notify, or None if nothing changed"""
+        if record['state'] == state:
+            return
+        record['state'] = state
+        record['opened_at'] = now if state == OPEN else None
+        return [(service, state)]
+
+    def _fail(self, service, record, now, failed_heal):
+        """Add a failure event and push the next attempt back; returns the breaker transition, if any"""
+        record['failures'].append(now)
+        self._prune(record, now)
+        failures = len(record['failures'])
+        delay = min(self.base_delay * 2 ** (failures - 2), self.max_delay) if failures > 1 else 0
+        record['next_attempt'] = (now if record['last_attempt'] is None else record['last_attempt']) + delay
+        if not failed_heal:
+            return None
+        record['failed_heals'] += 1
+        if record['state'] == HALF_OPEN or record['failed_heals'] >= self.max_failed_heals:
+            record['next_attempt'] = now + self.cooldown
+            return self._set_state(service, record, OPEN, now)
+        return None
+
+    def _notify(self, changes):
+        for service, state in changes or ():
+            if state == OPEN:
+                logger.warning(f"Circuit breaker for {service} opened: its heals do not hold, "
+                               f"no further heals for {self.cooldown} s")
+            else:
+                logger.info(f"Circuit breaker for {service} {'half-open' if state == HALF_OPEN else 'closed'}")
+            if self.on_change:
+                self.on_change(service, state)
+
+    def failure(self, service, now=None):
+        """Note that service is down; counted once per outage. Returns True if this started a new outage."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            record = self._record(service)
+            record['up_since'] = None
+            if record['down']:
+                return False
+            record['down'] = True
+            # Verified, then down again before it proved stable: that heal did not hold
+            failed_heal = record['healed_at'] is not None and now - record['healed_at'] < self.stable_after
+            record['healed_at'] = None
+            changes = self._fail(service, record, now, failed_heal)
+        self._notify(changes)
+        return True
+
+    def allow(self, service, now=None):
+        """Whether a heal of service may start now; (allowed, reason) with reason "backoff" or "open" if not"""
+        now = time.monotonic() if now is None else now
+        changes = None
+        with self.lock:
+            record = self._record(service)
+            if record['state'] == OPEN:
+                if now - record['opened_at'] < self.cooldown:
+                    return False, "open"
+                changes = self._set_state(service, record, HALF_OPEN, now)
+            elif now < record['next_attempt']:
+                return False, "backoff"
+            record['last_attempt'] = now
+        self._notify(changes)
+        return True, None
+
+    def result(self, service, success, now=None):
+        """Record the outcome of a heal of service"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            record = self._record(service)
+            if success:
+                record['down'] = False
+                record['healed_at'] = now
+                record['up_since'] = now
+                changes = None
+            else:
+                changes = self._fail(service, record, now, True)
+        self._notify(changes)
+
+    def healthy(self, service, now=None):
+        """Note that service is up; once up for stable_after seconds its last heal counts as holding"""
+        now = time.monotonic() if now is None else now
+        changes = None
+        with self.lock:
+            record = self.history.get(service)
+            if record is None:
+                return
+            record['down'] = False
+            if record['up_since'] is None:
+                record['up_since'] = now
+            if now - record['up_since'] >= self.stable_after:
+                record['healed_at'] = None
+                record['failed_heals'] = 0
+                changes = self._set_state(service, record, CLOSED, now)
+        self._notify(changes)
+
+    def forget(self, service):
+        with self.lock:
+            self.history.pop(service, None)
+
+    def stats(self, now=None):
+        """Breaker state and failure history per service, for status.json.
+
+        The next allowed heal is published as an epoch time (None if a heal
+        may start now), not a countdown, so the stats only change when the
+        history does.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            stats = {}
+            for service, record in self.history.items():
+                self._prune(record, now)
+                if record['state'] == OPEN:
+                    retry_at = record['opened_at'] + self.cooldown
+                else:
+                    retry_at = record['next_attempt']
+                stats[service] = {
+                    'state': record['state'],
+                    'failures_in_window': len(record['failures']),
+                    'failure_rate_per_min': round(len(record['failures']) * 60 / self.window, 2),
+                    'failed_heals': record['failed_heals'],
+                    'next_attempt_at': round(retry_at + self.wall_offset, 1) if retry_at > now else None,
+                }
+            return stats
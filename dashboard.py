@@ -1,10 +1,14 @@
 import streamlit as st
 import json
 import time
+import os
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
-import os
+
+from timeseries import TimeSeriesReader
+from incident_store import IncidentStore
+from status_channel import StatusSubscriber
 
 st.set_page_config(
     page_title="SentinelOS Telemetry",
@@ -36,59 +40,79 @@ st.markdown("""
 
 st.title("SentinelOS Telemetry")
 
-# Initialize session state for historical memory data
-if 'memory_history' not in st.session_state:
-    st.session_state.memory_history = []
+STATUS_SOCKET = '/var/log/self-healing/status.sock'
+STATUS_FILE = '/var/log/self-healing/status.json'
+
+def get_status_subscriber():
+    """One status channel subscription per browser session"""
+    if 'status_subscriber' not in st.session_state:
+        st.session_state.status_subscriber = StatusSubscriber(STATUS_SOCKET)
+    return st.session_state.status_subscriber
 
 def load_latest_data():
-    """Load the latest data from the daemon's status file"""
+    """Load the latest status pushed by the daemon, falling back to its status file"""
+    subscriber = get_status_subscriber()
+    if subscriber.status is None:
+        subscriber.wait(0.5)  # the snapshot arrives right after connecting
+    if subscriber.status is not None:
+        return subscriber.status
     try:
-        with open('/var/log/self-healing/status.json', 'r') as f:
+        with open(STATUS_FILE, 'r') as f:
             return json.load(f)
     except Exception as e:
         return None
 
+def wait_for_change(timeout=30):
+    """Block until the daemon publishes a change (or timeout passes)"""
+    subscriber = get_status_subscriber()
+    deadline = time.time() + timeout
+    if subscriber.sock is not None or subscriber.connect():
+        while time.time() < deadline:
+            if subscriber.wait(deadline - time.time()):
+                return
+            if subscriber.sock is None:
+                break  # daemon went away; fall back to the file
+    # No channel: watch the status file, which is replaced atomically on change
+    try:
+        last_mtime = os.stat(STATUS_FILE).st_mtime
+    except OSError:
+        last_mtime = None
+    while time.time() < deadline:
+        time.sleep(1)
+        try:
+            if os.stat(STATUS_FILE).st_mtime != last_mtime:
+                return
+        except OSError:
+            continue
+
+def load_memory_history(seconds=900):
+    """Load the last window of memory samples from the daemon's time series file"""
+    try:
+        with TimeSeriesReader('/var/log/self-healing/metrics.ring') as reader:
+            samples = reader.since(time.time() - seconds)
+        return pd.DataFrame({
+            'timestamp': samples['timestamp'],
+            'usage': samples.get('memory_percent', []),
+        }, dtype=float)
+    except Exception as e:
+        return pd.DataFrame({'timestamp': [], 'usage': []}, dtype=float)
+
 def load_recent_diagnoses():
-    """Load recent Claude diagnoses from log files"""
+    """Load the most recent Claude diagnoses from the daemon's incident store"""
     diagnoses = []
-    log_dir = "/var/log/self-healing"
     try:
-        for filename in sorted(os.listdir(log_dir), reverse=True):  # Get all files
-            if filename.endswith('.log') and not filename == 'daemon.log':
-                with open(os.path.join(log_dir, filename), 'r') as f:
-                    content = f.read()
-                    # Extract timestamp from filename, handling both service and memory logs
-                    parts = filename.split('_')
-                    if len(parts) >= 2:
-                        try:
-                            # Try to parse the timestamp portion
-                            timestamp_str = '_'.join(parts[1:]).split('.')[0]
-                            timestamp = datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-                            
-                            # Extract the diagnosis section
-                            diagnosis_section = ""
-                            if '=== DIAGNOSIS ===' in content:
-                                diagnosis_section = content.split('=== DIAGNOSIS ===')[1].split('===')[0].strip()
-                            
-                            # Extract actions/commands if present
-                            actions_section = ""
-                            if '=== FIX COMMAND:' in content:
-                                actions_section = content.split('=== FIX COMMAND:')[1].split('===')[0].strip()
-                            elif 'ACTIONS:' in content:
-                                actions_section = content.split('ACTIONS:')[1].split('EXPLANATION:')[0].strip()
-
-                            diagnoses.append({
-                                'timestamp': timestamp,
-                                'diagnosis': diagnosis_section,
-                                'actions': actions_section,
-                                'full_content': content
-                            })
-                        except ValueError:
-                            continue  # Skip files with invalid timestamp format
-        
-        # Sort by timestamp and keep 10 most recent
-        diagnoses.sort(key=lambda x: x['timestamp'], reverse=True)
-        return diagnoses[:10]
+        store = IncidentStore('/var/log/self-healing/incidents.db', readonly=True)
+        try:
+            incidents = store.latest(10)
+        finally:
+            store.close()
+        for incident in incidents:
+            diagnoses.append({
+                'timestamp': datetime.fromtimestamp(incident['started_at']),
+                'diagnosis': incident['diagnosis'] or "",
+                'actions': "" if incident['actions'] in (None, "none") else incident['actions'],
+                'full_content': incident['details'] or ""
+            })
     except Exception as e:
         st.error(f"Error loading diagnoses: {e}")
     return diagnoses
@@ -105,26 +129,11 @@ if True:  # Replace while loop with if True for Streamlit
             # Memory Usage Graph
             st.subheader("Memory Usage Over Time")
             
-            # Update memory history with timestamp
-            current_time = datetime.now()
-            st.session_state.memory_history.append({
-                'timestamp': current_time,
-                'usage': data['memory_usage']
-            })
-            
-            # Keep only last 15 minutes of data
-            fifteen_mins_ago = current_time.timestamp() - 900  # 15 minutes in seconds
-            st.session_state.memory_history = [
-                entry for entry in st.session_state.memory_history 
-                if entry['timestamp'].timestamp() > fifteen_mins_ago
-            ]
-            
-            # Create DataFrame and plot
-            df = pd.DataFrame(st.session_state.memory_history)
+            # Last 15 minutes, read straight from the daemon's ring buffer
+            df = load_memory_history(900)
             
             # Convert timestamps to relative minutes ago
-            if len(df) > 0:
-                df['minutes_ago'] = (current_time - df['timestamp']).dt.total_seconds() / 60
+            df['minutes_ago'] = (time.time() - df['timestamp']) / 60
             
             fig = px.line(df, x='minutes_ago', y='usage',
                          title='Memory Usage % (Last 15 Minutes)',
@@ -141,8 +150,20 @@ if True:  # Replace while loop with if True for Streamlit
             
             # Top Memory Processes
             st.subheader("Top Memory-Consuming Processes")
-            if 'top_processes' in data:
-                st.code(data['top_processes'])
+            if data.get('top_processes'):
+                processes = pd.DataFrame(data['top_processes'])
+                processes['rss_mb'] = processes['rss_kb'] // 1024
+                st.dataframe(processes[['pid', 'comm', 'rss_mb', 'class', 'cgroup', 'cmdline']],
+                             hide_index=True, use_container_width=True)
+
+            # Per-cgroup usage (cgroup v2 hosts only)
+            if data.get('cgroups'):
+                st.subheader("Top Memory-Consuming Cgroups")
+                cgroups = pd.DataFrame(data['cgroups'])
+                cgroups['current_mb'] = cgroups['current_kb'] // 1024
+                cgroups['oom_kills'] = cgroups['events'].apply(lambda events: events['oom_kill'])
+                st.dataframe(cgroups[['path', 'service', 'current_mb', 'psi_some_avg10', 'oom_kills', 'essential']],
+                             hide_index=True, use_container_width=True)
         
         with col2:
             # Recent Claude Diagnoses
@@ -163,5 +184,5 @@ if True:  # Replace while loop with if True for Streamlit
             else:
                 st.info("🎯 System is running smoothly - no patches needed!")
     
-    time.sleep(2)  # Update every 2 seconds
+    wait_for_change()  # Re-render only when the daemon reports a change
     st.rerun()  # Use st.rerun() instead of experimental_rerun()
\ No newline at end of file
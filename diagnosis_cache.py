@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("self-healing")
+
+# Timestamps, PIDs, ports, addresses and counters differ between otherwise
+# identical incidents, so every run of digits is treated as the same token
+_DIGITS_RE = re.compile(r"\d+")
+_HEX_RE = re.compile(r"0x[0-9a-fA-F]+")
+_SPACE_RE = re.compile(r"[ \t]+")
+
+
+def normalize_logs(logs):
+    """Strip the volatile parts of log text so repeat incidents look identical"""
+    text = _HEX_RE.sub("0x#", logs)
+    text = _DIGITS_RE.sub("#", text)
+    return "\n".join(_SPACE_RE.sub(" ", line).strip() for line in text.splitlines() if line.strip())
+
+
+def fingerprint(service, status, logs):
+    """Stable key for an incident: service, status and a digest of the normalized logs"""
+    digest = hashlib.sha256(normalize_logs(logs).encode()).hexdigest()
+    return f"{service}:{status}:{digest[:32]}"
+
+
+class DiagnosisCache:
+    """LRU cache of diagnoses with a TTL, optionally persisted to a JSON file"""
+
+    def __init__(self, max_entries=256, ttl=3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            now = time.time()
+            for key, entry in stored.items():
+                if now - entry['stored_at'] < self.ttl:
+                    self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        except Exception as e:
+            logger.error(f"Error loading diagnosis cache: {str(e)}")
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving diagnosis cache: {str(e)}")
+
+    def get(self, key):
+        """Return the cached diagnosis for key, or None on a miss or expired entry"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry['stored_at'] >= self.ttl:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry['diagnosis']
+
+    def put(self, key, diagnosis):
+        with self.lock:
+            self.entries[key] = {'diagnosis': diagnosis, 'stored_at': time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self._save()
+
+    def invalidate(self, key):
+        """Drop a diagnosis whose fix did not work"""
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self._save()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import random
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger("self-healing")
+
+# Last-known addresses used when the host's own DNS is broken (which is exactly
+# when the DNS diagnosis needs the API)
+FALLBACK_ADDRESSES = {"api.anthropic.com": "160.79.104.21"}
+
+_original_getaddrinfo = socket.getaddrinfo
+_fallback_installed = False
+
+
+def _getaddrinfo_with_fallback(host, port, *args, **kwargs):
+    try:
+        return _original_getaddrinfo(host, port, *args, **kwargs)
+    except socket.gaierror:
+        address = FALLBACK_ADDRESSES.get(host)
+        if not address:
+            raise
+        logger.warning(f"Resolving {host} failed, using fallback address {address}")
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port))]
+
+
+def install_dns_fallback():
+    """Fall back to FALLBACK_ADDRESSES only when normal resolution fails.
+
+    Installed once, process-wide, instead of swapping socket.getaddrinfo
+    around each request, which is unsafe with concurrent diagnoses.
+    """
+    global _fallback_installed
+    if not _fallback_installed:
+        socket.getaddrinfo = _getaddrinfo_with_fallback
+        _fallback_installed = True
+
+
+class StreamError(Exception):
+    """An error event in the middle of a streamed reply; the argument is the API's error type"""
+
+
+class CallStats:
+    """Latency and outcome counters for one kind of diagnosis call"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.last_ms = 0.0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'last_ms': round(self.last_ms, 1),
+            'avg_ms': round(self.total_ms / self.calls, 1) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 1),
+        }
+
+
+class DiagnosisClient:
+    """Shared keep-alive client for every call to the messages API"""
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+    RETRY_STREAM_ERRORS = {"overloaded_error", "api_error", "rate_limit_error"}
+
+    def __init__(self, api_key, api_url="https://api.anthropic.com/v1/messages",
+                 model="claude-3-7-sonnet-latest", max_tokens=1000,
+                 connect_timeout=3, read_timeout=10, retries=2, backoff=0.5, pool_size=4, stream=True):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.model = model
+        self.max_tokens = max_tokens
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        # Stream replies so callers can act on a command line before the explanation is written
+        self.stream = stream
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "x-api-key": api_key or "",
+            "content-type": "application/json",
+            "anthropic-version": "2023-06-01"
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        install_dns_fallback()
+
+    def _record(self, label, elapsed_ms, ok, retries):
+        with self.stats_lock:
+            stats = self.stats.setdefault(label, CallStats())
+            stats.calls += 1
+            stats.retries += retries
+            if not ok:
+                stats.errors += 1
+            stats.last_ms = elapsed_ms
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter: spread retries from concurrent diagnoses apart
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def _read_events(self, response, on_line, progress):
+        """Consume a server-sent event stream, handing each completed line of text to on_line.
+
+        progress collects the text and the number of lines handed over, so
+        they survive an error halfway. Returns (text, usage); raises
+        StreamError on an error event.
+        """
+        text, buffer, usage = progress['text'], "", {}
+        for raw in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not raw or not raw.startswith("data:"):
+                continue
+            event = json.loads(raw[len("data:"):])
+            kind = event.get("type")
+            if kind == "content_block_delta" and event["delta"].get("type") == "text_delta":
+                chunk = event["delta"]["text"]
+                text.append(chunk)
+                buffer += chunk
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    progress['delivered'] += 1
+                    if on_line:
+                        on_line(line)
+            elif kind == "message_start":
+                usage.update(event["message"].get("usage", {}))
+            elif kind == "message_delta":
+                usage.update(event.get("usage", {}))
+            elif kind == "message_stop":
+                break
+            elif kind == "error":
+                raise StreamError(event.get("error", {}).get("type", "error"))
+        if buffer:
+            progress['delivered'] += 1
+            if on_line:
+                on_line(buffer)
+        return "".join(text), usage
+
+    def complete(self, prompt, label="diagnosis", max_tokens=None, on_line=None):
+        """Send a single-turn prompt and return the reply text, or None if the call failed.
+
+        When streaming, on_line is called with each line of the reply as soon
+        as it is complete, so a caller can start a fix while the rest is
+        still being generated. A call is only retried if no line was handed
+        over yet; after that, whatever arrived is returned.
+        """
+        data = {
+            "model": self.model,
+            "max_tokens": max_tokens or self.max_tokens,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        if self.stream:
+            data["stream"] = True
+
+        start = time.perf_counter()
+        content = None
+        attempt = 0
+        while True:
+            progress = {'text': [], 'delivered': 0}
+            try:
+                response = self.session.post(self.api_url, json=data, timeout=self.timeout, stream=self.stream)
+                if response.status_code == 200:
+                    if self.stream:
+                        with response:
+                            content, usage = self._read_events(response, on_line, progress)
+                    else:
+                        body = response.json()
+                        content = body["content"][0]["text"]
+                        usage = body.get("usage", {})
+                        if on_line:
+                            for line in content.split("\n"):
+                                on_line(line)
+                    metrics.LLM_TOKENS.labels(label, "input").inc(usage.get("input_tokens", 0))
+                    metrics.LLM_TOKENS.labels(label, "output").inc(usage.get("output_tokens", 0))
+                    break
+                logger.error(f"API error: {response.status_code} - {response.text}")
+                retryable = response.status_code in self.RETRY_STATUSES
+            except StreamError as e:
+                logger.error(f"API error in stream: {str(e)}")
+                retryable = str(e) in self.RETRY_STREAM_ERRORS
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Could not connect to Claude API: {str(e)}")
+                retryable = True
+            except (KeyError, IndexError, ValueError) as e:
+                logger.error(f"Unexpected API response: {str(e)}")
+                retryable = False
+
+            if progress['delivered']:
+                # Lines were acted on already, so no retry; keep what arrived for the incident log
+                content = "".join(progress['text'])
+                break
+            if not retryable or attempt >= self.retries:
+                break
+            self._sleep_before_retry(attempt)
+            attempt += 1
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._record(label, elapsed_ms, content is not None, attempt)
+        metrics.LLM_DURATION.labels(label).observe(elapsed_ms / 1000)
+        metrics.LLM_REQUESTS.labels(label, "success" if content is not None else "error").inc()
+        logger.info(f"{label} call took {elapsed_ms:.0f} ms ({attempt} retries)")
+        return content
+
+    def latency_report(self):
+        """Per-label latency and error counters, for status.json"""
+        with self.stats_lock:
+            return {label: stats.as_dict() for label, stats in self.stats.items()}
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import ipaddress
+import os
+import random
+import select
+import shutil
+import socket
+import struct
+import time
+
+DNS_HEADER = struct.Struct("!HHHHHH")
+QTYPE_A = 1
+QCLASS_IN = 1
+RCODES = {0: "ok", 1: "format_error", 2: "servfail", 3: "nxdomain", 4: "not_implemented", 5: "refused"}
+GOOD_NAMESERVERS = "nameserver 8.8.8.8\nnameserver 1.1.1.1\n"
+
+
+def parse_nameservers(resolv_content):
+    """Return the syntactically valid nameserver addresses in resolv.conf text"""
+    nameservers = []
+    for line in resolv_content.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0] == "nameserver":
+            try:
+                nameservers.append(str(ipaddress.ip_address(parts[1])))
+            except ValueError:
+                continue
+    return nameservers
+
+
+def build_query(name, query_id, qtype=QTYPE_A):
+    """Encode a recursive DNS query for name"""
+    header = DNS_HEADER.pack(query_id, 0x0100, 1, 0, 0, 0)  # RD set, one question
+    labels = b"".join(bytes([len(label)]) + label.encode("idna") for label in name.rstrip(".").split("."))
+    return header + labels + b"\0" + struct.pack("!HH", qtype, QCLASS_IN)
+
+
+def parse_response(data, query_id):
+    """Return (status, answer_count) for a response, raising ValueError if it is malformed"""
+    if len(data) < DNS_HEADER.size:
+        raise ValueError("response shorter than a DNS header")
+    response_id, flags, _, answers, _, _ = DNS_HEADER.unpack_from(data)
+    if response_id != query_id:
+        raise ValueError("response ID does not match the query")
+    if not flags & 0x8000:
+        raise ValueError("reply is not a DNS response")
+    status = RCODES.get(flags & 0x000F, f"rcode_{flags & 0x000F}")
+    if status == "ok" and answers == 0:
+        status = "no_answer"
+    return status, answers
+
+
+def probe(nameservers, name="google.com", timeout=2.0):
+    """Query every nameserver for name concurrently and report each outcome.
+
+    One UDP socket per server, all sent at once and read with a single
+    select loop, so total time is bounded by timeout however many servers
+    are configured.
+    """
+    nameservers = list(dict.fromkeys(nameservers))  # one query per server, even if listed twice
+    results = {}
+    pending = {}
+    start = time.perf_counter()
+
+    for server in nameservers:
+        query_id = random.randint(0, 0xFFFF)
+        result = {'server': server, 'status': 'timeout', 'latency_ms': None, 'answers': 0}
+        results[server] = result
+        try:
+            family = socket.AF_INET6 if ipaddress.ip_address(server).version == 6 else socket.AF_INET
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.connect((server, 53))
+            sock.send(build_query(name, query_id))
+        except (OSError, ValueError) as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+            continue
+        pending[sock] = (server, query_id)
+
+    deadline = start + timeout
+    while pending:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        readable, _, _ = select.select(list(pending), [], [], remaining)
+        for sock in readable:
+            server, query_id = pending[sock]
+            result = results[server]
+            try:
+                data = sock.recv(4096)
+                result['status'], result['answers'] = parse_response(data, query_id)
+            except ValueError as e:
+                result['status'] = 'parse_error'
+                result['error'] = str(e)
+            except OSError as e:
+                # e.g. ICMP port unreachable surfaces as ECONNREFUSED on a connected socket
+                result['status'] = 'error'
+                result['error'] = str(e)
+            result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            sock.close()
+            del pending[sock]
+
+    for sock in pending:
+        sock.close()
+
+    return [results[server] for server in nameservers]
+
+
+def probe_resolv_conf(path="/etc/resolv.conf", name="google.com", timeout=2.0):
+    """Probe the nameservers configured in resolv.conf; DNS works if any server answers"""
+    try:
+        with open(path) as f:
+            nameservers = parse_nameservers(f.read())
+    except OSError as e:
+        return {'working': False, 'query': name, 'servers': [], 'error': f"cannot read {path}: {str(e)}"}
+
+    if not nameservers:
+        return {'working': False, 'query': name, 'servers': [], 'error': "no valid nameserver in resolv.conf"}
+
+    servers = probe(nameservers, name, timeout)
+    return {
+        'working': any(server['status'] == 'ok' for server in servers),
+        'query': name,
+        'servers': servers,
+        'error': None,
+    }
+
+
+def reset_resolv_conf(path="/etc/resolv.conf"):
+    """Point resolv.conf at GOOD_NAMESERVERS, keeping a one-time .bak copy.
+
+    Returns True if the file was rewritten, False if it was already good.
+    """
+    if not os.path.exists(f"{path}.bak") and os.path.exists(path):
+        shutil.copyfile(path, f"{path}.bak")
+    try:
+        with open(path) as f:
+            if GOOD_NAMESERVERS in f.read():
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, "w") as f:
+        f.write(GOOD_NAMESERVERS)
+    return True
+
+
+def format_probe(result):
+    """One line per nameserver, for logs and prompts"""
+    if result['error']:
+        return f"DNS probe for {result['query']}: {result['error']}"
+    lines = [f"DNS probe for {result['query']}: {'WORKING' if result['working'] else 'FAILED'}"]
+    for server in result['servers']:
+        latency = f"{server['latency_ms']} ms" if server['latency_ms'] is not None else "-"
+        lines.append(f"  {server['server']}: {server['status']} ({latency})")
+    return "\n".join(lines)
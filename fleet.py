@@ -0,0 +1,705 @@
+#!/usr/bin/env python3
+"""Fleet mode: lightweight agents stream probe results to one controller that diagnoses and heals.
+
+Agents only probe and run the remediations they are sent; they make no
+model calls and keep no incident history. The controller groups hosts that
+fail the same way, diagnoses each group once and fans the fix back out.
+
+Agents identify themselves once, in their hello; every later report and
+result on that connection is taken to be from that host. Set a shared token
+(--token or SENTINEL_FLEET_TOKEN) on both ends before listening on anything
+but loopback, or any peer could pose as an agent and steer its remediations.
+
+Usage: python3 fleet.py controller [--listen 127.0.0.1:9200] [--token TOKEN]
+       python3 fleet.py agent --controller HOST:9200 [--host NAME] [--token TOKEN]
+"""
+
+import argparse
+import hmac
+import json
+import logging
+import os
+import select
+import selectors
+import socket
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from diagnosis_cache import fingerprint
+from dns_probe import probe_resolv_conf, reset_resolv_conf
+from log_tail import tail
+from memory_pressure import MemoryPressureDetector
+from proc_scanner import ProcessTable, read_meminfo
+from process_index import ProcessIndex, classify_process, EXPENDABLE, ESSENTIAL_PROCESSES, PROTECTED_PROCESSES
+
+logger = logging.getLogger("self-healing")
+
+DEFAULT_PORT = 9200
+SERVICE_COMMANDS = {"start", "restart"}
+DNS_COMMANDS = {"check_resolv", "ping_ip"}
+
+
+def encode(message):
+    """Messages are newline-delimited JSON in both directions"""
+    return json.dumps(message).encode() + b"\n"
+
+
+def parse_address(text, default_host="127.0.0.1"):
+    host, _, port = text.rpartition(":")
+    return (host or default_host, int(port or DEFAULT_PORT))
+
+
+class FleetAgent:
+    """Probes one host, reports to the controller and applies the remediations it sends back"""
+
+    def __init__(self, controller, host=None, services=None, log_sources=None, proc_root="/proc",
+                 resolv_path="/etc/resolv.conf", interval=10, dns_interval=30, run=None,
+                 essential_processes=None, protected_processes=None, log_lines=20, log_max_bytes=16384,
+                 token=None):
+        self.controller = controller
+        self.host = host or socket.gethostname()
+        self.token = token
+        # Service name -> process name, as in SelfHealingDaemon.service_processes
+        self.services = services or {"ssh": "sshd", "apache2": "apache2"}
+        self.log_sources = log_sources or {}
+        self.proc_root = proc_root
+        self.resolv_path = resolv_path
+        self.interval = interval
+        self.dns_interval = dns_interval  # 0 disables the DNS probe
+        self.run_command = run or subprocess.run
+        self.essential_processes = essential_processes or set(ESSENTIAL_PROCESSES)
+        self.protected_processes = protected_processes or set(PROTECTED_PROCESSES)
+        self.log_lines = log_lines
+        self.log_max_bytes = log_max_bytes
+
+        self.process_table = ProcessTable(proc_root)
+        self.process_index = ProcessIndex(self.classify_process, proc_root)
+        self.memory_pressure = MemoryPressureDetector()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fleet-fix")
+        self.collect_lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.sock = None
+        self.buffer = b""
+        self.seq = 0
+        self.next_dns_probe = 0
+        self._stop = threading.Event()
+
+    def classify_process(self, pid, comm, cgroup):
+        """Protection class of a process, by the same rules as the standalone daemon"""
+        return classify_process(pid, comm, cgroup, self.essential_processes, self.protected_processes,
+                                self.services)
+
+    def service_logs(self, service):
+        sections = []
+        for path in self.log_sources.get(service, []):
+            try:
+                sections.append(tail(path, self.log_lines, self.log_max_bytes))
+            except OSError:
+                continue
+        return "\n".join(section for section in sections if section) or f"No {service} logs found"
+
+    def collect(self):
+        """One report: service liveness, memory pressure and (when due) a DNS probe"""
+        with self.collect_lock:
+            self.seq += 1
+            report = {'type': 'report', 'host': self.host, 'seq': self.seq, 'timestamp': time.time(),
+                      'services': {}, 'logs': {}}
+
+            self.process_table.refresh()
+            for service, process_name in self.services.items():
+                status = "active" if self.process_table.is_running(process_name) else "inactive"
+                report['services'][service] = status
+                if status != "active":
+                    report['logs'][service] = self.service_logs(service)
+
+            mem_info = read_meminfo(self.proc_root)
+            used_percent = (mem_info['MemTotal'] - mem_info['MemAvailable']) / mem_info['MemTotal'] * 100
+            pressure = self.memory_pressure.update(used_percent)
+            report['memory'] = {'used_percent': used_percent, 'pressure': pressure,
+                                'critical': pressure['critical'], 'oom_events': [], 'top_processes': []}
+            # The process ranking is only worth its bytes when the controller has to act on it
+            if pressure['critical']:
+                report['memory']['top_processes'] = self.process_index.refresh().top(10)
+
+            now = time.monotonic()
+            if self.dns_interval and now >= self.next_dns_probe:
+                self.next_dns_probe = now + self.dns_interval
+                report['dns'] = probe_resolv_conf(self.resolv_path)
+                if not report['dns']['working']:
+                    try:
+                        with open(self.resolv_path) as f:
+                            report['resolv_content'] = f.read()
+                    except OSError:
+                        report['resolv_content'] = ""
+            return report
+
+    def send(self, message):
+        with self.send_lock:
+            if self.sock is None:
+                return False
+            try:
+                self.sock.sendall(encode(message))
+                return True
+            except OSError as e:
+                logger.warning(f"Lost connection to controller: {str(e)}")
+                self._disconnect()
+                return False
+
+    def report(self):
+        try:
+            self.send(self.collect())
+        except Exception as e:
+            logger.error(f"Error collecting report: {str(e)}")
+
+    def connect(self):
+        try:
+            sock = socket.create_connection(self.controller, timeout=5)
+        except OSError as e:
+            logger.warning(f"Cannot reach controller {self.controller[0]}:{self.controller[1]}: {str(e)}")
+            return False
+        sock.settimeout(5)  # sends only; reads wait in select
+        with self.send_lock:
+            self.sock = sock
+            self.buffer = b""
+        self.next_dns_probe = 0
+        return self.send({'type': 'hello', 'host': self.host, 'services': sorted(self.services),
+                          'token': self.token})
+
+    def _disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+
+    def run_checked(self, args):
+        result = self.run_command(args, capture_output=True, text=True, check=False)
+        return result.returncode == 0, (result.stdout or "") + (result.stderr or "")
+
+    def apply(self, message):
+        """Run one remediation; only the commands the standalone daemon allows are accepted"""
+        action = message.get('action')
+        if action == 'service':
+            if message['service'] not in self.services or message['command'] not in SERVICE_COMMANDS:
+                return False, f"refused: {message['command']} {message['service']}"
+            return self.run_checked(["service", message['service'], message['command']])
+
+        if action == 'memory':
+            success, output = True, []
+            for item in message['actions']:
+                parts = item.split()
+                if len(parts) == 2 and parts[0] == "kill" and parts[1].isdigit():
+                    # Whatever the controller sent, only a live expendable process is killed
+                    record = self.process_index.validate(int(parts[1]))
+                    if record is None or record['class'] != EXPENDABLE:
+                        ok, text = False, f"refused: {item} ({record['class'] if record else 'gone'})"
+                    else:
+                        ok, text = self.run_checked(["kill", parts[1]])
+                elif len(parts) == 3 and parts[0] == "service" and parts[2] == "stop":
+                    cls = self.classify_process(None, parts[1], f"/system.slice/{parts[1]}.service")
+                    if cls != EXPENDABLE:
+                        ok, text = False, f"refused: {item} ({cls})"
+                    else:
+                        ok, text = self.run_checked(["service", parts[1], "stop"])
+                else:
+                    ok, text = False, f"unsupported: {item}"
+                success = success and ok
+                output.append(text)
+            return success, "\n".join(output)
+
+        if action == 'dns':
+            if message['command'] == "check_resolv":
+                rewritten = reset_resolv_conf(self.resolv_path)
+                return True, "resolv.conf reset" if rewritten else "resolv.conf already good"
+            if message['command'] == "ping_ip":
+                return self.run_checked(["ping", "-c", "1", "8.8.8.8"])
+        return False, f"unsupported action {action}"
+
+    def remediate(self, message):
+        try:
+            success, output = self.apply(message)
+        except Exception as e:
+            success, output = False, str(e)
+        logger.info(f"Remediation {message['id']} ({message.get('action')}): {'SUCCESS' if success else 'FAILED'}")
+        self.send({'type': 'result', 'host': self.host, 'id': message['id'],
+                   'success': success, 'output': output[-2000:]})
+        # Report straight away so the controller can confirm the heal
+        self.report()
+
+    def _read(self, timeout):
+        sock = self.sock
+        if sock is None:
+            return
+        try:
+            readable, _, _ = select.select([sock], [], [], timeout)
+            if not readable:
+                return
+            data = sock.recv(65536)
+        except (OSError, ValueError):
+            data = b""
+        if not data:
+            with self.send_lock:
+                self._disconnect()
+            return
+        self.buffer += data
+        while b"\n" in self.buffer:
+            line, self.buffer = self.buffer.split(b"\n", 1)
+            message = json.loads(line)
+            if message.get('type') == 'remediate':
+                self.executor.submit(self.remediate, message)
+
+    def run(self):
+        """Report every interval and handle remediations until stop() is called"""
+        next_report = 0
+        while not self._stop.is_set():
+            if self.sock is None:
+                if not self.connect():
+                    self._stop.wait(min(self.interval, 5))
+                    continue
+                next_report = 0
+
+            now = time.monotonic()
+            if now >= next_report:
+                self.report()
+                next_report = now + self.interval
+            self._read(max(next_report - time.monotonic(), 0))
+        with self.send_lock:
+            self._disconnect()
+        self.executor.shutdown(wait=False)
+
+    def stop(self):
+        self._stop.set()
+
+
+class IncidentGroup:
+    """Hosts failing the same way: diagnosed once, remediated together"""
+
+    def __init__(self, signature, kind, target, context):
+        self.signature = signature
+        self.kind = kind
+        self.target = target
+        self.context = context  # report details from the first host, used for the diagnosis
+        self.first_seen = time.monotonic()
+        self.hosts = {}  # host -> wall time the failure was detected
+        self.future = None
+        self.diagnosed = False
+        self.diagnosis = None
+        self.source = None
+        self.rule = None
+        self.cache_key = None
+        self.cached = False  # diagnosis is in (or came from) the diagnosis cache
+        self.remediation = None  # message template, None if no safe fix was suggested
+        self.pending = set()  # hosts with a remediation in flight
+        self.sent_at = {}  # host -> monotonic time of the last remediation
+
+
+class _Connection:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.host = None
+        self.inbuf = b""
+        self.outbuf = b""
+
+
+class FleetController:
+    """Receives agent reports, deduplicates correlated failures and fans remediations back out.
+
+    All agent I/O runs on one selector loop, so hundreds of agents cost one
+    thread; diagnoses run on a small pool. Failures with the same signature
+    (service plus normalised logs, or the same DNS probe outcome) that arrive
+    within correlation_window of each other share a single diagnosis.
+    Memory failures are per host, since the fix names host-local PIDs.
+    """
+
+    def __init__(self, diagnoser, address=("127.0.0.1", DEFAULT_PORT), correlation_window=2.0,
+                 retry_delay=5.0, max_attempts=3, diagnosis_workers=4, max_outbuf=1 << 20, token=None):
+        # A SelfHealingDaemon, used only for its rules, cache, prompts and incident store
+        self.diagnoser = diagnoser
+        self.address = address
+        self.correlation_window = correlation_window
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.max_outbuf = max_outbuf
+        self.token = token  # shared secret agents must present in their hello; None accepts any agent
+        self.selector = selectors.DefaultSelector()
+        self.executor = ThreadPoolExecutor(max_workers=diagnosis_workers, thread_name_prefix="fleet-diagnosis")
+        self.listener = None
+        self.connections = {}  # host -> _Connection
+        self.hosts = {}  # host -> last report
+        self.groups = {}  # signature -> IncidentGroup
+        self.failing = {}  # (host, kind, target) -> signature
+        self.attempts = {}  # (host, kind, target) -> remediations sent for the open failure
+        self.given_up = set()  # failures left alone until the host reports them healthy
+        self.remediations = {}  # id -> (signature, host)
+        self.history = deque(maxlen=10000)  # closed failures, for status and benchmarks
+        self.next_id = 0
+        self.counts = {'reports': 0, 'failures': 0, 'groups': 0, 'remediations': 0,
+                       'healed': 0, 'gave_up': 0, 'diagnoses': {'rule': 0, 'cache': 0, 'model': 0}}
+        self._stop = threading.Event()
+
+    def start(self):
+        self.listener = socket.create_server(self.address, backlog=512, reuse_port=False)
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()[:2]
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        logger.info(f"Fleet controller listening on {self.address[0]}:{self.address[1]}")
+        if self.token is None and not self.address[0].startswith("127."):
+            logger.warning("Fleet controller has no token but is reachable beyond loopback; "
+                           "any peer can pose as an agent")
+
+    def serve_forever(self):
+        if self.listener is None:
+            self.start()
+        try:
+            while not self._stop.is_set():
+                for key, events in self.selector.select(timeout=0.1):
+                    if key.fileobj is self.listener:
+                        self._accept()
+                        continue
+                    conn = key.data
+                    if events & selectors.EVENT_READ:
+                        self._receive(conn)
+                    if events & selectors.EVENT_WRITE and conn.sock.fileno() != -1:
+                        self._flush(conn)
+                self.tick()
+        finally:
+            for key in list(self.selector.get_map().values()):
+                key.fileobj.close()
+            self.selector.close()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        self._stop.set()
+
+    def _accept(self):
+        try:
+            sock, address = self.listener.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, _Connection(sock, address))
+
+    def _close(self, conn):
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+        if conn.host and self.connections.get(conn.host) is conn:
+            del self.connections[conn.host]
+            for group in self.groups.values():
+                group.pending.discard(conn.host)
+            logger.info(f"Agent {conn.host} disconnected")
+
+    def _receive(self, conn):
+        try:
+            data = conn.sock.recv(262144)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(conn)
+            return
+        conn.inbuf += data
+        while b"\n" in conn.inbuf:
+            line, conn.inbuf = conn.inbuf.split(b"\n", 1)
+            try:
+                self.handle(conn, json.loads(line))
+            except Exception as e:
+                logger.error(f"Bad message from {conn.host or conn.address}: {str(e)}")
+
+    def _send(self, conn, message):
+        conn.outbuf += encode(message)
+        if len(conn.outbuf) > self.max_outbuf:
+            logger.warning(f"Agent {conn.host} is not reading, dropping it")
+            self._close(conn)
+            return False
+        self._flush(conn)
+        return True
+
+    def _flush(self, conn):
+        try:
+            sent = conn.sock.send(conn.outbuf)
+            conn.outbuf = conn.outbuf[sent:]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._close(conn)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.outbuf else 0)
+        self.selector.modify(conn.sock, events, conn)
+
+    def handle(self, conn, message):
+        kind = message.get('type')
+        if kind == 'hello':
+            host = message['host']
+            if self.token is not None and not hmac.compare_digest(str(message.get('token') or ""), self.token):
+                logger.warning(f"Rejecting agent {host} from {conn.address[0]}: bad token")
+                self._close(conn)
+                return
+            if conn.host is not None and conn.host != host:
+                logger.warning(f"Agent {conn.host} tried to rename itself to {host}, dropping it")
+                self._close(conn)
+                return
+            previous = self.connections.get(host)
+            if previous is not None and previous is not conn:
+                self._close(previous)
+            conn.host = host
+            self.connections[host] = conn
+            logger.info(f"Agent {host} connected from {conn.address[0]}")
+        elif conn.host is None:
+            logger.warning(f"Dropping {kind} from {conn.address[0]} before its hello")
+        elif message.get('host', conn.host) != conn.host:
+            logger.warning(f"Dropping {kind} from agent {conn.host} claiming to be {message['host']}")
+        elif kind == 'report':
+            self.ingest(conn.host, message)
+        elif kind == 'result':
+            self.on_result(conn.host, message)
+
+    def ingest(self, host, report):
+        """Open or close failures for one host from its latest report"""
+        self.counts['reports'] += 1
+        self.hosts[host] = report
+
+        for service, status in report['services'].items():
+            key = (host, 'service', service)
+            if status == "active":
+                self.close_failure(key)
+            else:
+                logs = report['logs'].get(service, "")
+                self.open_failure(key, f"service:{fingerprint(service, status, logs)}",
+                                  {'service': service, 'status': status, 'logs': logs,
+                                   # Agents probe by process, so a failing service has none running
+                                   'process_missing': True})
+
+        memory = report.get('memory')
+        if memory:
+            key = (host, 'memory', 'memory')
+            if memory['critical']:
+                self.open_failure(key, f"memory:{host}", memory)
+            else:
+                self.close_failure(key)
+
+        dns = report.get('dns')
+        if dns:
+            key = (host, 'dns', 'dns')
+            if dns['working']:
+                self.close_failure(key)
+            else:
+                outcome = dns['error'] or ",".join(sorted(f"{s['server']}={s['status']}" for s in dns['servers']))
+                self.open_failure(key, f"dns:{outcome}",
+                                  {'probe': dns, 'resolv_content': report.get('resolv_content', "")})
+
+    def open_failure(self, key, signature, context):
+        if key in self.failing or key in self.given_up:
+            return
+        host, kind, target = key
+        group = self.groups.get(signature)
+        if group is None:
+            group = self.groups[signature] = IncidentGroup(signature, kind, target, context)
+            self.counts['groups'] += 1
+        group.hosts[host] = time.time()
+        self.failing[key] = signature
+        self.counts['failures'] += 1
+        logger.info(f"{host}: {kind} {target} failing (group {len(group.hosts)} hosts)")
+
+    def close_failure(self, key, healed=True):
+        if healed:
+            self.given_up.discard(key)
+        signature = self.failing.pop(key, None)
+        if signature is None:
+            return
+        host, kind, target = key
+        attempts = self.attempts.pop(key, 0)
+        group = self.groups.get(signature)
+        detected_at = group.hosts.pop(host, None) if group else None
+        if group:
+            group.pending.discard(host)
+            group.sent_at.pop(host, None)
+
+        now = time.time()
+        self.history.append({'host': host, 'kind': kind, 'target': target, 'signature': signature,
+                             'detected_at': detected_at, 'closed_at': now, 'healed': healed,
+                             'attempts': attempts})
+        if attempts:
+            metrics.HEALS.labels(kind, target, "success" if healed else "failure").inc()
+            if healed:
+                self.counts['healed'] += 1
+                if detected_at:
+                    metrics.TIME_TO_RECOVERY.labels(kind).observe(now - detected_at)
+            if group:
+                self.diagnoser.record_incident(
+                    kind, f"{target}@{host}", detected_at or now, healed,
+                    status=f"{attempts} remediation(s)", diagnosis=group.diagnosis,
+                    actions=json.dumps(group.remediation), source=group.source,
+                    details=f"Fleet group {signature} ({len(group.hosts) + 1} hosts)")
+                if healed and group.cache_key and not group.cached:
+                    # Only remember diagnoses whose fix worked
+                    self.diagnoser.diagnosis_cache.put(group.cache_key, group.diagnosis)
+                    group.cached = True
+        if group and not group.hosts and (group.future is None or group.future.done()):
+            del self.groups[signature]
+
+    def tick(self):
+        """Start due diagnoses, collect finished ones and send remediations"""
+        now = time.monotonic()
+        for group in list(self.groups.values()):
+            if not group.diagnosed:
+                if group.future is None:
+                    if now - group.first_seen >= self.correlation_window:
+                        group.future = self.executor.submit(self.diagnose, group)
+                elif group.future.done():
+                    group.future = None
+                    group.diagnosed = True
+                    self.counts['diagnoses'][group.source] += 1
+                    logger.info(f"Group {group.signature}: {len(group.hosts)} hosts, "
+                                f"{group.source} diagnosis, remediation {group.remediation}")
+                if not group.diagnosed:
+                    continue
+            if not group.hosts:
+                del self.groups[group.signature]
+                continue
+            if group.remediation is None:
+                continue
+
+            for host in list(group.hosts):
+                key = (host, group.kind, group.target)
+                if host in group.pending or host not in self.connections:
+                    continue
+                if now - group.sent_at.get(host, -self.retry_delay) < self.retry_delay:
+                    continue
+                if self.attempts.get(key, 0) >= self.max_attempts:
+                    self.give_up(key, group)
+                    continue
+                self.send_remediation(group, host)
+
+    def give_up(self, key, group):
+        logger.error(f"{key[0]}: {group.kind} {group.target} not healed after {self.max_attempts} attempts")
+        self.counts['gave_up'] += 1
+        if group.source == "cache":
+            self.diagnoser.diagnosis_cache.invalidate(group.cache_key)
+        self.close_failure(key, healed=False)
+        # Not retried until the host reports it healthy again
+        self.given_up.add(key)
+
+    def send_remediation(self, group, host):
+        self.next_id += 1
+        message = dict(group.remediation, type='remediate', id=self.next_id, kind=group.kind,
+                       target=group.target)
+        if self._send(self.connections[host], message):
+            key = (host, group.kind, group.target)
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            self.remediations[self.next_id] = (group.signature, host)
+            group.pending.add(host)
+            group.sent_at[host] = time.monotonic()
+            self.counts['remediations'] += 1
+
+    def on_result(self, host, message):
+        signature, sent_to = self.remediations.get(message['id'], (None, None))
+        if sent_to != host:
+            return  # not a remediation this host was sent
+        del self.remediations[message['id']]
+        group = self.groups.get(signature)
+        if group is None:
+            return
+        group.pending.discard(host)
+        if group.rule is not None:
+            self.diagnoser.rule_engine.record(group.rule, message['success'])
+        if not message['success']:
+            logger.warning(f"{host}: remediation for {group.kind} {group.target} failed: {message['output']}")
+        # Success is confirmed by the host's next report, which closes the failure
+
+    def diagnose(self, group):
+        """Runs on the diagnosis pool; fills in the group's diagnosis and remediation"""
+        try:
+            if group.kind == 'service':
+                self._diagnose_service(group)
+            elif group.kind == 'memory':
+                self._diagnose_memory(group)
+            elif group.kind == 'dns':
+                self._diagnose_dns(group)
+        except Exception as e:
+            logger.error(f"Error diagnosing {group.signature}: {str(e)}")
+            group.source = group.source or "model"
+            group.remediation = None
+
+    def _diagnose_service(self, group):
+        daemon, context = self.diagnoser, group.context
+        service = context['service']
+        group.rule = daemon.rule_engine.match("service", context)
+        if group.rule:
+            group.diagnosis, group.source = group.rule.render({'service': service}), "rule"
+        else:
+            cache_key = fingerprint(service, context['status'], context['logs'])
+            group.diagnosis = daemon.diagnosis_cache.get(cache_key)
+            group.cache_key = cache_key
+            if group.diagnosis is not None:
+                group.source, group.cached = "cache", True
+            else:
+                group.diagnosis = daemon.diagnose_issue(service, context['logs'], context['status'])
+                group.source = "model"
+        command = daemon.parse_diagnosis(group.diagnosis)
+        if command in SERVICE_COMMANDS:
+            group.remediation = {'action': 'service', 'service': service, 'command': command}
+
+    def _diagnose_memory(self, group):
+        daemon = self.diagnoser
+        group.diagnosis = daemon.diagnose_memory_issue(daemon.format_memory_status(group.context))
+        group.source = "model"
+        actions = daemon.parse_memory_actions(group.diagnosis)
+        if actions:
+            group.remediation = {'action': 'memory', 'actions': actions}
+
+    def _diagnose_dns(self, group):
+        daemon, context = self.diagnoser, group.context
+        group.rule = daemon.rule_engine.match("dns", context)
+        if group.rule:
+            group.diagnosis, group.source = group.rule.render({}), "rule"
+        else:
+            group.diagnosis = daemon.diagnose_dns_issue(None, context['probe'], context['resolv_content'])
+            group.source = "model"
+        command = daemon.parse_dns_diagnosis(group.diagnosis)
+        if command in DNS_COMMANDS:
+            group.remediation = {'action': 'dns', 'command': command}
+
+    def status(self):
+        """Fleet summary for status.json"""
+        return {
+            'agents': len(self.connections),
+            'failing': len(self.failing),
+            'groups': {signature: {'kind': group.kind, 'target': group.target, 'hosts': sorted(group.hosts),
+                                   'source': group.source, 'remediation': group.remediation}
+                       for signature, group in list(self.groups.items())},
+            'counts': self.counts,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SentinelOS fleet controller and agent")
+    subparsers = parser.add_subparsers(dest="role", required=True)
+    controller_parser = subparsers.add_parser("controller")
+    controller_parser.add_argument("--listen", default=f"127.0.0.1:{DEFAULT_PORT}")
+    controller_parser.add_argument("--token", default=os.environ.get("SENTINEL_FLEET_TOKEN"))
+    agent_parser = subparsers.add_parser("agent")
+    agent_parser.add_argument("--controller", required=True)
+    agent_parser.add_argument("--host", default=None)
+    agent_parser.add_argument("--interval", type=float, default=10)
+    agent_parser.add_argument("--token", default=os.environ.get("SENTINEL_FLEET_TOKEN"))
+    args = parser.parse_args()
+
+    if args.role == "controller":
+        # Only the controller needs the model client, cache and incident store
+        from healing_daemon import SelfHealingDaemon
+        diagnoser = SelfHealingDaemon(api_key=os.environ.get("CLAUDE_API_KEY"))
+        FleetController(diagnoser, parse_address(args.listen), token=args.token).serve_forever()
+    else:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        FleetAgent(parse_address(args.controller), args.host, interval=args.interval, token=args.token).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,36 @@
 
 import subprocess
 import time
-import json
 import logging
 import os
 import sys
-import requests
 from datetime import datetime
-import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from proc_scanner import ProcessTable, process_cgroup, read_meminfo
+from process_index import (ProcessIndex, classify_process, EXPENDABLE,
+                           ESSENTIAL_PROCESSES, PROTECTED_PROCESSES)
+from scheduler import Scheduler
+from kmsg import KernelLogTailer
+from log_tail import tail
+from diagnosis_client import DiagnosisClient
+from diagnosis_cache import DiagnosisCache, fingerprint
+from rules import RuleEngine, DEFAULT_RULES
+from service_watcher import ServiceWatcher, read_pidfile
+from memory_pressure import MemoryPressureDetector
+from cgroup_memory import CgroupMemory
+from dns_probe import probe_resolv_conf, format_probe, reset_resolv_conf
+from timeseries import TimeSeriesWriter
+from incident_store import IncidentStore
+from incident_batcher import IncidentBatcher
+from crash_loop import CrashLoopGuard, BREAKER_STATES, CLOSED
+from remediation import RemediationExecutor
+from prompt_builder import PromptBuilder, keep_head, keep_tail
+from command_stream import CommandStream
+from service_config import ConfigWatcher, SERVICE_ACTIONS
+from status_channel import StatusPublisher
+import metrics
 
 # Ensure log directory exists
 os.makedirs("/var/log/self-healing", exist_ok=True)
@@ -24,164 +47,367 @@ logging.basicConfig(
 )
 logger = logging.getLogger("self-healing")
 
+
+# First words of the commands a diagnosis may ask for
+MEMORY_ACTIONS = ("kill", "service", "reclaim", "throttle")
+DNS_COMMANDS = ("ping_ip", "check_resolv")
+
+
+def run_command(args, **kwargs):
+    """subprocess.run, counted so fork rates show up in the metrics"""
+    metrics.SUBPROCESS_FORKS.labels(args[0]).inc()
+    return subprocess.run(args, **kwargs)
+
+
 class SelfHealingDaemon:
-    def __init__(self, api_key=None, auto_fix=True):
+    def __init__(self, api_key=None, auto_fix=True, state_dir="/var/log/self-healing", proc_root="/proc",
+                 config_path="/etc/self-healing/services.json"):
         self.api_key = api_key
         self.auto_fix = auto_fix
-        self.monitored_services = ["ssh", "apache2"]
+        self.state_dir = state_dir  # Incidents, caches, status and time series live here
+        self.proc_root = proc_root
+        # Monitored services, their probes, logs and allowed fixes come from the config file
+        self.config_path = config_path
+        self.config_watcher = ConfigWatcher(config_path, self.apply_config)
+        self.config_check_interval = 5  # How often the config file is checked for changes
+        self.services = {}
+        self.monitored_services = []
+        # Process name to look for per service; services not listed match their own name
+        self.service_processes = {}
+        # Log files tailed for diagnosis, per service
+        self.log_sources = {}
+        self.log_max_bytes = 16384  # Upper bound on log bytes read per source
+        self.log_lines = 200  # Lines read per source; the prompt builder picks what the model sees
+        # Token budgets for the parts of diagnosis prompts that grow with the host
+        self.prompt_budgets = {
+            'service_logs': 1500,  # per service
+            'batch_logs': 4000,  # all services of a combined diagnosis
+            'memory_info': 2000,
+            'resolv_conf': 300,
+            'dns_attempts': 1000,
+        }
+        # Pidfiles identify a service's main process, and back the inotify fallback
+        self.service_pidfiles = {}
+        self.service_watcher = ServiceWatcher(self.on_service_exit, self.service_pidfiles)
+        self.service_next_check = {}  # service -> monotonic time its probe is next due
+        # Network probes (TCP, HTTP, unix socket) of one tick run concurrently
+        self.probe_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sentinel-probe")
+        self.process_table = ProcessTable(proc_root)
+        self.kernel_log = KernelLogTailer(cursor_path=os.path.join(state_dir, "kmsg.cursor"))
         self.service_status = {}
         self.api_url = "https://api.anthropic.com/v1/messages"
+        self.diagnosis_client = DiagnosisClient(api_key, self.api_url)
+        self.diagnosis_cache = DiagnosisCache(path=os.path.join(state_dir, "diagnosis_cache.json"))
+        self.rule_engine = RuleEngine(DEFAULT_RULES)
+        self.incident_store = IncidentStore(os.path.join(state_dir, "incidents.db"))
         self.memory_threshold = 90  # Memory usage threshold percentage
-        self.last_dns_check = 0  # Track when we last checked DNS
-        # Add tracking for services being fixed
-        self.services_being_fixed = set()
-        # Add tracking for memory and DNS fixes
-        self.memory_fix_in_progress = False
-        self.dns_fix_in_progress = False
+        self.memory_pressure = MemoryPressureDetector(rise_percent=self.memory_threshold, fall_percent=85)
+        self.memory_check_lock = threading.Lock()
+        self.top_process_count = 10  # Processes kept in the memory ranking
+        # Per-cgroup accounting and reclaim/throttle actions (cgroup v2 only)
+        self.cgroup_memory = CgroupMemory()
+        self.top_cgroup_count = 5  # Cgroups kept in the memory ranking
+        # Process names (or name prefixes) that are never memory remediation targets: essential ones
+        # keep the host up and reachable, protected ones are the workload worth keeping alive.
+        # Processes of monitored services are protected as well.
+        self.essential_processes = set(ESSENTIAL_PROCESSES)
+        self.protected_processes = set(PROTECTED_PROCESSES)
+        self.process_index = ProcessIndex(self.classify_process, proc_root)
+        # Without a model, kill the top-ranked victim only if it holds at least this share of memory
+        self.min_victim_percent = 10
+        # Per-check intervals in seconds; each probe runs on its own schedule.
+        # The service check ticks at the shortest configured service interval.
+        self.service_check_interval = 10
+        self.memory_check_interval = 10
+        self.dns_check_interval = 30
+        self.dns_probe_timeout = 2.0  # Per-probe timeout; all nameservers are queried concurrently
+        self.last_dns_probe = None
+        self.status_interval = 10
+        # Status is checked often but only published (socket and file) when it changes
+        self.status_publish_interval = 1
+        self.status_publisher = StatusPublisher(os.path.join(state_dir, "status.sock"),
+                                                os.path.join(state_dir, "status.json"))
+        self.scheduler = Scheduler()
+        # Fixed-size time series of memory, service status, probe latency and heal durations
+        self.timeseries_path = os.path.join(state_dir, "metrics.ring")
+        self.timeseries = None
+        self.heal_durations = {}  # completed since the last sample, in ms
+        self.failure_detected_at = {}  # target -> first detection time of the open failure
+        self.metrics_port = 9105
+        # Bounded pool for fixes; also guarantees one fix per service, memory or DNS at a time
+        self.remediation = RemediationExecutor(max_workers=4)
+        self.fix_timeout = 30  # Seconds before a fix command is abandoned
+        # Services failing within this many seconds of each other are diagnosed with one call
+        self.heal_batch_window = 0.5
+        self.incident_batcher = IncidentBatcher(
+            lambda services: self.scheduler.submit(f"heal {', '.join(services)}",
+                                                   self.handle_failing_services, services),
+            window=self.heal_batch_window)
+        # Spaces out heals of a service that keeps failing and stops them once heals stop holding
+        self.crash_loops = CrashLoopGuard(window=300, base_delay=5, max_delay=300, max_failed_heals=3,
+                                          cooldown=600, stable_after=30, on_change=self.on_breaker_change)
+        self.apply_config(self.config_watcher.load())
         
         logger.info("Self-Healing Daemon initialized")
         if not api_key:
             logger.warning("No API key provided - will use fallback diagnosis")
         
+    @property
+    def memory_fix_in_progress(self):
+        return self.remediation.in_progress("memory")
+
+    @property
+    def dns_fix_in_progress(self):
+        return self.remediation.in_progress("dns")
+
+    def apply_config(self, services):
+        """Switch to a new set of service definitions; used at startup and on every hot reload"""
+        removed = set(self.services) - set(services)
+        for name in set(services) - set(self.services):
+            metrics.CIRCUIT_BREAKER_STATE.labels(name).set(BREAKER_STATES[CLOSED])
+        self.services = services
+        self.monitored_services = list(services)
+        self.service_processes = {name: service.process_name for name, service in services.items()
+                                  if service.process_name}
+        self.log_sources = {name: service.logs for name, service in services.items()}
+        # The watcher holds this dict, so update it in place
+        self.service_pidfiles.clear()
+        self.service_pidfiles.update({name: service.pidfile for name, service in services.items()
+                                      if service.pidfile})
+        for name in removed:
+            self.service_status.pop(name, None)
+            self.service_next_check.pop(name, None)
+            self.service_watcher.unwatch(name)
+            self.crash_loops.forget(name)
+
+        # Service membership decides which processes are protected
+        self.process_index.reclassify()
+
+        self.service_check_interval = min(service.interval for service in services.values())
+        job = self.scheduler.periodic.get("services")
+        if job:
+            job.interval = self.service_check_interval
+        logger.info(f"Monitoring {len(services)} services: "
+                    + ", ".join(f"{name} ({service.probe.describe()} every {service.interval}s)"
+                                for name, service in services.items()))
+
+    def reload_config(self):
+        """Config probe: pick up edits to the service config without a restart"""
+        self.config_watcher.poll()
+
     def monitor_services(self):
-        """Check the status of all monitored services"""
-        for service in self.monitored_services:
+        """Check the status of the monitored services whose probes are due"""
+        services = self.services
+        now = time.monotonic()
+        # Half a tick of slack, so scheduling jitter does not push a probe back a whole tick
+        slack = self.service_check_interval / 2
+        due = [service for service in services if self.service_next_check.get(service, 0) - slack <= now]
+        if not due:
+            return
+
+        # One walk of /proc answers every process probe for this tick
+        scanned = False
+        if any(services[service].probe.process_name for service in due):
             try:
-                # Simplified service check for Docker demo
-                if service == "ssh":
-                    result = subprocess.run(
-                        ["pgrep", "sshd"],
-                        capture_output=True, text=True, check=False
-                    )
-                    status = "active" if result.returncode == 0 else "inactive"
-                elif service == "apache2":
-                    result = subprocess.run(
-                        ["pgrep", "apache2"],
-                        capture_output=True, text=True, check=False
-                    )
-                    status = "active" if result.returncode == 0 else "inactive"
+                self.process_table.refresh()
+                scanned = True
+            except Exception as e:
+                logger.error(f"Error scanning process table: {str(e)}")
+
+        network = {service: self.probe_pool.submit(services[service].probe.check, None)
+                   for service in due if not services[service].probe.process_name}
+
+        for service in due:
+            self.service_next_check[service] = now + services[service].interval
+            try:
+                if service in network:
+                    status = "active" if network[service].result() else "inactive"
+                elif scanned:
+                    status = "active" if services[service].probe.check(self.process_table) else "inactive"
                 else:
                     status = "unknown"
+                if service not in self.services:
+                    continue  # Removed by a config reload during the probe
                 
                 # If status changed, log it
                 if service in self.service_status and self.service_status[service] != status:
                     logger.info(f"Service {service} changed from {self.service_status[service]} to {status}")
                 
                 self.service_status[service] = status
+                metrics.SERVICE_UP.labels(service).set(1 if status == "active" else 0)
                 logger.info(f"Service {service} status: {status}")
             except Exception as e:
                 logger.error(f"Error checking service {service}: {str(e)}")
                 self.service_status[service] = "unknown"
     
-    def get_service_logs(self, service, lines=20):
-        """Get logs for a service (simplified for demo)"""
-        try:
-            if service == "ssh":
-                # Create log file if it doesn't exist
-                if not os.path.exists("/var/log/auth.log"):
-                    with open("/var/log/auth.log", "w") as f:
-                        f.write("SSH log file created for demo\n")
-                
-                result = subprocess.run(
-                    ["cat", "/var/log/auth.log"],
-                    capture_output=True, text=True, check=False
-                )
-                return result.stdout or "No SSH logs found"
-            elif service == "apache2":
-                # Create log file if it doesn't exist
-                os.makedirs("/var/log/apache2", exist_ok=True)
-                if not os.path.exists("/var/log/apache2/error.log"):
-                    with open("/var/log/apache2/error.log", "w") as f:
-                        f.write("Apache error log file created for demo\n")
-                
-                result = subprocess.run(
-                    ["cat", "/var/log/apache2/error.log"],
-                    capture_output=True, text=True, check=False
-                )
-                return result.stdout or "No Apache logs found"
+    def get_service_logs(self, service, lines=20, max_bytes=None):
+        """Get the tail of each configured log source for a service"""
+        sources = self.log_sources.get(service)
+        if not sources:
             return "No logs available for this service"
-        except Exception as e:
-            logger.error(f"Error getting logs for {service}: {str(e)}")
-            return f"Error getting logs: {str(e)}"
+
+        max_bytes = max_bytes or self.log_max_bytes
+        sections = []
+        for path in sources:
+            try:
+                content = tail(path, lines, max_bytes)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.error(f"Error getting logs for {service} from {path}: {str(e)}")
+                continue
+            if content:
+                # Label each source when a service has more than one
+                sections.append(f"==> {path} <==\n{content}" if len(sources) > 1 else content)
+
+        return "\n".join(sections) or f"No {service} logs found"
+
+    def process_missing(self, service):
+        """True if no process of service is running; False if one is, or the service names no process"""
+        config = self.services.get(service)
+        if config and config.probe.process_name:
+            return self.service_status.get(service) != "active"
+        process_name = config.process_name if config else self.service_processes.get(service, service)
+        if not process_name:
+            return False
+        return not ProcessTable(self.proc_root).refresh().is_running(process_name)
+
+    def get_incident_logs(self, service):
+        """A service's recent logs for an incident; the diagnosis prompt compresses them to its budget"""
+        return self.get_service_logs(service, self.log_lines)
     
-    def diagnose_issue(self, service, logs):
-        """Use Claude to diagnose the issue"""
+    def diagnose_issue(self, service, logs, status=None, on_line=None):
+        """Use Claude to diagnose the issue; on_line sees each line of the reply as it streams in"""
         if not self.api_key:
             logger.warning("No API key provided - using fallback diagnosis")
             return self._get_fallback_diagnosis(service)
         
         try:
-            headers = {
-                "x-api-key": self.api_key,
-                "content-type": "application/json",
-                "anthropic-version": "2023-06-01"
-            }
-            
-            data = {
-                "model": "claude-3-7-sonnet-latest",
-                "max_tokens": 1000,
-                "messages": [
-                    {
-                        "role": "user", 
-                        "content": f"""You are a Linux system administrator AI. Analyze these logs for service '{service}' 
-which is currently showing status: {self.service_status[service]}.
+            status = status or self.service_status[service]
+            builder = PromptBuilder("service_diagnosis")
+            logs = builder.section("logs", logs, self.prompt_budgets['service_logs'])
+            actions = self.service_actions(service)
+            commands = "\n".join(f"{i}. {action} {service} - service {service} {action}"
+                                  for i, action in enumerate(actions, 1))
+            prompt = builder.build(f"""You are a Linux system administrator AI. Analyze these logs for service '{service}' 
+which is currently showing status: {status}.
 
 SERVICE: {service}
-CURRENT STATUS: {self.service_status[service]}
+CURRENT STATUS: {status}
 
 RECENT LOGS:
 {logs}
 
 First, diagnose the problem. Then, suggest a fix using ONE of these safe commands:
-1. restart {service} - service {service} restart
-2. start {service} - service {service} start
+{commands}
 
 Format your response exactly like this:
 DIAGNOSIS: [your diagnosis here]
-COMMAND: [command name only - 'restart' or 'start']
+COMMAND: [command name only - {" or ".join(f"'{action}'" for action in actions)}]
 EXPLANATION: [why this command will fix the issue]
 
 Only suggest one of the listed commands. If you're unsure or none of these would help, respond with:
 DIAGNOSIS: [your diagnosis here]
 COMMAND: none
-EXPLANATION: [why more complex intervention is needed]"""
-                    }
-                ]
-            }
+EXPLANATION: [why more complex intervention is needed]""")
             
             # For demo purposes, if we can't reach the API, provide a canned response
-            try:
-                response = requests.post(self.api_url, headers=headers, json=data, timeout=10)
-                if response.status_code == 200:
-                    content = response.json()["content"][0]["text"]
-                    logger.info(f"AI diagnosis for {service}: {content}")
-                    return content
-                else:
-                    logger.error(f"API error: {response.status_code} - {response.text}")
-                    # Fallback for demo
-                    return self._get_fallback_diagnosis(service)
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Could not connect to Claude API: {str(e)}")
+            content = self.diagnosis_client.complete(prompt, "service_diagnosis", on_line=on_line)
+            if content is None:
                 return self._get_fallback_diagnosis(service)
+            logger.info(f"AI diagnosis for {service}: {content}")
+            return content
                 
         except Exception as e:
             logger.error(f"Error diagnosing issue: {str(e)}")
             return self._get_fallback_diagnosis(service)
     
+    def diagnose_issues(self, incidents, on_line=None):
+        """Diagnose several failing services with one call; returns service -> diagnosis.
+
+        incidents maps each service to a dict with its 'status' and 'logs'. Each
+        returned diagnosis has the single-service DIAGNOSIS/COMMAND/EXPLANATION
+        form, so it parses and caches exactly like one from diagnose_issue.
+        """
+        services = list(incidents)
+        if not self.api_key:
+            logger.warning("No API key provided - using fallback diagnosis")
+            return {service: self._get_fallback_diagnosis(service) for service in services}
+
+        try:
+            # The services share one log budget
+            builder = PromptBuilder("service_batch_diagnosis")
+            budget = min(self.prompt_budgets['service_logs'], self.prompt_budgets['batch_logs'] // len(services))
+            sections = "\n\n".join(
+                f"SERVICE: {service}\nCURRENT STATUS: {incident['status']}\n"
+                f"ALLOWED COMMANDS: {', '.join(self.service_actions(service))}\n"
+                f"RECENT LOGS:\n{builder.section('logs', incident['logs'], budget)}"
+                for service, incident in incidents.items())
+            # Every action some service allows, in config order; each service's own list is in its section
+            actions = list(dict.fromkeys(action for service in services
+                                         for action in self.service_actions(service)))
+            commands = "\n".join(f"- {action} - service [name] {action}" for action in actions)
+            prompt = builder.build(f"""You are a Linux system administrator AI. These {len(services)} services failed at about the same time,
+possibly from a shared cause. Analyze the logs for each one.
+
+{sections}
+
+For each service, diagnose the problem. Then, suggest a fix using ONE of the safe commands allowed for it:
+{commands}
+
+Format your response exactly like this, with one block per service, in the order given:
+SERVICE: [service name]
+DIAGNOSIS: [your diagnosis here]
+COMMAND: [command name only - one of the service's ALLOWED COMMANDS]
+EXPLANATION: [why this command will fix the issue]
+
+Only suggest one of the service's allowed commands. If you're unsure or none of these would help for a service, use
+COMMAND: none for that service and explain why more complex intervention is needed.""")
+
+            # Room for one reply block per service
+            max_tokens = min(self.diagnosis_client.max_tokens * len(services), 4000)
+            content = self.diagnosis_client.complete(prompt, "service_batch_diagnosis", max_tokens=max_tokens,
+                                                     on_line=on_line)
+            if content is None:
+                return {service: self._get_fallback_diagnosis(service) for service in services}
+            logger.info(f"AI diagnosis for {', '.join(services)}: {content}")
+
+            diagnoses = self.parse_batch_diagnosis(content)
+            for service in services:
+                if service not in diagnoses:
+                    logger.warning(f"Combined diagnosis has no block for {service}, using fallback")
+                    diagnoses[service] = self._get_fallback_diagnosis(service)
+            return diagnoses
+
+        except Exception as e:
+            logger.error(f"Error diagnosing issues: {str(e)}")
+            return {service: self._get_fallback_diagnosis(service) for service in services}
+
+    def parse_batch_diagnosis(self, content):
+        """Split a combined reply into per-service blocks keyed by their SERVICE: line"""
+        diagnoses = {}
+        service, lines = None, []
+        for line in content.split("\n") + ["SERVICE:"]:
+            if line.startswith("SERVICE:"):
+                if service:
+                    diagnoses[service] = "\n".join(lines).strip()
+                service, lines = line.replace("SERVICE:", "").strip().strip("'\""), []
+            elif service:
+                lines.append(line)
+        return diagnoses
+
     def _get_fallback_diagnosis(self, service):
-        """Fallback diagnosis for demo when API is unavailable"""
-        if service == "ssh":
-            return """DIAGNOSIS: The SSH service appears to be stopped or crashed
-COMMAND: start
-EXPLANATION: Starting the SSH service should restore SSH connectivity"""
-        elif service == "apache2":
-            return """DIAGNOSIS: The Apache web server is not running
-COMMAND: start
-EXPLANATION: Starting the Apache service will restore web server functionality"""
-        else:
-            return """DIAGNOSIS: Unknown service issue
+        """Fallback diagnosis for demo when API is unavailable, from the service's config"""
+        config = self.services.get(service)
+        fallback = config.fallback_diagnosis() if config else None
+        return fallback or """DIAGNOSIS: Unknown service issue
 COMMAND: none
 EXPLANATION: Cannot determine appropriate fix for this service"""
+
+    def service_actions(self, service):
+        """Fix commands allowed for a service; services outside the config get the standard ones"""
+        config = self.services.get(service)
+        return config.actions if config else list(SERVICE_ACTIONS)
     
     def parse_diagnosis(self, diagnosis):
         """Parse the AI diagnosis to extract command"""
@@ -210,6 +436,9 @@ EXPLANATION: Cannot determine appropriate fix for this service"""
         if command not in safe_commands:
             logger.warning(f"Unsupported command: {command}")
             return False
+        if command not in self.service_actions(service):
+            logger.warning(f"Command {command} is not allowed for {service}")
+            return False
             
         # Log the fix attempt
         logger.info(f"Attempting to fix {service} with command: {command}")
@@ -222,10 +451,12 @@ EXPLANATION: Cannot determine appropriate fix for this service"""
                 return True
                 
             # Actually execute the command
-            result = subprocess.run(
+            start = time.perf_counter()
+            result = run_command(
                 safe_commands[command],
-                capture_output=True, text=True, check=False
+                capture_output=True, text=True, check=False, timeout=self.fix_timeout
             )
+            metrics.FIX_DURATION.labels("service").observe(time.perf_counter() - start)
             
             if result.returncode == 0:
                 logger.info(f"Successfully fixed {service} with {command}")
@@ -233,150 +464,359 @@ EXPLANATION: Cannot determine appropriate fix for this service"""
             else:
                 logger.error(f"Failed to fix {service}: {result.stderr}")
                 return False
+        except subprocess.TimeoutExpired:
+            logger.error(f"Fixing {service} with {command} timed out after {self.fix_timeout}s")
+            return False
         except Exception as e:
             logger.error(f"Error applying fix to {service}: {str(e)}")
             return False
     
+    def verify_service(self, service):
+        """Confirm a fix by re-running, with back-off, the service's probe until it passes"""
+        if not self.auto_fix:
+            return True
+        config = self.services.get(service)
+        if config:
+            probe = config.probe
+            # A private snapshot per check, so parallel verifications do not race on the shared table
+            check = lambda: probe.check(ProcessTable(self.proc_root).refresh() if probe.process_name else None)
+        else:
+            process_name = self.service_processes.get(service, service)
+            check = lambda: ProcessTable(self.proc_root).refresh().is_running(process_name)
+        verified, seconds = self.remediation.verify(check)
+        metrics.FIX_VERIFY_DURATION.labels("service").observe(seconds)
+        logger.info(f"Fix for {service} {'verified' if verified else 'NOT verified'} after {seconds * 1000:.0f} ms")
+        return verified
+
+    def fix_service(self, service, command):
+        """Apply a fix and confirm it took; runs on the remediation pool"""
+        return self.apply_fix(service, command) and self.verify_service(service)
+
+    def submit_service_fix(self, service, command):
+        """Start fix_service on the remediation pool; the heal is recorded the moment it is verified"""
+        fix = self.remediation.submit(self.fix_service, service, command)
+        # Recovery counts from when the fix is verified, which may be before the reply has finished
+        fix.add_done_callback(lambda fix: self.record_heal(
+            "service", service, not fix.cancelled() and fix.exception() is None and fix.result()))
+        return fix
+
+    def mark_failure(self, target):
+        """Remember when a failure was first detected, for time-to-recovery"""
+        self.failure_detected_at.setdefault(target, time.time())
+
+    def record_heal(self, kind, target, success):
+        """Count a heal attempt and, on success, observe the time since the failure was detected"""
+        metrics.HEALS.labels(kind, target, "success" if success else "failure").inc()
+        if kind == "service":
+            self.crash_loops.result(target, success)
+        if success:
+            detected_at = self.failure_detected_at.pop(target, None)
+            if detected_at is not None:
+                metrics.TIME_TO_RECOVERY.labels(kind).observe(time.time() - detected_at)
+
+    def record_incident(self, kind, target, started_at, success, **fields):
+        """Append a heal to the incident store; a storage error must not fail the heal"""
+        try:
+            if isinstance(fields.get('actions'), list):
+                fields['actions'] = "\n".join(fields['actions'])
+            self.incident_store.record(kind, target, started_at, success, **fields)
+        except Exception as e:
+            logger.error(f"Error recording {kind} incident: {str(e)}")
+
     def handle_failing_service(self, service):
         """Handle a failing service"""
-        # Check if service is already being fixed
-        if service in self.services_being_fixed:
-            logger.info(f"Fix already in progress for {service}, skipping")
-            return False
+        return self.handle_failing_services([service]).get(service, False)
+
+    def handle_failing_services(self, services):
+        """Heal services that failed together; those that need the model share one diagnosis call.
 
+        Returns a dict of service -> fix result for the services this call handled.
+        """
+        # Check if each service is already being fixed, and mark it in the same step
+        claimed = [service for service in services if self.remediation.try_acquire(f"service:{service}")]
+        for service in services:
+            if service not in claimed:
+                logger.info(f"Fix already in progress for {service}, skipping")
+        if not claimed:
+            return {}
+
+        start = time.perf_counter()
         try:
-            # Mark service as being fixed
-            self.services_being_fixed.add(service)
-            logger.info(f"Handling failing service: {service}")
-            
-            # Get service logs
-            logs = self.get_service_logs(service)
-            
-            # Diagnose the issue
-            diagnosis = self.diagnose_issue(service, logs)
-            
-            # Save diagnosis and logs for reference
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            with open(f"/var/log/self-healing/{service}_{timestamp}.log", "w") as f:
-                f.write(f"=== SERVICE: {service} ===\n")
-                f.write(f"=== STATUS: {self.service_status[service]} ===\n")
-                f.write(f"=== LOGS ===\n{logs}\n\n")
-                f.write(f"=== DIAGNOSIS ===\n{diagnosis}\n")
-            
-            # Parse and apply fix
-            command = self.parse_diagnosis(diagnosis)
-            success = self.apply_fix(service, command)
-            
-            # Update the log with the result
-            with open(f"/var/log/self-healing/{service}_{timestamp}.log", "a") as f:
-                f.write(f"\n=== FIX COMMAND: {command} ===\n")
-                f.write(f"=== FIX RESULT: {'SUCCESS' if success else 'FAILED'} ===\n")
-            
-            return success
+            incidents = {}
+            for service in claimed:
+                logger.info(f"Handling failing service: {service}")
+                logs = self.get_incident_logs(service)
+                status = self.service_status[service]
+                incidents[service] = {
+                    'started_at': time.time(),
+                    'status': status,
+                    'logs': logs,
+                    'report': [
+                        f"=== SERVICE: {service} ===\n",
+                        f"=== STATUS: {status} ===\n",
+                        f"=== LOGS ===\n{logs}\n\n",
+                    ],
+                    'success': False,
+                }
+
+            # Deterministic rules first; the model is only consulted if none match or the fix does not hold
+            rule_fixes = {}
+            for service, incident in incidents.items():
+                rule = self.rule_engine.match("service", {
+                    'service': service,
+                    'status': incident['status'],
+                    'logs': incident['logs'],
+                    'process_missing': self.process_missing(service),
+                })
+                if rule:
+                    incident['diagnosis'] = rule.render({'service': service})
+                    incident['command'] = self.parse_diagnosis(incident['diagnosis'])
+                    # Independent services are fixed and verified in parallel
+                    rule_fixes[service] = (rule, self.remediation.submit(self.fix_service, service,
+                                                                         incident['command']))
+            for service, (rule, fix) in rule_fixes.items():
+                incident = incidents[service]
+                incident['success'] = fix.result()
+                self.rule_engine.record(rule, incident['success'])
+                incident['source'] = f"rule {rule.name}"
+                if not incident['success']:
+                    logger.info(f"Rule {rule.name} did not fix {service}, escalating to AI diagnosis")
+                    incident['report'].append(f"=== RULE {rule.name} FAILED: {incident['command']} ===\n\n")
+
+            # Reuse the diagnosis of an identical earlier incident if one is cached
+            unresolved = [service for service, incident in incidents.items() if not incident['success']]
+            needs_model = []
+            for service in unresolved:
+                incident = incidents[service]
+                incident['cache_key'] = fingerprint(service, incident['status'], incident['logs'])
+                diagnosis = self.diagnosis_cache.get(incident['cache_key'])
+                if diagnosis is not None:
+                    logger.info(f"Using cached diagnosis for {service}")
+                    incident['diagnosis'], incident['source'] = diagnosis, "cache"
+                else:
+                    needs_model.append(service)
+
+            # Fixes start as soon as their COMMAND: line has streamed in, ahead of the explanation
+            stream = CommandStream("service", self.submit_service_fix,
+                                   lambda service, command: command in self.service_actions(service), needs_model)
+            if len(needs_model) == 1:
+                service = needs_model[0]
+                incidents[service]['diagnosis'] = self.diagnose_issue(service, incidents[service]['logs'],
+                                                                      on_line=stream.on_line)
+                incidents[service]['source'] = "model"
+            elif needs_model:
+                diagnoses = self.diagnose_issues({service: incidents[service] for service in needs_model},
+                                                 on_line=stream.on_line)
+                for service in needs_model:
+                    incidents[service]['diagnosis'], incidents[service]['source'] = diagnoses[service], "model"
+
+            fixes = {}
+            for service in unresolved:
+                command = incidents[service]['command'] = self.parse_diagnosis(incidents[service]['diagnosis'])
+                fix = stream.take(service, command)
+                fixes[service] = fix if fix is not None else self.submit_service_fix(service, command)
+            for service in unresolved:
+                incident = incidents[service]
+                incident['success'] = fixes[service].result()
+
+                # Only remember diagnoses whose fix worked
+                if incident['success'] and incident['source'] == "model":
+                    self.diagnosis_cache.put(incident['cache_key'], incident['diagnosis'])
+                elif not incident['success'] and incident['source'] == "cache":
+                    self.diagnosis_cache.invalidate(incident['cache_key'])
+
+            # Record the diagnosis and result
+            for service, incident in incidents.items():
+                success = incident['success']
+                report = incident['report']
+                report.append(f"=== DIAGNOSIS ===\n{incident['diagnosis']}\n")
+                report.append(f"\n=== FIX COMMAND: {incident['command']} ===\n")
+                report.append(f"=== FIX RESULT: {'SUCCESS' if success else 'FAILED'} ===\n")
+                report.append(f"=== DIAGNOSIS SOURCE: {incident['source']} ===\n")
+                if len(incidents) > 1:
+                    report.append(f"=== FAILED TOGETHER WITH: {', '.join(s for s in incidents if s != service)} ===\n")
+                if service not in fixes:
+                    self.record_heal("service", service, success)
+                self.record_incident("service", service, incident['started_at'], success,
+                                     status=incident['status'], diagnosis=incident['diagnosis'],
+                                     actions=incident['command'], source=incident['source'],
+                                     details="".join(report))
+
+            return {service: incident['success'] for service, incident in incidents.items()}
         finally:
-            # Always remove service from being fixed set
-            self.services_being_fixed.remove(service)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            for service in claimed:
+                self.heal_durations[service] = elapsed_ms
+            # Always release the services for the next fix
+            for service in claimed:
+                self.remediation.release(f"service:{service}")
     
     def check_memory_status(self):
         """Check system memory status and return relevant information"""
         try:
-            # Get memory info
-            with open('/proc/meminfo') as f:
-                mem_info = {}
-                for line in f:
-                    name, value = line.split(':')
-                    mem_info[name.strip()] = int(value.strip().split()[0])  # Values are in kB
-            
+            # Get memory info (values are in kB)
+            mem_info = read_meminfo(self.proc_root)
+
             total = mem_info['MemTotal']
             available = mem_info['MemAvailable']
             used_percent = ((total - available) / total) * 100
 
-            # Get dmesg output for OOM events
-            dmesg_output = subprocess.run(
-                ["dmesg", "-T"], 
-                capture_output=True, 
-                text=True, 
-                check=False
-            ).stdout
+            # Combine usage, PSI stalls and the usage trend, with hysteresis
+            pressure = self.memory_pressure.update(used_percent)
 
-            # Get top memory consuming processes
-            ps_output = subprocess.run(
-                ["ps", "aux", "--sort=-%mem"], 
-                capture_output=True, 
-                text=True, 
-                check=False
-            ).stdout
+            # Pick up any new kernel OOM events since the last check
+            self.kernel_log.poll()
+
+            # Get top memory consuming processes, and the best kill candidate if it is worth killing
+            self.process_index.refresh()
+            top_processes = self.process_index.top(self.top_process_count)
+            victim = self.process_index.victim()
+            if victim and victim['rss_kb'] * 100 / total < self.min_victim_percent:
+                victim = None
+            # Attribute usage to services and containers where cgroup v2 is mounted
+            cgroups = self.cgroup_memory.collect(self.top_cgroup_count, self.is_essential_cgroup)
 
             return {
                 'used_percent': used_percent,
-                'dmesg': dmesg_output,
-                'top_processes': ps_output,
-                'is_critical': used_percent > self.memory_threshold
+                'oom_events': self.kernel_log.recent_events(10),
+                'top_processes': top_processes,
+                'victim': victim,
+                'cgroups': cgroups,
+                'pressure': pressure,
+                'is_critical': pressure['critical']
             }
         except Exception as e:
             logger.error(f"Error checking memory status: {str(e)}")
             return None
 
+    def classify_process(self, pid, comm, cgroup):
+        """Protection class of a process from its comm, cgroup and service membership"""
+        return classify_process(pid, comm, cgroup, self.essential_processes, self.protected_processes,
+                                {name: self.service_processes.get(name) for name in self.services})
+
+    def is_essential_cgroup(self, path):
+        """Cgroups that reclaim and throttle must never target: our own, monitored services, essential processes"""
+        if path.rstrip("/") in ("", process_cgroup(os.getpid()).rstrip("/")):
+            return True
+        unit = os.path.basename(path.rstrip("/"))
+        if unit.rsplit(".", 1)[0] in self.services or unit == "init.scope":
+            return True
+        for pid in self.cgroup_memory.pids(path):
+            record = self.process_index.validate(pid)
+            if record and record['class'] != EXPENDABLE:
+                return True
+        return False
+
+    def format_top_cgroups(self, cgroups):
+        """Render cgroup memory records as a compact table for the diagnosis prompt"""
+        lines = ["CGROUP CURRENT_MB ANON_MB FILE_MB HIGH_MB HIGH_EVENTS OOM_KILLS PSI_SOME ESSENTIAL"]
+        for cgroup in cgroups:
+            high = cgroup['high_kb'] // 1024 if cgroup['high_kb'] is not None else "max"
+            lines.append(f"{cgroup['path']} {cgroup['current_kb'] // 1024} {cgroup['anon_kb'] // 1024} "
+                         f"{cgroup['file_kb'] // 1024} {high} {cgroup['events']['high']} "
+                         f"{cgroup['events']['oom_kill']} {cgroup['psi_some_avg10']} "
+                         f"{'yes' if cgroup['essential'] else 'no'}")
+        return "\n".join(lines)
+
+    def format_top_processes(self, processes):
+        """Render top process records as a compact table for the diagnosis prompt"""
+        lines = ["PID RSS_MB CLASS CGROUP COMMAND"]
+        for proc in processes:
+            lines.append(f"{proc['pid']} {proc['rss_kb'] // 1024} {proc['class']} "
+                         f"{proc['cgroup'] or '-'} {proc['cmdline'] or proc['comm']}")
+        return "\n".join(lines)
+
+    def format_oom_events(self, events):
+        """Render structured OOM events as compact lines for the diagnosis prompt"""
+        if not events:
+            return "None"
+        lines = []
+        for event in events:
+            when = datetime.fromtimestamp(event['timestamp']).strftime("%Y-%m-%d %H:%M:%S")
+            if event['type'] == 'oom_kill':
+                lines.append(f"{when} OOM killer killed PID {event['pid']} ({event['comm']}), RSS {event['rss_kb']} kB")
+            else:
+                lines.append(f"{when} {event['comm']} invoked the OOM killer")
+        return "\n".join(lines)
+
+    def format_memory_status(self, memory_status):
+        """The system information section of the memory diagnosis prompt"""
+        pressure = memory_status['pressure']
+        info = f"""
+Memory Usage: {memory_status['used_percent']:.2f}%
+Memory Pressure: PSI some avg10 {pressure['psi_some_avg10']}%, full avg10 {pressure['psi_full_avg10']}%, trend {pressure['trend_percent_per_s']:+.2f}%/s, seconds to exhaustion {pressure['seconds_to_exhaustion']}
+
+Recent OOM events:
+{self.format_oom_events(memory_status['oom_events'])}
+
+Top Memory-Consuming Processes:
+{self.format_top_processes(memory_status['top_processes'])}
+"""
+        victim = memory_status.get('victim')
+        if victim:
+            info += (f"Best kill candidate (RSS x expendability): PID {victim['pid']} ({victim['comm']}), "
+                     f"{victim['rss_kb'] // 1024} MB\n")
+        if memory_status.get('cgroups'):
+            info += f"""
+Top Memory-Consuming Cgroups:
+{self.format_top_cgroups(memory_status['cgroups'])}
+"""
+        return info
+
     def handle_memory_issue(self, memory_status):
         """Handle memory issues by analyzing and taking action"""
-        if self.memory_fix_in_progress:
+        if not self.remediation.try_acquire("memory"):
             logger.info("Memory fix already in progress, skipping")
             return False
 
+        start = time.perf_counter()
+        started_at = time.time()
         try:
-            self.memory_fix_in_progress = True
             # Prepare system information for diagnosis
-            system_info = f"""
-Memory Usage: {memory_status['used_percent']:.2f}%
-
-Recent dmesg output:
-{memory_status['dmesg'][-1000:]}  # Last 1000 chars
-
-Top Memory-Consuming Processes:
-{memory_status['top_processes']}
-"""
-            # Get AI diagnosis
-            diagnosis = self.diagnose_memory_issue(system_info)
+            system_info = self.format_memory_status(memory_status)
+            # Get AI diagnosis; each action starts as soon as its line has streamed in
+            stream = CommandStream(
+                "memory", lambda action, _: self.remediation.submit(self.execute_memory_action, action),
+                lambda action, _: action.split()[0] in MEMORY_ACTIONS)
+            diagnosis = self.diagnose_memory_issue(system_info, memory_status.get('victim'), on_line=stream.on_line)
             
             # Parse and execute recommended actions
-            success = self.execute_memory_actions(diagnosis)
+            success = self.execute_memory_actions(diagnosis, stream)
             
             # Log the event
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            with open(f"/var/log/self-healing/memory_{timestamp}.log", "w") as f:
-                f.write(f"=== MEMORY ISSUE ===\n")
-                f.write(f"=== SYSTEM INFO ===\n{system_info}\n")
-                f.write(f"=== DIAGNOSIS ===\n{diagnosis}\n")
-                f.write(f"=== RESULT ===\n{'SUCCESS' if success else 'FAILED'}\n")
+            report = (f"=== MEMORY ISSUE ===\n"
+                      f"=== SYSTEM INFO ===\n{system_info}\n"
+                      f"=== DIAGNOSIS ===\n{diagnosis}\n"
+                      f"=== RESULT ===\n{'SUCCESS' if success else 'FAILED'}\n")
+            self.record_heal("memory", "memory", success)
+            self.record_incident("memory", "memory", started_at, success,
+                                 status=f"{memory_status['used_percent']:.1f}% used", diagnosis=diagnosis,
+                                 actions=self.parse_memory_actions(diagnosis), source="model", details=report)
             
             return success
         finally:
-            self.memory_fix_in_progress = False
+            self.heal_durations['memory'] = (time.perf_counter() - start) * 1000
+            self.remediation.release("memory")
 
-    def diagnose_memory_issue(self, system_info):
+    def diagnose_memory_issue(self, system_info, victim=None, on_line=None):
         """Use Claude to diagnose memory issues and suggest actions"""
         if not self.api_key:
-            return self._get_fallback_memory_diagnosis()
+            return self._get_fallback_memory_diagnosis(victim)
 
         try:
-            headers = {
-                "x-api-key": self.api_key,
-                "content-type": "application/json",
-                "anthropic-version": "2023-06-01"
-            }
-            
-            data = {
-                "model": "claude-3-7-sonnet-latest",
-                "max_tokens": 1000,
-                "messages": [{
-                    "role": "user",
-                    "content": f"""You are a Linux system administrator AI. Analyze this system memory information and suggest actions:
+            builder = PromptBuilder("memory_diagnosis")
+            system_info = builder.section("system_info", system_info, self.prompt_budgets['memory_info'], keep_head)
+            prompt = builder.build(f"""You are a Linux system administrator AI. Analyze this system memory information and suggest actions:
 
 {system_info}
 
 Suggest actions using ONLY these safe commands:
 1. kill [PID] - Kill a specific process
 2. service [name] stop - Stop a non-essential service
+3. reclaim [cgroup] [MB] - Reclaim up to MB megabytes from a non-essential cgroup without stopping it
+4. throttle [cgroup] [MB] - Lower a non-essential cgroup's memory.high to MB megabytes to slow its growth
+
+When a non-essential cgroup is driving the pressure, prefer reclaim or throttle over killing processes.
 
 Format your response exactly like this:
 DIAGNOSIS: [your diagnosis of the memory issue]
@@ -385,124 +825,231 @@ ACTIONS:
 - [another command if needed]
 EXPLANATION: [why these actions will help]
 
-Only suggest killing processes that are clearly non-essential (avoid system processes).
+Only suggest killing processes whose CLASS is expendable; kills of essential or protected processes are refused.
 If no safe action is possible, respond with:
 DIAGNOSIS: [your diagnosis]
 ACTIONS: none
-EXPLANATION: [why automated intervention is not safe]"""
-                }]
-            }
+EXPLANATION: [why automated intervention is not safe]""")
 
-            response = requests.post(self.api_url, headers=headers, json=data, verify=False, timeout=10)
-            if response.status_code == 200:
-                content = response.json()["content"][0]["text"]
-                logger.info(f"AI memory diagnosis: {content}")
-                return content
-            else:
-                logger.error(f"API error: {response.status_code} - {response.text}")
-                return self._get_fallback_memory_diagnosis()
+            content = self.diagnosis_client.complete(prompt, "memory_diagnosis", on_line=on_line)
+            if content is None:
+                return self._get_fallback_memory_diagnosis(victim)
+            logger.info(f"AI memory diagnosis: {content}")
+            return content
 
         except Exception as e:
             logger.error(f"Error getting memory diagnosis: {str(e)}")
-            return self._get_fallback_memory_diagnosis()
+            return self._get_fallback_memory_diagnosis(victim)
 
-    def _get_fallback_memory_diagnosis(self):
-        """Fallback memory diagnosis when API is unavailable"""
+    def _get_fallback_memory_diagnosis(self, victim=None):
+        """Fallback memory diagnosis when API is unavailable: the index's top-ranked victim, if any"""
+        if victim:
+            return f"""DIAGNOSIS: Expendable process {victim['pid']} ({victim['comm']}) holds {victim['rss_kb'] // 1024} MB
+ACTIONS:
+- kill {victim['pid']}
+EXPLANATION: It ranks first by RSS x expendability and is neither essential nor protected"""
         return """DIAGNOSIS: High memory usage detected
 ACTIONS: none
 EXPLANATION: Cannot safely determine which processes to terminate without AI analysis"""
 
-    def execute_memory_actions(self, diagnosis):
-        """Execute the recommended memory actions"""
+    def parse_memory_actions(self, diagnosis):
+        """Extract the action lines from the ACTIONS: section of a memory diagnosis"""
+        actions = []
+        in_actions = False
+
+        for line in diagnosis.split("\n"):
+            if line.startswith("ACTIONS:"):
+                in_actions = True
+                continue
+            elif line.startswith("EXPLANATION:"):
+                break
+            elif in_actions and line.strip().startswith("-"):
+                action = line.strip("- ").strip()
+                if action.lower() != "none":
+                    actions.append(action)
+
+        return actions
+
+    def execute_memory_actions(self, diagnosis, stream=None):
+        """Execute the recommended memory actions, in parallel, each verified; reuses those a stream started"""
         try:
-            lines = diagnosis.split("\n")
-            actions = []
-            in_actions = False
-            
-            for line in lines:
-                if line.startswith("ACTIONS:"):
-                    in_actions = True
-                    continue
-                elif line.startswith("EXPLANATION:"):
-                    break
-                elif in_actions and line.strip().startswith("-"):
-                    action = line.strip("- ").strip()
-                    if action.lower() != "none":
-                        actions.append(action)
+            actions = self.parse_memory_actions(diagnosis)
 
             if not actions:
                 logger.info("No memory actions to execute")
                 return True
 
-            success = True
+            fixes = []
             for action in actions:
-                try:
-                    if not self.auto_fix:
-                        logger.info(f"Would execute: {action}")
-                        continue
-
-                    parts = action.split()
-                    if parts[0] == "kill":
-                        pid = int(parts[1])
-                        subprocess.run(["kill", str(pid)], check=True)
-                        logger.info(f"Killed process {pid}")
-                    elif parts[0] == "service":
-                        service_name = parts[1]
-                        subprocess.run(["service", service_name, "stop"], check=True)
-                        logger.info(f"Stopped service {service_name}")
-                    else:
-                        logger.warning(f"Unsupported action: {action}")
-                        success = False
-                except Exception as e:
-                    logger.error(f"Error executing action '{action}': {str(e)}")
-                    success = False
-
-            return success
+                fix = stream.take(action, action) if stream else None
+                fixes.append(fix if fix is not None else self.remediation.submit(self.execute_memory_action, action))
+            # Wait for every action, not just up to the first failure
+            return all([fix.result() for fix in fixes])
 
         except Exception as e:
             logger.error(f"Error executing memory actions: {str(e)}")
             return False
 
+    def execute_memory_action(self, action):
+        """Run one memory action and confirm its process is gone; runs on the remediation pool"""
+        try:
+            if not self.auto_fix:
+                logger.info(f"Would execute: {action}")
+                return True
+
+            parts = action.split()
+            start = time.perf_counter()
+            if parts[0] == "kill":
+                pid = int(parts[1])
+                # Whoever suggested the PID, only an expendable process is killed
+                record = self.process_index.validate(pid)
+                if record is None or record['class'] != EXPENDABLE:
+                    cls = record['class'] if record else "gone"
+                    logger.warning(f"Refusing to kill PID {pid} ({record['comm'] if record else 'no such process'}): {cls}")
+                    metrics.REFUSED_ACTIONS.labels("kill", cls).inc()
+                    return False
+                run_command(["kill", str(pid)], check=True, timeout=self.fix_timeout)
+                gone = lambda: not os.path.exists(os.path.join(self.proc_root, str(pid)))
+                logger.info(f"Killed process {pid}")
+            elif parts[0] in ("reclaim", "throttle"):
+                return self.execute_cgroup_action(parts[0], parts[1], int(parts[2]))
+            elif parts[0] == "service":
+                service_name = parts[1]
+                cls = self.classify_process(None, service_name, f"/system.slice/{service_name}.service")
+                if cls != EXPENDABLE:
+                    logger.warning(f"Refusing to stop service {service_name}: {cls}")
+                    metrics.REFUSED_ACTIONS.labels("service", cls).inc()
+                    return False
+                run_command(["service", service_name, "stop"], check=True, timeout=self.fix_timeout)
+                process_name = self.service_processes.get(service_name, service_name)
+                gone = lambda: not ProcessTable(self.proc_root).refresh().is_running(process_name)
+                logger.info(f"Stopped service {service_name}")
+            else:
+                logger.warning(f"Unsupported action: {action}")
+                return False
+            metrics.FIX_DURATION.labels("memory").observe(time.perf_counter() - start)
+
+            verified, seconds = self.remediation.verify(gone)
+            metrics.FIX_VERIFY_DURATION.labels("memory").observe(seconds)
+            if not verified:
+                logger.error(f"Action '{action}' ran but its process is still there")
+            return verified
+        except Exception as e:
+            logger.error(f"Error executing action '{action}': {str(e)}")
+            return False
+
+    def execute_cgroup_action(self, kind, path, megabytes):
+        """Reclaim from or throttle one non-essential cgroup, and confirm it gave memory back"""
+        if megabytes <= 0:
+            logger.warning(f"Refusing to {kind} {path}: {megabytes} MB")
+            return False
+        if self.cgroup_memory.resolve(path) is None:
+            logger.warning(f"Refusing to {kind} {path}: not a cgroup")
+            return False
+        if self.is_essential_cgroup(path):
+            logger.warning(f"Refusing to {kind} essential cgroup {path}")
+            metrics.REFUSED_ACTIONS.labels(kind, "essential").inc()
+            return False
+
+        start = time.perf_counter()
+        if kind == "reclaim":
+            freed_kb = self.cgroup_memory.reclaim(path, megabytes)
+            metrics.FIX_DURATION.labels("memory").observe(time.perf_counter() - start)
+            logger.info(f"Reclaimed {freed_kb // 1024} MB from {path}")
+            return freed_kb > 0
+
+        self.cgroup_memory.throttle(path, megabytes)
+        metrics.FIX_DURATION.labels("memory").observe(time.perf_counter() - start)
+        logger.info(f"Lowered memory.high of {path} to {megabytes} MB")
+        # Usage above memory.high is reclaimed under throttling; wait for it to come down
+        verified, seconds = self.remediation.verify(
+            lambda: (self.cgroup_memory.current_kb(path) or 0) <= megabytes * 1024)
+        metrics.FIX_VERIFY_DURATION.labels("memory").observe(seconds)
+        if not verified:
+            logger.error(f"{path} is still above its lowered memory.high")
+        return verified
+
 
     def save_status(self):
-        """Save current status to a file for the dashboard"""
+        """Publish current status to dashboard subscribers and the status file"""
         try:
             status = {
                 'memory_usage': self.memory_status['used_percent'] if hasattr(self, 'memory_status') else 0,
+                'memory_pressure': self.memory_status['pressure'] if hasattr(self, 'memory_status') else {},
                 'service_status': self.service_status,
-                'top_processes': self.memory_status['top_processes'] if hasattr(self, 'memory_status') else '',
+                'top_processes': self.memory_status['top_processes'] if hasattr(self, 'memory_status') else [],
+                'cgroups': self.memory_status['cgroups'] if hasattr(self, 'memory_status') else [],
+                'diagnosis_latency': self.diagnosis_client.latency_report(),
+                'diagnosis_cache': self.diagnosis_cache.stats(),
+                'rules': self.rule_engine.stats(),
+                'crash_loops': self.crash_loops.stats(),
+                'dns_probe': self.last_dns_probe,
                 'timestamp': datetime.now().isoformat()
             }
             
-            with open('/var/log/self-healing/status.json', 'w') as f:
-                json.dump(status, f)
+            self.status_publisher.publish(status)
         except Exception as e:
             logger.error(f"Error saving status: {str(e)}")
 
-    def check_dns_resolution(self):
-        """Check if DNS resolution is working by pinging google.com"""
+    def probe_dns(self):
+        """Query each resolv.conf nameserver directly and record the per-server results"""
         try:
-            result = subprocess.run(
-                ["ping", "-c", "1", "google.com"],
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            
-            if result.returncode == 0:
-                logger.info("DNS resolution check: ping google.com SUCCESS")
-                return True
-            else:
-                logger.error(f"DNS resolution check failed: {result.stderr}")
-                return False
+            result = probe_resolv_conf(timeout=self.dns_probe_timeout)
         except Exception as e:
-            logger.error(f"Error checking DNS resolution: {str(e)}")
-            return False
+            logger.error(f"Error probing DNS: {str(e)}")
+            result = {'working': False, 'query': "google.com", 'servers': [], 'error': str(e)}
+
+        self.last_dns_probe = result
+        if result['working']:
+            logger.info("DNS resolution check: SUCCESS")
+        else:
+            logger.error(format_probe(result))
+        return result
+
+    def timeseries_fields(self):
+        heal_targets = self.monitored_services + ["memory", "dns"]
+        return (["memory_percent"]
+                + [f"service.{service}" for service in self.monitored_services]
+                + [f"probe_ms.{name}" for name in sorted(self.scheduler.periodic)]
+                + [f"heal_ms.{target}" for target in heal_targets])
+
+    def record_timeseries(self):
+        """Append one sample to the memory-mapped time series for the dashboard"""
+        try:
+            fields = self.timeseries_fields()
+            if self.timeseries is None or self.timeseries.fields != fields:
+                if self.timeseries is not None:
+                    self.timeseries.close()
+                    self.timeseries = None
+                self.timeseries = TimeSeriesWriter(self.timeseries_path, fields)
+
+            values = {}
+            if getattr(self, 'memory_status', None):
+                values['memory_percent'] = self.memory_status['used_percent']
+            for service, status in list(self.service_status.items()):
+                if status != "unknown":
+                    values[f"service.{service}"] = 1.0 if status == "active" else 0.0
+            for name, job in list(self.scheduler.periodic.items()):
+                if job.last_duration_ms is not None:
+                    values[f"probe_ms.{name}"] = job.last_duration_ms
+            for target in list(self.heal_durations):
+                values[f"heal_ms.{target}"] = self.heal_durations.pop(target)
+
+            self.timeseries.append(time.time(), values)
+            # Readers see writes through the page cache; msync occasionally for durability
+            if self.timeseries.count % 30 == 0:
+                self.timeseries.flush()
+        except Exception as e:
+            logger.error(f"Error recording time series: {str(e)}")
+
+    def check_dns_resolution(self):
+        """Check if DNS resolution is working by querying the configured nameservers"""
+        return self.probe_dns()['working']
 
     def ping_ip(self):
         """Ping 8.8.8.8 to check if IP connectivity is working"""
         try:
-            result = subprocess.run(
+            result = run_command(
                 ["ping", "-c", "1", "8.8.8.8"],
                 capture_output=True,
                 text=True,
@@ -522,36 +1069,25 @@ EXPLANATION: Cannot safely determine which processes to terminate without AI ana
     def check_resolv(self):
         """Check and reset the resolv.conf file to known good values"""
         try:
-            # Backup current resolv.conf if not already backed up
-            if not os.path.exists("/etc/resolv.conf.bak"):
-                logger.info("Creating backup of resolv.conf")
-                subprocess.run(["cp", "/etc/resolv.conf", "/etc/resolv.conf.bak"], check=False)
-            
-            # Read current content to check if it's already set correctly
-            with open("/etc/resolv.conf", "r") as f:
-                current_content = f.read()
-            
-            # Define good nameservers
-            good_nameservers = "nameserver 8.8.8.8\nnameserver 1.1.1.1\n"
-            
-            # Check if current content matches good nameservers
-            if good_nameservers in current_content:
+            if reset_resolv_conf():
+                logger.info("resolv.conf has been reset to known good nameservers")
+            else:
                 logger.info("resolv.conf is correctly configured")
-                return True
-                
-            # Reset to known good nameservers
-            logger.info("Resetting resolv.conf to known good nameservers")
-            with open("/etc/resolv.conf", "w") as f:
-                f.write(good_nameservers)
-                
-            logger.info("resolv.conf has been reset")
             return True
-            
         except Exception as e:
             logger.error(f"Error checking/resetting resolv.conf: {str(e)}")
             return False
 
-    def diagnose_dns_issue(self, previous_attempts=None):
+    def read_resolv_conf(self):
+        """Return the contents of resolv.conf, or an empty string if it cannot be read"""
+        try:
+            with open("/etc/resolv.conf", "r") as f:
+                return f.read()
+        except Exception as e:
+            logger.error(f"Error reading resolv.conf: {str(e)}")
+            return ""
+
+    def diagnose_dns_issue(self, previous_attempts=None, dns_probe=None, resolv_content=None, on_line=None):
         """Use Claude to diagnose DNS issues and recommend actions"""
         if not self.api_key:
             logger.warning("No API key provided - using fallback DNS diagnosis")
@@ -559,37 +1095,24 @@ EXPLANATION: Cannot safely determine which processes to terminate without AI ana
             return self._get_fallback_dns_diagnosis()
             
         try:
-            # Gather diagnostic information
-            dns_status = "failed" if not self.check_dns_resolution() else "working"
-            
-            # Try to read resolv.conf
-            resolv_content = "Could not read resolv.conf"
-            try:
-                with open("/etc/resolv.conf", "r") as f:
-                    resolv_content = f.read()
-            except Exception as e:
-                logger.error(f"Error reading resolv.conf: {str(e)}")
+            # Gather diagnostic information, reusing the caller's probe if it has one
+            dns_probe = dns_probe or self.probe_dns()
             
+            builder = PromptBuilder("dns_diagnosis")
+            resolv_content = builder.section(
+                "resolv_conf", resolv_content or self.read_resolv_conf() or "Could not read resolv.conf",
+                self.prompt_budgets['resolv_conf'], keep_head)
 
-            # Build the previous attempts section if any
+            # Build the previous attempts section if any; over budget, the newest attempts are kept
             previous_attempts_text = ""
             if previous_attempts:
-                previous_attempts_text = "\nPREVIOUS ATTEMPTS:\n" + "\n".join(previous_attempts)
+                previous_attempts_text = "\nPREVIOUS ATTEMPTS:\n" + builder.section(
+                    "previous_attempts", previous_attempts, self.prompt_budgets['dns_attempts'], keep_tail)
 
-            headers = {
-                "x-api-key": self.api_key,
-                "content-type": "application/json",
-                "anthropic-version": "2023-06-01"
-            }
-            
-            data = {
-                "model": "claude-3-7-sonnet-latest",
-                "max_tokens": 1000,
-                "messages": [{
-                    "role": "user",
-                    "content": f"""You are a Linux system network diagnostics expert. Analyze this DNS issue:
+            prompt = builder.build(f"""You are a Linux system network diagnostics expert. Analyze this DNS issue:
 
-DNS RESOLUTION STATUS: {dns_status} (ping google.com)
+DNS RESOLUTION STATUS:
+{format_probe(dns_probe)}
 
 RESOLV.CONF CONTENT:
 {resolv_content}
@@ -610,33 +1133,16 @@ EXPLANATION: [why this command will help diagnose or fix the issue]
 If neither command is appropriate, respond with:
 DIAGNOSIS: [your diagnosis]
 COMMAND: none
-EXPLANATION: [why these commands won't help]"""
-                }]
-            }
+EXPLANATION: [why these commands won't help]""")
             
-            try:
-                orig = socket.getaddrinfo
-                def fake_getaddrinfo(host, port, *args, **kw):
-                    if host == "api.anthropic.com":
-                        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ("160.79.104.21", port))]
-                    return orig(host, port, *args, **kw)
-
-                socket.getaddrinfo = fake_getaddrinfo
-                response = requests.post(self.api_url, headers=headers, json=data, timeout=10)
-                socket.getaddrinfo = orig
-                if response.status_code == 200:
-                    content = response.json()["content"][0]["text"]
-                    logger.info(f"AI DNS diagnosis: {content}")
-                    logger.info("DNS DIAGNOSIS: USING CLAUDE AI")
-                    return content
-                else:
-                    logger.error(f"API error: {response.status_code} - {response.text}")
-                    logger.info("DNS DIAGNOSIS: USING FALLBACK")
-                    return self._get_fallback_dns_diagnosis()
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Could not connect to Claude API: {str(e)}")
+            # The client falls back to a pinned API address when local DNS is broken
+            content = self.diagnosis_client.complete(prompt, "dns_diagnosis", on_line=on_line)
+            if content is None:
                 logger.info("DNS DIAGNOSIS: USING FALLBACK")
                 return self._get_fallback_dns_diagnosis()
+            logger.info(f"AI DNS diagnosis: {content}")
+            logger.info("DNS DIAGNOSIS: USING CLAUDE AI")
+            return content
                 
         except Exception as e:
             logger.error(f"Error diagnosing DNS issue: {str(e)}")
@@ -661,143 +1167,235 @@ EXPLANATION: Resetting resolv.conf to known good nameservers should restore DNS
                 
         return command
         
+    def run_dns_command(self, command):
+        """Execute one DNS fix command; returns (success, output)"""
+        if command == "ping_ip":
+            logger.info("Executing ping_ip command")
+            success = self.ping_ip()
+            result = run_command(["ping", "-c", "1", "8.8.8.8"], 
+                                  capture_output=True, text=True, check=False)
+            return success, result.stdout + result.stderr
+        if command == "check_resolv":
+            logger.info("Executing check_resolv command")
+            fix_start = time.perf_counter()
+            success = self.check_resolv()
+            metrics.FIX_DURATION.labels("dns").observe(time.perf_counter() - fix_start)
+            with open("/etc/resolv.conf", "r") as f:
+                return success, f.read()
+        logger.info("No fix action recommended")
+        return False, ""
+
     def fix_dns_issue(self):
         """Diagnose and fix DNS issues using AI recommendations"""
-        if self.dns_fix_in_progress:
+        if not self.remediation.try_acquire("dns"):
             logger.info("DNS fix already in progress, skipping")
             return False
 
+        start = time.perf_counter()
         try:
-            self.dns_fix_in_progress = True
             logger.info("Diagnosing DNS issue...")
             
             attempts = 0
             previous_attempts = []
+            tried_rules = set()
+            # One probe per attempt, shared by the diagnosis and the post-fix check
+            dns_probe = self.probe_dns()
             
             # Keep trying until DNS works or we hit max attempts
-            while not self.check_dns_resolution() and attempts < 3:
+            while not dns_probe['working'] and attempts < 3:
                 attempts += 1
                 logger.info(f"Fix attempt {attempts}")
                 
-                # Get diagnosis and wait for it to complete
-                diagnosis = self.diagnose_dns_issue(previous_attempts)
+                # A matching rule gets one try before the model is asked
+                rule = self.rule_engine.match("dns", {
+                    'resolv_content': self.read_resolv_conf(),
+                    'probe': dns_probe,
+                })
+                stream = CommandStream(
+                    "dns", lambda _, command: self.remediation.submit(self.run_dns_command, command),
+                    lambda _, command: command in DNS_COMMANDS)
+                if rule and rule.name not in tried_rules:
+                    tried_rules.add(rule.name)
+                    diagnosis = rule.render({})
+                else:
+                    rule = None
+                    # Get diagnosis; the command starts as soon as its line has streamed in
+                    diagnosis = self.diagnose_dns_issue(previous_attempts, dns_probe, on_line=stream.on_line)
                 command = self.parse_dns_diagnosis(diagnosis)
                 
                 # Save diagnosis and attempt history
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                with open(f"/var/log/self-healing/dns_{timestamp}.log", "w") as f:
-                    f.write(f"=== DNS ISSUE - ATTEMPT {attempts} ===\n")
-                    if previous_attempts:
-                        f.write("=== PREVIOUS ATTEMPTS ===\n")
-                        for attempt in previous_attempts:
-                            f.write(f"{attempt}\n")
-                    f.write(f"=== CURRENT DIAGNOSIS ===\n{diagnosis}\n")
-                
-                # Execute the recommended fix and wait for completion
-                success = False
-                result_output = ""
+                attempt_started_at = time.time()
+                report = [f"=== DNS ISSUE - ATTEMPT {attempts} ===\n"]
+                if previous_attempts:
+                    report.append("=== PREVIOUS ATTEMPTS ===\n")
+                    report.extend(f"{attempt}\n" for attempt in previous_attempts)
+                report.append(f"=== CURRENT DIAGNOSIS ===\n{diagnosis}\n")
                 
-                if command == "ping_ip":
-                    logger.info("Executing ping_ip command")
-                    success = self.ping_ip()
-                    result = subprocess.run(["ping", "-c", "1", "8.8.8.8"], 
-                                          capture_output=True, text=True, check=False)
-                    result_output = result.stdout + result.stderr
-                elif command == "check_resolv":
-                    logger.info("Executing check_resolv command")
-                    success = self.check_resolv()
-                    with open("/etc/resolv.conf", "r") as f:
-                        result_output = f.read()
-                else:
-                    logger.info("No fix action recommended")
+                # Execute the recommended fix (or collect the one already started) and wait for completion
+                fix = stream.take(None, command)
+                success, result_output = fix.result() if fix is not None else self.run_dns_command(command)
                     
+                dns_probe = self.probe_dns()
+                dns_working = dns_probe['working']
+                if rule:
+                    self.rule_engine.record(rule, dns_working)
+
                 # Record this attempt
                 attempt_record = f"""
 Attempt {attempts}:
 Command: {command}
 Output: {result_output}
 Result: {'SUCCESS' if success else 'FAILED'}
-DNS Check After: {'WORKING' if self.check_dns_resolution() else 'STILL FAILING'}
+DNS Check After: {'WORKING' if dns_working else 'STILL FAILING'}
+{format_probe(dns_probe)}
 """
                 previous_attempts.append(attempt_record)
                 
                 # Update the log with the result
-                with open(f"/var/log/self-healing/dns_{timestamp}.log", "a") as f:
-                    f.write(f"\n=== FIX COMMAND: {command} ===\n")
-                    f.write(f"=== COMMAND OUTPUT ===\n{result_output}\n")
-                    f.write(f"=== FIX RESULT: {'SUCCESS' if success else 'FAILED'} ===\n")
+                report.append(f"\n=== FIX COMMAND: {command} ===\n")
+                report.append(f"=== COMMAND OUTPUT ===\n{result_output}\n")
+                report.append(f"=== FIX RESULT: {'SUCCESS' if success else 'FAILED'} ===\n")
+                self.record_heal("dns", "dns", dns_working)
+                self.record_incident("dns", "dns", attempt_started_at, dns_working,
+                                     status=f"attempt {attempts}", diagnosis=diagnosis, actions=command,
+                                     source=f"rule {rule.name}" if rule else "model", details="".join(report))
                 
                 # Check if DNS is fixed
-                if self.check_dns_resolution():
+                if dns_working:
                     logger.info("DNS resolution fixed successfully")
                     return True
                 
                 # Wait longer between attempts to ensure previous fix has time to take effect
                 time.sleep(5)  # Increased from 2 to 5 seconds
             
-            if not self.check_dns_resolution():
+            if not dns_probe['working']:
                 logger.error("Failed to fix DNS after multiple attempts")
                 return False
             
             return True
         finally:
-            self.dns_fix_in_progress = False
+            self.heal_durations['dns'] = (time.perf_counter() - start) * 1000
+            self.remediation.release("dns")
+
+
+    def main_pid(self, service):
+        """The service's main PID: from its pidfile, else its oldest matching process"""
+        pid = read_pidfile(self.service_pidfiles[service], self.proc_root) if service in self.service_pidfiles else None
+        if pid:
+            return pid
+        pids = self.process_table.pids(self.service_processes.get(service, service))
+        return min(pids) if pids else None
+
+    def watch_services(self):
+        """(Re-)arm exit watches on every active service"""
+        for service, status in list(self.service_status.items()):
+            if status != "active":
+                continue
+            pid = self.main_pid(service)
+            if pid:
+                try:
+                    self.service_watcher.watch(service, pid)
+                except Exception as e:
+                    logger.error(f"Error watching {service}: {str(e)}")
 
+    def on_service_exit(self, service):
+        """Watcher callback: heal immediately instead of waiting for the next check"""
+        if service not in self.services:
+            return  # Dropped from the config since the watch was armed
+        self.process_table.refresh()
+        if self.process_table.is_running(self.service_processes.get(service, service)):
+            # Restarted (or other processes remain); follow the new main process
+            self.watch_services()
+            return
+
+        self.service_status[service] = "inactive"
+        self.request_heal(service, "exited")
+
+    def check_services(self):
+        """Service probe: refresh statuses and hand failures to their own remediation tasks"""
+        self.monitor_services()
+        self.watch_services()
+
+        for service, status in list(self.service_status.items()):
+            if status == "active":
+                self.crash_loops.healthy(service)
+            elif not self.remediation.in_progress(f"service:{service}"):
+                self.request_heal(service, f"status: {status}")
+
+    def on_breaker_change(self, service, state):
+        metrics.CIRCUIT_BREAKER_STATE.labels(service).set(BREAKER_STATES[state])
+
+    def request_heal(self, service, reason):
+        """Queue a heal of a failed service unless its backoff or circuit breaker holds it back"""
+        self.mark_failure(service)
+        self.crash_loops.failure(service)
+        allowed, held_by = self.crash_loops.allow(service)
+        if not allowed:
+            metrics.HEALS_HELD_BACK.labels(service, held_by).inc()
+            logger.debug(f"Not healing {service} ({reason}): held back by {held_by}")
+            return False
+        logger.info(f"Detected failing service: {service} ({reason})")
+        return self.incident_batcher.add(service)
+
+    def check_dns(self):
+        """DNS probe: start a fix task if resolution is broken"""
+        if self.dns_fix_in_progress:
+            logger.debug("Skipping DNS check - fix already in progress")
+            return
+
+        logger.info("Performing scheduled DNS resolution check")
+        if not self.check_dns_resolution():
+            logger.warning("DNS resolution is not working, attempting to fix")
+            self.mark_failure("dns")
+            self.scheduler.submit("fix dns", self.fix_dns_issue)
+
+    def check_memory(self):
+        """Memory probe: record usage and start a fix task when critical"""
+        # Runs both on schedule and from the PSI trigger; one check at a time is enough
+        if not self.memory_check_lock.acquire(blocking=False):
+            return
+        try:
+            memory_status = self.check_memory_status()
+        finally:
+            self.memory_check_lock.release()
+
+        self.memory_status = memory_status  # Store for status updates
+
+        if memory_status:
+            metrics.MEMORY_USED.labels().set(memory_status['used_percent'])
+            logger.info(f"Memory percentage used: {memory_status['used_percent']:.2f}%")
+            if memory_status['is_critical']:
+                self.mark_failure("memory")
+            if memory_status['is_critical'] and not self.memory_fix_in_progress:
+                logger.warning(f"Critical memory usage detected: {memory_status['used_percent']:.2f}%")
+                self.scheduler.submit("fix memory", self.handle_memory_issue, memory_status)
+            elif not memory_status['is_critical'] and self.cgroup_memory.throttled:
+                # Pressure is over; give throttled cgroups their old memory.high back
+                for path in self.cgroup_memory.release_throttles():
+                    logger.info(f"Restored memory.high of {path}")
 
     def run(self):
         """Main daemon loop"""
         logger.info("Starting self-healing daemon loop")
-        current_time = time.time()
-        self.last_dns_check = current_time
-        
-        while True:
-            try:
-                current_time = time.time()
-                
-                # Monitor all services
-                self.monitor_services()
-                
-                # Only check DNS if no fix is in progress
-                if not self.dns_fix_in_progress:
-                    # Check DNS resolution every 30 seconds
-                    if current_time - self.last_dns_check >= 30:
-                        logger.info("Performing scheduled DNS resolution check")
-                        dns_working = self.check_dns_resolution()
-                        if not dns_working:
-                            logger.warning("DNS resolution is not working, attempting to fix")
-                            self.fix_dns_issue()
-                        self.last_dns_check = current_time
-                else:
-                    logger.debug("Skipping DNS check - fix already in progress")
-                
-                # Check memory status
-                memory_status = self.check_memory_status()
 
-                self.memory_status = memory_status  # Store for status updates
-                
-                if memory_status:
-                    logger.info(f"Memory percentage used: {memory_status['used_percent']:.2f}%")
-                    if memory_status['is_critical'] and not self.memory_fix_in_progress:
-                        logger.warning(f"Critical memory usage detected: {memory_status['used_percent']:.2f}%")
-                        self.handle_memory_issue(memory_status)
-                
-                # Check for failing services
-                for service, status in self.service_status.items():
-                    if status != "active" and service not in self.services_being_fixed:
-                        logger.info(f"Detected failing service: {service} (status: {status})")
-                        self.handle_failing_service(service)
-                
-                # Save current status for dashboard
-                self.save_status()
-                
-                # Sleep before next check
-                time.sleep(10)  # Check every 10 seconds for demo
-            except KeyboardInterrupt:
-                logger.info("Daemon stopping due to keyboard interrupt")
-                break
-            except Exception as e:
-                logger.error(f"Error in main loop: {str(e)}")
-                time.sleep(10)  # Sleep and retry
+        self.service_watcher.start()
+        # A PSI stall trigger runs the memory check immediately instead of at the next interval
+        self.memory_pressure.start_trigger(lambda: self.scheduler.submit("memory pressure", self.check_memory))
+
+        self.scheduler.every("services", self.service_check_interval, self.check_services)
+        self.scheduler.every("memory", self.memory_check_interval, self.check_memory)
+        # First DNS check after one interval, as before
+        self.scheduler.every("dns", self.dns_check_interval, self.check_dns, delay=self.dns_check_interval)
+        self.status_publisher.start()
+        metrics.start_metrics_server(self.metrics_port)
+        self.scheduler.every("status", self.status_publish_interval, self.save_status, delay=1)
+        self.scheduler.every("timeseries", self.status_interval, self.record_timeseries, delay=1)
+        self.scheduler.every("incident retention", 3600, self.incident_store.compact, delay=60)
+        self.scheduler.every("config", self.config_check_interval, self.reload_config,
+                             delay=self.config_check_interval)
+        self.scheduler.run_forever()
+        self.remediation.shutdown()
+        self.probe_pool.shutdown(wait=False, cancel_futures=True)
 
 def main():
     # Get API key from environment
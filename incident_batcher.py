@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+
+logger = logging.getLogger("self-healing")
+
+
+class IncidentBatcher:
+    """Collects failures reported within window seconds of the first one and hands them over together.
+
+    The batch is flushed when the window closes or as soon as it holds
+    max_batch items; an item already waiting is not added twice.
+    """
+
+    def __init__(self, on_batch, window=0.5, max_batch=10):
+        self.on_batch = on_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def add(self, item):
+        """Queue item for the next batch; returns False if it is already queued"""
+        with self.lock:
+            if item in self.pending:
+                return False
+            self.pending.append(item)
+            full = len(self.pending) >= self.max_batch
+            if not full and self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            self.flush()
+        return True
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if batch:
+            try:
+                self.on_batch(batch)
+            except Exception as e:
+                logger.error(f"Error handing over incident batch {batch}: {str(e)}")
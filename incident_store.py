@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("self-healing")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    status TEXT,
+    diagnosis TEXT,
+    actions TEXT,
+    success INTEGER NOT NULL,
+    source TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS incidents_started_at ON incidents (started_at);
+"""
+
+
+class IncidentStore:
+    """Append-only incident log in SQLite (WAL mode).
+
+    Replaces one .log file per heal: latest-N reads walk the primary key
+    backwards and time-range reads use the started_at index, so queries stay
+    cheap however many incidents accumulate. Retention deletes old rows and
+    gives the pages back with an incremental vacuum.
+    """
+
+    def __init__(self, path, retention_days=30, max_incidents=10000, readonly=False):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_incidents = max_incidents
+        self.lock = threading.Lock()
+        if readonly:
+            self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            # auto_vacuum only takes effect before the first table is created
+            self.db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.db.execute("PRAGMA journal_mode = WAL")
+            self.db.execute("PRAGMA synchronous = NORMAL")
+            self.db.executescript(SCHEMA)
+        self.db.row_factory = sqlite3.Row
+
+    def record(self, kind, target, started_at, success, status=None, diagnosis=None,
+               actions=None, source=None, details=None):
+        """Append one incident and return its id"""
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO incidents (kind, target, started_at, finished_at, status, diagnosis,"
+                " actions, success, source, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, target, started_at, time.time(), status, diagnosis,
+                 actions, int(bool(success)), source, details))
+            return cursor.lastrowid
+
+    def latest(self, n=10, kind=None):
+        """The n most recent incidents, newest first"""
+        with self.lock:
+            if kind:
+                rows = self.db.execute(
+                    "SELECT * FROM incidents WHERE kind = ? ORDER BY id DESC LIMIT ?", (kind, n))
+            else:
+                rows = self.db.execute("SELECT * FROM incidents ORDER BY id DESC LIMIT ?", (n,))
+            return [dict(row) for row in rows]
+
+    def between(self, start, end, limit=1000):
+        """Incidents that started in [start, end), oldest first"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM incidents WHERE started_at >= ? AND started_at < ? ORDER BY started_at LIMIT ?",
+                (start, end, limit))
+            return [dict(row) for row in rows]
+
+    def compact(self):
+        """Apply retention, release freed pages and checkpoint the WAL"""
+        cutoff = time.time() - self.retention_days * 86400
+        with self.lock:
+            with self.db:
+                deleted = self.db.execute("DELETE FROM incidents WHERE started_at < ?", (cutoff,)).rowcount
+                deleted += self.db.execute(
+                    "DELETE FROM incidents WHERE id <= (SELECT MAX(id) FROM incidents) - ?",
+                    (self.max_incidents,)).rowcount
+            self.db.execute("PRAGMA incremental_vacuum")
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if deleted:
+            logger.info(f"Incident store compacted, removed {deleted} old incidents")
+        return deleted
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+import errno
+import logging
+import os
+import re
+import time
+from collections import deque
+
+logger = logging.getLogger("self-healing")
+
+# "Out of memory: Killed process 1234 (memory_hog.py) total-vm:2100000kB, anon-rss:2048000kB, ..."
+KILLED_RE = re.compile(r"Killed process (\d+) \(([^)]*)\).*?anon-rss:(\d+)kB(?:, file-rss:(\d+)kB)?")
+# "python3 invoked oom-killer: gfp_mask=0x100cca(GFP_HIGHUSER_MOVABLE), order=0, oom_score_adj=0"
+INVOKED_RE = re.compile(r"^(\S+) invoked oom-killer")
+
+
+class KernelLogTailer:
+    """Incrementally reads /dev/kmsg from a saved sequence cursor and keeps recent OOM events"""
+
+    def __init__(self, path="/dev/kmsg", cursor_path="/var/log/self-healing/kmsg.cursor", max_events=50):
+        self.path = path
+        self.cursor_path = cursor_path
+        self.events = deque(maxlen=max_events)
+        self.cursor = self._load_cursor()
+        self.fd = None
+        self.unavailable = False
+        # /dev/kmsg timestamps are microseconds since boot
+        self.boot_time = time.time() - time.clock_gettime(time.CLOCK_BOOTTIME)
+
+    def _boot_id(self):
+        try:
+            with open("/proc/sys/kernel/random/boot_id") as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    def _load_cursor(self):
+        """Load the last seen sequence number; sequence numbers restart on reboot"""
+        try:
+            with open(self.cursor_path) as f:
+                boot_id, seq = f.read().split()
+            return int(seq) if boot_id == self._boot_id() else -1
+        except (OSError, ValueError):
+            return -1
+
+    def _save_cursor(self):
+        try:
+            with open(self.cursor_path, "w") as f:
+                f.write(f"{self._boot_id()} {self.cursor}\n")
+        except OSError as e:
+            logger.error(f"Error saving kmsg cursor: {str(e)}")
+
+    def _open(self):
+        try:
+            self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+            return True
+        except OSError as e:
+            logger.warning(f"Cannot read {self.path}, OOM events unavailable: {str(e)}")
+            self.unavailable = True
+            return False
+
+    def parse_record(self, record):
+        """Parse one kmsg record into (seq, timestamp, message)"""
+        header, _, message = record.partition(";")
+        fields = header.split(",")
+        seq = int(fields[1])
+        timestamp = self.boot_time + int(fields[2]) / 1e6
+        # Continuation lines carry dictionary properties, not message text
+        message = message.split("\n", 1)[0]
+        return seq, timestamp, message
+
+    def parse_event(self, seq, timestamp, message):
+        """Turn an OOM-related kernel message into a structured event, or None"""
+        match = KILLED_RE.search(message)
+        if match:
+            return {
+                'seq': seq,
+                'timestamp': timestamp,
+                'type': 'oom_kill',
+                'pid': int(match.group(1)),
+                'comm': match.group(2),
+                'rss_kb': int(match.group(3)) + int(match.group(4) or 0),
+                'message': message,
+            }
+        match = INVOKED_RE.search(message)
+        if match:
+            return {
+                'seq': seq,
+                'timestamp': timestamp,
+                'type': 'oom_invoked',
+                'pid': None,
+                'comm': match.group(1),
+                'rss_kb': None,
+                'message': message,
+            }
+        return None
+
+    def poll(self):
+        """Read every record that arrived since the last call; return the new OOM events"""
+        if self.unavailable or (self.fd is None and not self._open()):
+            return []
+
+        new_events = []
+        last_cursor = self.cursor
+        while True:
+            try:
+                data = os.read(self.fd, 8192)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EPIPE:
+                    # Records were overwritten before we read them; carry on from the oldest one left
+                    continue
+                logger.error(f"Error reading {self.path}: {str(e)}")
+                break
+            if not data:
+                break
+
+            try:
+                seq, timestamp, message = self.parse_record(data.decode(errors="replace"))
+            except (IndexError, ValueError):
+                continue
+            if seq <= self.cursor:
+                continue
+            self.cursor = seq
+
+            event = self.parse_event(seq, timestamp, message)
+            if event:
+                self.events.append(event)
+                new_events.append(event)
+
+        if self.cursor != last_cursor:
+            self._save_cursor()
+        return new_events
+
+    def recent_events(self, limit=None):
+        """Most recent OOM events, oldest first"""
+        events = list(self.events)
+        return events[-limit:] if limit else events
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -17,6 +17,7 @@ docker run -d --name self-healing-demo \
   -p 2222:22 \
   -p 8080:80 \
   -p 8501:8501 \
+  -p 9105:9105 \
   --env-file .env \
   self-healing-linux
 
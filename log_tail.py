@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import mmap
+import os
+
+BLOCK_SIZE = 8192
+
+
+def _tail_mmap(f, size, lines, max_bytes):
+    """Find the start of the last lines lines by scanning backwards through a mapping"""
+    with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+        floor = max(0, size - max_bytes)
+        end = size - 1 if mm[size - 1:size] == b"\n" else size
+        start = end
+        for _ in range(lines):
+            start = mm.rfind(b"\n", floor, start)
+            if start < 0:
+                start = floor
+                break
+        else:
+            start += 1
+        return mm[start:size]
+
+
+def _tail_seek(f, size, lines, max_bytes):
+    """Read fixed-size blocks backwards from the end until enough newlines are seen"""
+    floor = max(0, size - max_bytes)
+    pos = size
+    data = b""
+    while pos > floor and data.count(b"\n") <= lines:
+        step = min(BLOCK_SIZE, pos - floor)
+        pos -= step
+        f.seek(pos)
+        data = f.read(step) + data
+    trailing = data.endswith(b"\n")
+    chunk = (data[:-1] if trailing else data).rsplit(b"\n", lines)
+    if len(chunk) > lines:
+        chunk = chunk[1:]
+    return b"\n".join(chunk) + (b"\n" if trailing else b"")
+
+
+def tail(path, lines=20, max_bytes=16384):
+    """Return the last lines lines of path, never reading more than max_bytes.
+
+    Regular files are mapped and scanned backwards; anything mmap cannot
+    handle (empty files, pipes, special files) falls back to block reads
+    from the end. Cost depends on the tail size, not the file size.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ""
+        try:
+            data = _tail_mmap(f, size, lines, max_bytes)
+        except (ValueError, OSError):
+            data = _tail_seek(f, size, lines, max_bytes)
+    return data.decode(errors="replace")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import select
+import threading
+import time
+
+logger = logging.getLogger("self-healing")
+
+PSI_PATH = "/proc/pressure/memory"
+
+
+def read_psi(path=PSI_PATH):
+    """Parse a PSI file into {'some': {...}, 'full': {...}}, or None if PSI is unavailable"""
+    try:
+        with open(path) as f:
+            content = f.read()
+    except OSError:
+        return None
+    psi = {}
+    for line in content.splitlines():
+        kind, *fields = line.split()
+        psi[kind] = {key: float(value) for key, value in (field.split("=") for field in fields)}
+    return psi
+
+
+class PressureTrigger:
+    """A PSI trigger: a pollable fd that fires when stall time exceeds a threshold within a window.
+
+    The default fires when some task stalled on memory for 150 ms within a
+    1 s window, long before meminfo sampling every 10 s would notice.
+    """
+
+    def __init__(self, on_trigger, stall_us=150000, window_us=1000000, path=PSI_PATH):
+        self.on_trigger = on_trigger
+        self.spec = f"some {stall_us} {window_us}"
+        self.path = path
+        self.fd = None
+        self.fired = 0
+        self.last_fired = 0
+        self._stop = threading.Event()
+
+    def start(self):
+        """Register the trigger and start waiting on it; returns False if PSI triggers are unavailable"""
+        try:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+            os.write(self.fd, self.spec.encode() + b"\0")
+        except OSError as e:
+            logger.warning(f"PSI memory trigger unavailable: {str(e)}")
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            return False
+        threading.Thread(target=self._wait, name="psi-trigger", daemon=True).start()
+        return True
+
+    def _wait(self):
+        poller = select.poll()
+        poller.register(self.fd, select.POLLPRI)
+        while not self._stop.is_set():
+            events = poller.poll(1000)
+            for _, mask in events:
+                if mask & select.POLLERR:
+                    logger.error("PSI trigger fd reported an error, stopping trigger")
+                    return
+                if mask & select.POLLPRI:
+                    self.fired += 1
+                    self.last_fired = time.time()
+                    try:
+                        self.on_trigger()
+                    except Exception as e:
+                        logger.error(f"Error handling PSI trigger: {str(e)}")
+
+    def stop(self):
+        self._stop.set()
+
+
+class MemoryPressureDetector:
+    """Combines meminfo usage, PSI stall averages and a usage trend into one critical/normal state.
+
+    The state only becomes critical when a rising condition holds and only
+    returns to normal once every falling condition holds, so it does not
+    flap around a single threshold. With PSI available, high usage alone is
+    not enough: a host full of reclaimable cache shows no stalls. Stalls
+    alone are not enough either below trend_floor_percent: a short I/O or
+    reclaim stall on a half-empty host is no reason to free memory.
+    """
+
+    def __init__(self, rise_percent=90, fall_percent=85, hard_percent=97,
+                 psi_rise=10.0, psi_fall=2.0, psi_floor=0.5,
+                 trend_floor_percent=70, exhaustion_horizon=30, trigger_hold=20, rate_alpha=0.5):
+        self.rise_percent = rise_percent
+        self.fall_percent = fall_percent
+        self.hard_percent = hard_percent
+        self.psi_rise = psi_rise
+        self.psi_fall = psi_fall
+        self.psi_floor = psi_floor
+        self.trend_floor_percent = trend_floor_percent
+        self.exhaustion_horizon = exhaustion_horizon
+        self.trigger_hold = trigger_hold
+        self.rate_alpha = rate_alpha
+        self.trigger = None
+
+        self.critical = False
+        self.rate = 0.0  # smoothed usage change in percentage points per second
+        self.last_sample = None
+
+    def start_trigger(self, on_trigger):
+        self.trigger = PressureTrigger(on_trigger)
+        if not self.trigger.start():
+            self.trigger = None
+
+    def _update_rate(self, used_percent, now):
+        if self.last_sample:
+            last_used, last_time = self.last_sample
+            elapsed = now - last_time
+            if elapsed > 0.05:
+                slope = (used_percent - last_used) / elapsed
+                self.rate = self.rate_alpha * slope + (1 - self.rate_alpha) * self.rate
+                self.last_sample = (used_percent, now)
+        else:
+            self.last_sample = (used_percent, now)
+
+    def update(self, used_percent, now=None, psi=None):
+        """Feed a new usage sample; returns a dict describing the current pressure state"""
+        now = now or time.time()
+        self._update_rate(used_percent, now)
+        psi = psi if psi is not None else read_psi()
+
+        some_avg10 = psi['some']['avg10'] if psi else None
+        full_avg10 = psi['full']['avg10'] if psi and 'full' in psi else None
+        seconds_to_exhaustion = (100 - used_percent) / self.rate if self.rate > 0 else None
+        # Act ahead of the OOM killer when usage is already high and climbing fast
+        exhausting = (used_percent > self.trend_floor_percent and seconds_to_exhaustion is not None
+                      and seconds_to_exhaustion < self.exhaustion_horizon)
+        triggered = bool(self.trigger and now - self.trigger.last_fired < self.trigger_hold)
+
+        if not self.critical:
+            if psi is None:
+                rising = used_percent > self.rise_percent
+            else:
+                rising = used_percent > self.rise_percent and some_avg10 >= self.psi_floor
+            stalled = triggered or (psi is not None and some_avg10 >= self.psi_rise)
+            rising = (rising or (stalled and used_percent > self.trend_floor_percent)
+                      or exhausting or used_percent > self.hard_percent)
+            if rising:
+                self.critical = True
+                logger.warning(f"Memory pressure rising: used {used_percent:.1f}%, "
+                               f"PSI some avg10 {some_avg10}, trend {self.rate:+.2f}%/s")
+        else:
+            falling = (used_percent < self.fall_percent and not triggered and not exhausting
+                       and (psi is None or some_avg10 < self.psi_fall))
+            if falling:
+                self.critical = False
+                logger.info(f"Memory pressure cleared: used {used_percent:.1f}%")
+
+        return {
+            'critical': self.critical,
+            'psi_some_avg10': some_avg10,
+            'psi_full_avg10': full_avg10,
+            'trend_percent_per_s': round(self.rate, 3),
+            'seconds_to_exhaustion': round(seconds_to_exhaustion, 1) if seconds_to_exhaustion else None,
+            'trigger_fired': self.trigger.fired if self.trigger else None,
+        }
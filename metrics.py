@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("self-healing")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    """Base for a labelled metric family in the Prometheus text format"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self.lock:
+            child = self.children.get(values)
+            if child is None:
+                child = self.children[values] = self._new_child()
+            return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            children = list(self.children.items())
+        for values, child in sorted(children):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, values, child):
+        with child.lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, values, [("le", bound)])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values, [("le", "+Inf")])
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PROBE_DURATION = REGISTRY.register(Histogram(
+    "sentinel_probe_duration_seconds", "Duration of each scheduled probe run", ["probe"]))
+LLM_DURATION = REGISTRY.register(Histogram(
+    "sentinel_llm_request_duration_seconds", "Latency of diagnosis calls including retries", ["kind"]))
+LLM_REQUESTS = REGISTRY.register(Counter(
+    "sentinel_llm_requests_total", "Diagnosis calls by outcome", ["kind", "outcome"]))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "sentinel_llm_tokens_total", "Tokens reported by the messages API", ["kind", "direction"]))
+LLM_TIME_TO_ACTION = REGISTRY.register(Histogram(
+    "sentinel_llm_time_to_action_seconds", "Time from a diagnosis request to starting the first fix it suggests",
+    ["kind"]))
+PROMPT_TOKENS = REGISTRY.register(Histogram(
+    "sentinel_prompt_tokens", "Estimated size of each diagnosis prompt", ["kind"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000)))
+PROMPT_SECTIONS_TRIMMED = REGISTRY.register(Counter(
+    "sentinel_prompt_sections_trimmed_total", "Prompt sections cut to fit their token budget", ["kind", "section"]))
+FIX_DURATION = REGISTRY.register(Histogram(
+    "sentinel_fix_duration_seconds", "Time spent applying a remediation command", ["kind"]))
+FIX_VERIFY_DURATION = REGISTRY.register(Histogram(
+    "sentinel_fix_verify_seconds", "Time from a fix command returning to the fix being confirmed", ["kind"]))
+HEALS = REGISTRY.register(Counter(
+    "sentinel_heals_total", "Heal attempts by result", ["kind", "target", "result"]))
+TIME_TO_RECOVERY = REGISTRY.register(Histogram(
+    "sentinel_time_to_recovery_seconds", "Time from detecting a failure to a successful heal", ["kind"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)))
+REFUSED_ACTIONS = REGISTRY.register(Counter(
+    "sentinel_refused_actions_total", "Suggested remediations refused as unsafe", ["action", "reason"]))
+SUBPROCESS_FORKS = REGISTRY.register(Counter(
+    "sentinel_subprocess_forks_total", "External commands run by the daemon", ["command"]))
+CIRCUIT_BREAKER_STATE = REGISTRY.register(Gauge(
+    "sentinel_circuit_breaker_state", "Heal circuit breaker per service: 0 closed, 1 half-open, 2 open", ["service"]))
+HEALS_HELD_BACK = REGISTRY.register(Counter(
+    "sentinel_heals_held_back_total", "Checks that found a service down but did not heal it", ["service", "reason"]))
+SERVICE_UP = REGISTRY.register(Gauge(
+    "sentinel_service_up", "1 if the monitored service is running", ["service"]))
+MEMORY_USED = REGISTRY.register(Gauge(
+    "sentinel_memory_used_percent", "Host memory in use (MemTotal - MemAvailable)"))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would flood daemon.log
+
+
+def start_metrics_server(port, host="0.0.0.0", registry=REGISTRY):
+    """Serve /metrics in a background thread; returns the server, or None if the port is unavailable"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {'registry': registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.error(f"Cannot start metrics endpoint on {host}:{port}: {str(e)}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
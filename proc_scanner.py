@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import logging
+
+logger = logging.getLogger("self-healing")
+
+
+class ProcessTable:
+    """Snapshot of the process table built from a single walk of /proc"""
+
+    def __init__(self, proc_root="/proc"):
+        self.proc_root = proc_root
+        self.by_name = {}
+        self.pid_count = 0
+        self.taken_at = 0
+
+    def _read(self, pid, name):
+        """Read a small /proc/<pid>/<name> file, returning bytes or None if the process is gone"""
+        try:
+            with open(os.path.join(self.proc_root, pid, name), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def refresh(self):
+        """Walk /proc once and rebuild the name -> PID index"""
+        by_name = {}
+        pid_count = 0
+
+        for entry in os.scandir(self.proc_root):
+            if not entry.name.isdigit():
+                continue
+
+            comm = self._read(entry.name, "comm")
+            if comm is None:
+                continue
+            pid = int(entry.name)
+            pid_count += 1
+
+            names = {comm.decode(errors="replace").strip()}
+
+            # comm is truncated to 15 chars, so also index the program name from argv[0]
+            cmdline = self._read(entry.name, "cmdline")
+            if cmdline:
+                argv0 = cmdline.split(b"\0", 1)[0].split(b" ", 1)[0]
+                argv0 = os.path.basename(argv0.decode(errors="replace")).rstrip(":")
+                if argv0:
+                    names.add(argv0)
+
+            for name in names:
+                by_name.setdefault(name, []).append(pid)
+
+        self.by_name = by_name
+        self.pid_count = pid_count
+        self.taken_at = time.time()
+        return self
+
+    def pids(self, name):
+        """Return the PIDs whose comm or program name matches name"""
+        return self.by_name.get(name, [])
+
+    def is_running(self, name):
+        """Return True if any process in the snapshot matches name"""
+        return name in self.by_name
+
+
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def _read_text(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode(errors="replace")
+    except OSError:
+        return None
+
+
+def read_meminfo(proc_root="/proc"):
+    """Parse /proc/meminfo into a dict of values in kB"""
+    mem_info = {}
+    with open(os.path.join(proc_root, "meminfo")) as f:
+        for line in f:
+            name, value = line.split(':')
+            mem_info[name.strip()] = int(value.strip().split()[0])
+    return mem_info
+
+
+def process_cgroup(pid, proc_root="/proc"):
+    """Return the cgroup path of a process, preferring the unified (v2) hierarchy"""
+    content = _read_text(os.path.join(proc_root, str(pid), "cgroup"))
+    if not content:
+        return ""
+    path = ""
+    for line in content.splitlines():
+        hierarchy, _, rest = line.partition(":")
+        path = rest.partition(":")[2]
+        if hierarchy == "0":
+            break
+    return path
+
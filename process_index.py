@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+import heapq
+import logging
+import os
+import threading
+
+from proc_scanner import PAGE_KB, _read_text, process_cgroup
+
+logger = logging.getLogger("self-healing")
+
+# Protection classes, from never touched to fair game
+ESSENTIAL = "essential"    # keeps the host running and reachable
+PROTECTED = "protected"    # the workload remediation exists to keep alive
+EXPENDABLE = "expendable"  # may be killed to relieve memory pressure
+
+# Default process names (or name prefixes) of the first two classes
+ESSENTIAL_PROCESSES = frozenset({"systemd", "init", "sshd", "rsyslogd"})
+PROTECTED_PROCESSES = frozenset({"apache2", "nginx", "php-fpm"})
+
+
+def classify_process(pid, comm, cgroup, essential, protected, services):
+    """Protection class of a process from its comm, cgroup and service membership.
+
+    essential and protected are process names or name prefixes (php-fpm
+    covers php-fpm8.1); services maps each monitored service to its process
+    name, or None. pid may be None to classify a service by name alone.
+    """
+    def named(names):
+        return any(comm == name or comm.startswith(name) for name in names if name)
+
+    if pid in (1, os.getpid()) or named(essential) or cgroup.endswith("/init.scope"):
+        return ESSENTIAL
+    unit = os.path.basename(cgroup)
+    if (named(protected) or named(services.values())
+            or (unit.endswith(".service") and unit[:-len(".service")] in services)):
+        return PROTECTED
+    return EXPENDABLE
+
+
+def read_starttime(pid, proc_root="/proc"):
+    """Start time of a process in clock ticks, which tells a reused PID apart; None if unavailable"""
+    stat = _read_text(os.path.join(proc_root, str(pid), "stat"))
+    if not stat:
+        return None
+    try:
+        # Fields after the parenthesised comm, which may itself contain spaces
+        return int(stat.rpartition(")")[2].split()[19])
+    except (IndexError, ValueError):
+        return None
+
+
+class ProcessIndex:
+    """Protection class and victim ranking for every process, kept up to date incrementally.
+
+    A process is classified once, when it first shows up: its comm, command
+    line, cgroup and oom_score_adj are read then and not again. Each refresh
+    lists /proc, drops the PIDs that are gone, classifies the new ones and
+    re-reads only statm, then ranks the expendable processes by RSS times
+    expendability (1 + oom_score_adj / 1000, as the kernel's OOM killer
+    weighs them). Choosing or vetting a kill target is then a dict lookup.
+    """
+
+    def __init__(self, classify, proc_root="/proc", cmdline_chars=80):
+        self.classify = classify  # (pid, comm, cgroup) -> protection class
+        self.proc_root = proc_root
+        self.cmdline_chars = cmdline_chars
+        self.processes = {}  # pid -> record
+        self.ranking = []  # expendable records, best victim first
+        self.lock = threading.Lock()
+
+    def _load(self, pid):
+        """Read and classify a process seen for the first time; None if it already exited"""
+        proc_dir = os.path.join(self.proc_root, str(pid))
+        comm = _read_text(os.path.join(proc_dir, "comm"))
+        if comm is None:
+            return None
+        comm = comm.strip()
+        cmdline = _read_text(os.path.join(proc_dir, "cmdline")) or ""
+        cgroup = process_cgroup(pid, self.proc_root)
+        try:
+            oom_score_adj = int(_read_text(os.path.join(proc_dir, "oom_score_adj")) or 0)
+        except ValueError:
+            oom_score_adj = 0
+        record = {
+            'pid': pid,
+            'comm': comm,
+            'cmdline': " ".join(cmdline.replace("\0", " ").split())[:self.cmdline_chars],
+            'cgroup': cgroup,
+            'oom_score_adj': oom_score_adj,
+            'starttime': read_starttime(pid, self.proc_root),
+            'rss_kb': 0,
+        }
+        self._classify(record)
+        return record
+
+    def _classify(self, record):
+        cls = self.classify(record['pid'], record['comm'], record['cgroup'])
+        # OOM-exempt processes (oom_score_adj -1000) are exempt here too
+        if cls == EXPENDABLE and record['oom_score_adj'] <= -1000:
+            cls = PROTECTED
+        record['class'] = cls
+
+    @staticmethod
+    def score(record):
+        return record['rss_kb'] * (1 + record['oom_score_adj'] / 1000)
+
+    def _rank(self, processes):
+        return sorted((record for record in processes.values()
+                       if record['class'] == EXPENDABLE and record['rss_kb']),
+                      key=self.score, reverse=True)
+
+    def refresh(self):
+        """Bring the index up to date with /proc and re-rank the victims"""
+        with self.lock:
+            known = dict(self.processes)
+
+        processes = {}
+        for entry in os.scandir(self.proc_root):
+            if not entry.name.isdigit():
+                continue
+            pid = int(entry.name)
+            record = known.get(pid) or self._load(pid)
+            if record is None:
+                continue
+            statm = _read_text(os.path.join(entry.path, "statm"))
+            if not statm:
+                continue  # exited during the scan
+            try:
+                record['rss_kb'] = int(statm.split()[1]) * PAGE_KB
+            except (IndexError, ValueError):
+                continue
+            processes[pid] = record
+
+        ranking = self._rank(processes)
+        with self.lock:
+            self.processes = processes
+            self.ranking = ranking
+        return self
+
+    def reclassify(self):
+        """Re-apply the classifier to every known process, e.g. after the monitored services changed"""
+        with self.lock:
+            for record in self.processes.values():
+                self._classify(record)
+            self.ranking = self._rank(self.processes)
+
+    def top(self, limit=10):
+        """The limit processes with the largest RSS, of any class"""
+        with self.lock:
+            records = heapq.nlargest(limit, self.processes.values(), key=lambda record: record['rss_kb'])
+        return [{key: record[key] for key in ('pid', 'comm', 'rss_kb', 'cgroup', 'class', 'cmdline')}
+                for record in records if record['rss_kb']]
+
+    def victims(self, limit=None):
+        with self.lock:
+            return list(self.ranking[:limit])
+
+    def victim(self):
+        """The best kill candidate that is still the process the index knows; None if there is none"""
+        for record in self.victims():
+            current = self.validate(record['pid'])
+            if current is not None and current['class'] == EXPENDABLE:
+                return current
+        return None
+
+    def validate(self, pid):
+        """The record for pid if it names a live process, re-read if the PID is new or was reused; else None"""
+        starttime = read_starttime(pid, self.proc_root)
+        with self.lock:
+            record = self.processes.get(pid)
+        if record is not None and record['starttime'] == starttime:
+            if starttime is not None or os.path.exists(os.path.join(self.proc_root, str(pid))):
+                return record
+
+        record = self._load(pid)
+        with self.lock:
+            if record is None:
+                self.processes.pop(pid, None)
+            else:
+                self.processes[pid] = record
+        return record
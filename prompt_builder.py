@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import logging
+import re
+
+import metrics
+from diagnosis_cache import normalize_logs
+
+logger = logging.getLogger("self-healing")
+
+# Rough size of a token for English and log text; close enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Lines worth keeping over plain chatter when a log has to be cut
+SIGNAL_RE = re.compile(r"error|fail|fatal|crit|panic|oom|out of memory|killed|denied|refused|segfault"
+                       r"|timed? ?out|exception|traceback|cannot|unable", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def dedup_lines(lines):
+    """Collapse lines that repeat once numbers and hex are masked into their last occurrence.
+
+    Returns (position, line, count) tuples in log order.
+    """
+    last, counts = {}, {}
+    for position, line in enumerate(lines):
+        key = normalize_logs(line)
+        if not key:
+            continue
+        counts[key] = counts.get(key, 0) + 1
+        last[key] = position
+    return sorted((position, lines[position], counts[key]) for key, position in last.items())
+
+
+def compress_log(text, budget, keep_last=10):
+    """Fit log text into budget tokens, deduplicated and keeping the lines that matter most.
+
+    Repeated lines become one line with a count. The last keep_last lines
+    are kept first, then error-like lines newest first, then whatever
+    recent lines still fit. The result stays in log order, with a marker
+    wherever lines were left out.
+    """
+    entries = dedup_lines(text.splitlines())
+    rendered = [f"{line} [x{count}]" if count > 1 else line for _, line, count in entries]
+    newest_first = list(range(len(entries) - 1, -1, -1))
+    order = (newest_first[:keep_last]
+             + [i for i in newest_first[keep_last:] if SIGNAL_RE.search(rendered[i])]
+             + [i for i in newest_first[keep_last:] if not SIGNAL_RE.search(rendered[i])])
+
+    kept, used = set(), 0
+    for i in order:
+        cost = estimate_tokens(rendered[i]) + 1
+        if used + cost <= budget:
+            kept.add(i)
+            used += cost
+
+    lines, skipped = [], 0
+    for i in range(len(entries)):
+        if i not in kept:
+            skipped += 1
+            continue
+        if skipped:
+            lines.append(f"[... {skipped} lines omitted ...]")
+            skipped = 0
+        lines.append(rendered[i])
+    if skipped:
+        lines.append(f"[... {skipped} lines omitted ...]")
+    return "\n".join(lines)
+
+
+def keep_head(text, budget):
+    """The leading lines of text that fit in budget tokens"""
+    lines = text.splitlines()
+    kept, used = [], 0
+    for line in lines:
+        used += estimate_tokens(line) + 1
+        if used > budget:
+            kept.append(f"[... {len(lines) - len(kept)} more lines omitted ...]")
+            break
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def keep_tail(items, budget):
+    """The most recent items (e.g. earlier fix attempts) that fit in budget tokens"""
+    kept, used = [], 0
+    for item in reversed(items):
+        cost = estimate_tokens(item) + 1
+        if used + cost > budget:
+            if not kept:
+                kept.append(keep_head(item, budget))
+            break
+        kept.append(item)
+        used += cost
+    omitted = len(items) - len(kept)
+    return "\n".join(([f"[... {omitted} earlier entries omitted ...]"] if omitted else []) + kept[::-1])
+
+
+class PromptBuilder:
+    """Fits the variable sections of one prompt to their token budgets and records its size.
+
+    Instructions stay in the caller's template; each input that can grow
+    with the host (logs, process tables, attempt history) goes through
+    section first, so a noisy host cannot make the prompt, and with it
+    latency and cost, grow without bound.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+
+    def section(self, name, content, budget, fit=compress_log):
+        """content cut to budget tokens by fit; counted in the metrics when anything was dropped"""
+        fitted = fit(content, budget)
+        source_tokens = estimate_tokens("\n".join(content) if isinstance(content, list) else content)
+        if estimate_tokens(fitted) < source_tokens:
+            metrics.PROMPT_SECTIONS_TRIMMED.labels(self.kind, name).inc()
+            logger.debug(f"Prompt {self.kind}: {name} cut from ~{source_tokens} to ~{estimate_tokens(fitted)} tokens")
+        return fitted
+
+    def build(self, prompt):
+        metrics.PROMPT_TOKENS.labels(self.kind).observe(estimate_tokens(prompt))
+        return prompt
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("self-healing")
+
+# Re-check delays after a fix: the first check is immediate, then back off
+VERIFY_DELAYS = (0, 0.025, 0.05, 0.1, 0.2, 0.4, 0.8, 1.6, 3.2)
+
+
+class RemediationExecutor:
+    """Bounded worker pool for fixes, with at most one fix per target at a time.
+
+    Targets are plain strings ("service:apache2", "memory", "dns"). A caller
+    claims a target with try_acquire before fixing it and releases it when
+    done; a second claim while the first fix runs is refused, so probes can
+    ask in_progress instead of keeping their own bookkeeping.
+    """
+
+    def __init__(self, max_workers=4, verify_delays=VERIFY_DELAYS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sentinel-fix")
+        self.verify_delays = verify_delays
+        self.active = set()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, target):
+        """Claim target for a fix; returns False if a fix for it is already running"""
+        with self.lock:
+            if target in self.active:
+                return False
+            self.active.add(target)
+            return True
+
+    def release(self, target):
+        with self.lock:
+            self.active.discard(target)
+
+    def in_progress(self, target):
+        with self.lock:
+            return target in self.active
+
+    def submit(self, func, *args):
+        """Run one fix step on the pool so independent targets heal in parallel"""
+        return self.executor.submit(func, *args)
+
+    def verify(self, check, delays=None):
+        """Re-run check with exponential back-off until it passes; returns (passed, seconds taken)"""
+        start = time.perf_counter()
+        for delay in delays or self.verify_delays:
+            if delay:
+                time.sleep(delay)
+            try:
+                if check():
+                    return True, time.perf_counter() - start
+            except Exception as e:
+                logger.error(f"Error verifying fix: {str(e)}")
+        return False, time.perf_counter() - start
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
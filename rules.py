@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+
+from dns_probe import parse_nameservers
+
+logger = logging.getLogger("self-healing")
+
+
+class Rule:
+    """A deterministic fix: when the condition holds for an incident, run command.
+
+    diagnosis and explanation are format strings filled from the incident
+    context, so a rule produces the same DIAGNOSIS/COMMAND/EXPLANATION text
+    the model would and the rest of the healing path is unchanged.
+    """
+
+    def __init__(self, name, domain, when, command, diagnosis, explanation):
+        self.name = name
+        self.domain = domain
+        self.when = when
+        self.command = command
+        self.diagnosis = diagnosis
+        self.explanation = explanation
+
+    def render(self, context):
+        return (f"DIAGNOSIS: {self.diagnosis.format(**context)}\n"
+                f"COMMAND: {self.command.format(**context)}\n"
+                f"EXPLANATION: {self.explanation.format(**context)}")
+
+
+class RuleEngine:
+    """Evaluates rules in registration order ahead of any model call"""
+
+    def __init__(self, rules=None):
+        self.rules = []
+        self.counters = {}
+        self.lock = threading.Lock()
+        for rule in rules or []:
+            self.add(rule)
+
+    def add(self, rule):
+        self.rules.append(rule)
+        self.counters[rule.name] = {'matched': 0, 'verified': 0, 'failed': 0}
+
+    def match(self, domain, context):
+        """Return the first rule of domain whose condition holds, or None"""
+        for rule in self.rules:
+            if rule.domain != domain:
+                continue
+            try:
+                if not rule.when(context):
+                    continue
+            except Exception as e:
+                logger.error(f"Error evaluating rule {rule.name}: {str(e)}")
+                continue
+            with self.lock:
+                self.counters[rule.name]['matched'] += 1
+            logger.info(f"Rule {rule.name} matched {domain} incident")
+            return rule
+        return None
+
+    def record(self, rule, verified):
+        """Count whether the fix a rule chose passed verification"""
+        with self.lock:
+            self.counters[rule.name]['verified' if verified else 'failed'] += 1
+
+    def stats(self):
+        with self.lock:
+            return {name: dict(counts) for name, counts in self.counters.items()}
+
+
+DEFAULT_RULES = [
+    Rule(
+        name="process-missing-start",
+        domain="service",
+        # A failed TCP/HTTP/socket probe with the process still up is not fixed by starting it
+        when=lambda ctx: ctx['status'] == "inactive" and ctx['process_missing'],
+        command="start",
+        diagnosis="No {service} process is running; the service is stopped or has crashed",
+        explanation="Starting {service} brings its process back",
+    ),
+    Rule(
+        name="resolv-no-valid-nameserver",
+        domain="dns",
+        when=lambda ctx: not parse_nameservers(ctx['resolv_content']),
+        command="check_resolv",
+        diagnosis="/etc/resolv.conf does not contain any valid nameserver line",
+        explanation="Resetting resolv.conf to known good nameservers restores DNS resolution",
+    ),
+]
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger("self-healing")
+
+
+class PeriodicJob:
+    """A probe that runs on its own interval"""
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.future = None
+        self.last_duration_ms = None
+
+
+class Scheduler:
+    """Runs each probe on its own interval and each remediation as its own task on a worker pool"""
+
+    def __init__(self, max_workers=8):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sentinel")
+        self.jobs = []
+        self.periodic = {}
+        self._seq = itertools.count()
+        self._stop = threading.Event()
+
+    def every(self, name, interval, func, delay=0):
+        """Schedule func to run every interval seconds, starting after delay"""
+        job = PeriodicJob(name, interval, func)
+        self.periodic[name] = job
+        heapq.heappush(self.jobs, (time.monotonic() + delay, next(self._seq), job))
+        return job
+
+    def submit(self, name, func, *args):
+        """Run a one-off task (e.g. a remediation) without blocking the probes"""
+        return self.executor.submit(self._run_task, name, func, *args)
+
+    def _run_task(self, name, func, *args):
+        try:
+            return func(*args)
+        except Exception as e:
+            logger.error(f"Error in {name}: {str(e)}")
+
+    def _run_job(self, job):
+        start = time.perf_counter()
+        try:
+            job.func()
+        except Exception as e:
+            logger.error(f"Error in {job.name}: {str(e)}")
+        finally:
+            elapsed = time.perf_counter() - start
+            job.last_duration_ms = elapsed * 1000
+            metrics.PROBE_DURATION.labels(job.name).observe(elapsed)
+
+    def run_forever(self):
+        """Dispatch due probes until stop() is called"""
+        try:
+            while not self._stop.is_set():
+                if not self.jobs:
+                    self._stop.wait(1)
+                    continue
+
+                due, _, job = self.jobs[0]
+                now = time.monotonic()
+                if due > now:
+                    self._stop.wait(due - now)
+                    continue
+
+                heapq.heappop(self.jobs)
+                # A slow probe is skipped rather than stacked up behind itself
+                if job.future is not None and not job.future.done():
+                    logger.debug(f"Probe {job.name} still running, skipping this interval")
+                else:
+                    job.future = self.executor.submit(self._run_job, job)
+                heapq.heappush(self.jobs, (max(due + job.interval, now), next(self._seq), job))
+        except KeyboardInterrupt:
+            logger.info("Daemon stopping due to keyboard interrupt")
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import socket
+import urllib.error
+import urllib.request
+
+logger = logging.getLogger("self-healing")
+
+SERVICE_ACTIONS = ("start", "restart")
+SERVICE_FIELDS = {"probe", "interval", "timeout", "logs", "pidfile", "process", "actions", "fallback"}
+FALLBACK_FIELDS = ("diagnosis", "command", "explanation")
+
+# Used when no config file exists: the services the daemon has always watched
+DEFAULT_CONFIG = {
+    "services": {
+        "ssh": {
+            "probe": {"type": "process", "name": "sshd"},
+            "logs": ["/var/log/auth.log"],
+            "pidfile": "/run/sshd.pid",
+            "fallback": {
+                "diagnosis": "The SSH service appears to be stopped or crashed",
+                "command": "start",
+                "explanation": "Starting the SSH service should restore SSH connectivity",
+            },
+        },
+        "apache2": {
+            "probe": {"type": "process", "name": "apache2"},
+            "logs": ["/var/log/apache2/error.log"],
+            "pidfile": "/run/apache2/apache2.pid",
+            "fallback": {
+                "diagnosis": "The Apache web server is not running",
+                "command": "start",
+                "explanation": "Starting the Apache service will restore web server functionality",
+            },
+        },
+    }
+}
+
+PROBES = {}
+
+
+class ConfigError(ValueError):
+    """The service config is invalid; the message lists every problem found"""
+
+
+def probe_type(name):
+    """Class decorator registering a probe plugin under the config's probe "type" """
+    def register(cls):
+        cls.type = name
+        PROBES[name] = cls
+        return cls
+    return register
+
+
+class Probe:
+    """A health check for one service, built from its "probe" block.
+
+    Subclasses list the keys they need in required and implement check,
+    which returns True when the service is healthy. Probes that only need
+    the shared process table set process_name; the others do their own I/O
+    and must give up after timeout seconds.
+    """
+
+    type = None
+    required = ()
+    process_name = None
+
+    def __init__(self, spec, timeout):
+        self.spec = spec
+        self.timeout = timeout
+
+    def check(self, process_table):
+        raise NotImplementedError
+
+    def describe(self):
+        return self.type
+
+
+@probe_type("process")
+class ProcessProbe(Probe):
+    """Healthy while a process whose comm or program name is exactly name is running"""
+
+    required = ("name",)
+
+    def __init__(self, spec, timeout):
+        super().__init__(spec, timeout)
+        self.process_name = spec["name"]
+
+    def check(self, process_table):
+        return process_table.is_running(self.process_name)
+
+    def describe(self):
+        return f"process {self.process_name}"
+
+
+@probe_type("tcp")
+class TCPProbe(Probe):
+    """Healthy while a TCP connection to host:port succeeds"""
+
+    required = ("port",)
+
+    def __init__(self, spec, timeout):
+        super().__init__(spec, timeout)
+        self.host = spec.get("host", "127.0.0.1")
+        self.port = int(spec["port"])
+
+    def check(self, process_table):
+        try:
+            socket.create_connection((self.host, self.port), timeout=self.timeout).close()
+            return True
+        except OSError:
+            return False
+
+    def describe(self):
+        return f"tcp {self.host}:{self.port}"
+
+
+@probe_type("http")
+class HTTPProbe(Probe):
+    """Healthy while the health URL answers with an expected status (any 2xx/3xx by default)"""
+
+    required = ("url",)
+
+    def __init__(self, spec, timeout):
+        super().__init__(spec, timeout)
+        self.url = spec["url"]
+        self.expect_status = spec.get("expect_status")
+        if self.expect_status is not None and not (
+                isinstance(self.expect_status, list) and all(isinstance(s, int) for s in self.expect_status)):
+            raise ValueError("expect_status must be a list of HTTP status codes")
+
+    def healthy_status(self, status):
+        if self.expect_status:
+            return status in self.expect_status
+        return 200 <= status < 400
+
+    def check(self, process_table):
+        try:
+            with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+                return self.healthy_status(response.status)
+        except urllib.error.HTTPError as e:
+            return self.healthy_status(e.code)
+        except (urllib.error.URLError, OSError):
+            return False
+
+    def describe(self):
+        return f"http {self.url}"
+
+
+@probe_type("unix")
+class UnixSocketProbe(Probe):
+    """Healthy while a connection to the unix socket at path succeeds"""
+
+    required = ("path",)
+
+    def __init__(self, spec, timeout):
+        super().__init__(spec, timeout)
+        self.path = spec["path"]
+
+    def check(self, process_table):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.close()
+
+    def describe(self):
+        return f"unix {self.path}"
+
+
+class ServiceConfig:
+    """One monitored service: how to probe it, how often, where its logs are and which fixes are allowed"""
+
+    def __init__(self, name, probe, interval=10, timeout=2.0, logs=(), pidfile=None, process=None,
+                 actions=SERVICE_ACTIONS, fallback=None):
+        self.name = name
+        self.probe = probe
+        self.interval = interval
+        self.timeout = timeout
+        self.logs = list(logs)
+        self.pidfile = pidfile
+        # Process behind the service, for exit watches; defaults to what a process probe looks for
+        self.process_name = process or probe.process_name
+        self.actions = list(actions)
+        self.fallback = fallback
+
+    def fallback_diagnosis(self):
+        """Canned DIAGNOSIS/COMMAND/EXPLANATION for when the model is unavailable"""
+        if not self.fallback:
+            return None
+        return (f"DIAGNOSIS: {self.fallback['diagnosis']}\n"
+                f"COMMAND: {self.fallback['command']}\n"
+                f"EXPLANATION: {self.fallback['explanation']}")
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+def _string_list(value):
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def _parse_service(name, spec, errors):
+    """Build one ServiceConfig, appending any problems to errors; returns None if it is invalid"""
+    where = f"services.{name}"
+    if not isinstance(spec, dict):
+        errors.append(f"{where}: must be an object")
+        return None
+    start = len(errors)
+
+    for key in sorted(set(spec) - SERVICE_FIELDS):
+        errors.append(f"{where}: unknown key '{key}'")
+
+    interval = spec.get("interval", 10)
+    timeout = spec.get("timeout", 2.0)
+    for key, value in (("interval", interval), ("timeout", timeout)):
+        if not _number(value):
+            errors.append(f"{where}.{key}: must be a positive number")
+
+    logs = spec.get("logs", [])
+    if not _string_list(logs):
+        errors.append(f"{where}.logs: must be a list of paths")
+    for key in ("pidfile", "process"):
+        if spec.get(key) is not None and not isinstance(spec[key], str):
+            errors.append(f"{where}.{key}: must be a string")
+
+    actions = spec.get("actions", list(SERVICE_ACTIONS))
+    if not _string_list(actions) or not actions:
+        errors.append(f"{where}.actions: must be a non-empty list of {', '.join(SERVICE_ACTIONS)}")
+        actions = []
+    for action in actions:
+        if action not in SERVICE_ACTIONS:
+            errors.append(f"{where}.actions: unsupported action '{action}'")
+
+    fallback = spec.get("fallback")
+    if fallback is not None:
+        if not isinstance(fallback, dict) or not all(isinstance(fallback.get(key), str) for key in FALLBACK_FIELDS):
+            errors.append(f"{where}.fallback: needs string {', '.join(FALLBACK_FIELDS)}")
+        elif fallback["command"] != "none" and fallback["command"] not in actions:
+            errors.append(f"{where}.fallback.command: '{fallback['command']}' is not an allowed action")
+
+    probe = None
+    probe_spec = spec.get("probe")
+    if not isinstance(probe_spec, dict):
+        errors.append(f"{where}.probe: must be an object with a type")
+    elif probe_spec.get("type") not in PROBES:
+        errors.append(f"{where}.probe.type: must be one of {', '.join(sorted(PROBES))}")
+    else:
+        probe_cls = PROBES[probe_spec["type"]]
+        missing = [key for key in probe_cls.required if key not in probe_spec]
+        if missing:
+            errors.append(f"{where}.probe: {probe_cls.type} probe needs {', '.join(missing)}")
+        elif _number(timeout):
+            try:
+                probe = probe_cls(probe_spec, timeout)
+            except (TypeError, ValueError) as e:
+                errors.append(f"{where}.probe: {str(e)}")
+
+    if len(errors) > start or probe is None:
+        return None
+    return ServiceConfig(name, probe, interval=interval, timeout=timeout, logs=logs,
+                         pidfile=spec.get("pidfile"), process=spec.get("process"),
+                         actions=actions, fallback=fallback)
+
+
+def parse_config(data):
+    """Validate a decoded config document; returns service name -> ServiceConfig or raises ConfigError"""
+    if not isinstance(data, dict) or not isinstance(data.get("services"), dict) or not data["services"]:
+        raise ConfigError("config must be an object with a non-empty 'services' object")
+
+    errors = []
+    services = {}
+    for name, spec in data["services"].items():
+        service = _parse_service(name, spec, errors)
+        if service:
+            services[name] = service
+    if errors:
+        raise ConfigError("; ".join(errors))
+    return services
+
+
+def load_config(path):
+    """Load and validate the service config at path; the built-in defaults if there is no file"""
+    if not os.path.exists(path):
+        logger.info(f"No service config at {path}, using built-in defaults")
+        return parse_config(DEFAULT_CONFIG)
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"cannot read {path}: {str(e)}")
+    return parse_config(data)
+
+
+class ConfigWatcher:
+    """Reloads the service config when the file changes.
+
+    A change is noticed by polling the file's mtime, size and inode, so an
+    editor that replaces the file is picked up as well as one that rewrites
+    it in place. A new config that fails validation, or removal of the
+    file, is logged and ignored; the daemon keeps running with the last good
+    one. The built-in defaults only apply when there is no file at startup.
+    """
+
+    def __init__(self, path, on_change):
+        self.path = path
+        self.on_change = on_change
+        self.signature = None
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def load(self):
+        """Initial load; an invalid config raises so the daemon does not start misconfigured"""
+        self.signature = self._signature()
+        return load_config(self.path)
+
+    def poll(self):
+        """Apply the config again if the file changed since the last load; returns True if it did"""
+        signature = self._signature()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        if signature is None:
+            logger.warning(f"Service config {self.path} was removed, keeping the last good config")
+            return False
+        try:
+            services = load_config(self.path)
+        except ConfigError as e:
+            logger.error(f"Ignoring invalid service config {self.path}: {str(e)}")
+            return False
+        logger.info(f"Service config {self.path} changed, reloading")
+        self.on_change(services)
+        return True
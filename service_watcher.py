@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import ctypes
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+
+logger = logging.getLogger("self-healing")
+
+IN_DELETE = 0x00000200
+IN_MOVED_FROM = 0x00000040
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def read_pidfile(path, proc_root="/proc"):
+    """Return the PID in a pidfile if that process is still alive, else None"""
+    try:
+        with open(path) as f:
+            pid = int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pid if os.path.exists(os.path.join(proc_root, str(pid))) else None
+
+
+class ServiceWatcher:
+    """Wakes the moment a monitored service's main process exits.
+
+    Each service's main PID is held through a pidfd, which becomes readable
+    when the process exits. Where pidfds are unavailable (old kernels,
+    seccomp), the directory holding the service's pidfile in /run is watched
+    with inotify and removal of the pidfile counts as an exit.
+    """
+
+    def __init__(self, on_exit, pidfiles=None):
+        self.on_exit = on_exit
+        self.pidfiles = pidfiles or {}
+        self.epoll = select.epoll()
+        self.lock = threading.Lock()
+        self.pidfds = {}  # fd -> (service, pid)
+        self.watched = {}  # service -> (fd, pid)
+        self.pidfd_supported = hasattr(os, "pidfd_open")
+        self.inotify_fd = None
+        self.dir_watches = {}  # wd -> directory
+        self.pidfile_services = {}  # pidfile path -> service
+        self._stop = threading.Event()
+        self.thread = None
+
+    def watch(self, service, pid):
+        """Hold a handle on pid as the main process of service, replacing any previous one"""
+        with self.lock:
+            current = self.watched.get(service)
+            if current and current[1] == pid:
+                return True
+            if current:
+                self._close_pidfd(current[0])
+
+            if self.pidfd_supported:
+                try:
+                    fd = os.pidfd_open(pid)
+                except ProcessLookupError:
+                    return False  # already gone; the next scheduled check will see it
+                except OSError as e:
+                    if e.errno not in (errno.ENOSYS, errno.EPERM):
+                        raise
+                    logger.warning(f"pidfd_open unavailable ({str(e)}), falling back to pidfile watches")
+                    self.pidfd_supported = False
+                else:
+                    self.pidfds[fd] = (service, pid)
+                    self.watched[service] = (fd, pid)
+                    self.epoll.register(fd, select.EPOLLIN)
+                    logger.debug(f"Watching {service} main PID {pid}")
+                    return True
+
+            return self._watch_pidfile(service)
+
+    def unwatch(self, service):
+        """Drop the watch on a service that is no longer monitored"""
+        with self.lock:
+            fd, _ = self.watched.pop(service, (None, None))
+            if fd is not None:
+                self._close_pidfd(fd)
+            for pidfile, owner in list(self.pidfile_services.items()):
+                if owner == service:
+                    del self.pidfile_services[pidfile]
+
+    def _close_pidfd(self, fd):
+        if fd in self.pidfds:
+            self.epoll.unregister(fd)
+            os.close(fd)
+            del self.pidfds[fd]
+
+    def _watch_pidfile(self, service):
+        pidfile = self.pidfiles.get(service)
+        if not pidfile:
+            return False
+        if pidfile in self.pidfile_services:
+            return True
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        if self.inotify_fd is None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                logger.error(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+                return False
+            self.inotify_fd = fd
+            self.epoll.register(fd, select.EPOLLIN)
+
+        directory = os.path.dirname(pidfile)
+        wd = libc.inotify_add_watch(self.inotify_fd, directory.encode(), IN_DELETE | IN_MOVED_FROM)
+        if wd < 0:
+            logger.error(f"Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+            return False
+        self.dir_watches[wd] = directory
+        self.pidfile_services[pidfile] = service
+        self.watched[service] = (None, None)
+        logger.debug(f"Watching pidfile {pidfile} for {service}")
+        return True
+
+    def _handle_pidfd(self, fd):
+        with self.lock:
+            if fd not in self.pidfds:
+                return  # replaced by a newer watch since the event was returned
+            service, pid = self.pidfds[fd]
+            self._close_pidfd(fd)
+            self.watched.pop(service, None)
+        logger.warning(f"Main process {pid} of {service} exited")
+        self.on_exit(service)
+
+    def _handle_inotify(self):
+        try:
+            data = os.read(self.inotify_fd, 4096)
+        except BlockingIOError:
+            return
+        offset = 0
+        exited = []
+        with self.lock:
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b"\0")
+                offset += INOTIFY_EVENT.size + length
+                directory = self.dir_watches.get(wd)
+                if directory is None:
+                    continue
+                service = self.pidfile_services.get(os.path.join(directory, name.decode(errors="replace")))
+                if service:
+                    exited.append(service)
+        for service in exited:
+            logger.warning(f"Pidfile of {service} removed")
+            self.on_exit(service)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                events = self.epoll.poll(1)
+            except InterruptedError:
+                continue
+            for fd, _ in events:
+                try:
+                    if fd == self.inotify_fd:
+                        self._handle_inotify()
+                    elif fd in self.pidfds:
+                        self._handle_pidfd(fd)
+                except Exception as e:
+                    logger.error(f"Error handling service watch event: {str(e)}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="service-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
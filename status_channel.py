@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import select
+import socket
+import threading
+
+logger = logging.getLogger("self-healing")
+
+# Keys that change every tick without meaning anything changed
+VOLATILE_KEYS = {'timestamp'}
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and rename it into place so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class StatusPublisher:
+    """Publishes status changes to subscribers over a Unix domain socket.
+
+    A new subscriber gets a full snapshot, then one delta per change holding
+    only the keys that changed. The JSON file is still written (atomically)
+    for readers that cannot connect.
+    """
+
+    def __init__(self, socket_path, file_path=None, send_timeout=1.0):
+        self.socket_path = socket_path
+        self.file_path = file_path
+        self.send_timeout = send_timeout
+        self.status = {}
+        self.version = 0
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        try:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(self.socket_path)
+            self.server.listen(16)
+        except OSError as e:
+            logger.error(f"Cannot open status socket {self.socket_path}: {str(e)}")
+            self.server = None
+            return False
+        threading.Thread(target=self._accept, name="status-channel", daemon=True).start()
+        return True
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            conn.settimeout(self.send_timeout)
+            with self.lock:
+                snapshot = {'type': 'snapshot', 'version': self.version, 'status': self.status}
+                if self._send(conn, snapshot):
+                    self.subscribers.append(conn)
+
+    def _send(self, conn, message):
+        try:
+            conn.sendall(json.dumps(message).encode() + b"\n")
+            return True
+        except OSError:
+            # Gone or too slow to keep up; it can reconnect for a fresh snapshot
+            conn.close()
+            return False
+
+    def publish(self, status):
+        """Record a new status; returns False if nothing but volatile keys changed"""
+        # Detach from the caller's live dicts so the next comparison sees real changes
+        status = json.loads(json.dumps(status))
+        with self.lock:
+            changed = {key: value for key, value in status.items()
+                       if key not in VOLATILE_KEYS and self.status.get(key) != value}
+            removed = [key for key in self.status if key not in status]
+            if not changed and not removed and self.version:
+                return False
+
+            changed.update({key: status[key] for key in VOLATILE_KEYS if key in status})
+            self.status = status
+            self.version += 1
+            delta = {'type': 'delta', 'version': self.version, 'changed': changed, 'removed': removed}
+            self.subscribers = [conn for conn in self.subscribers if self._send(conn, delta)]
+
+        if self.file_path:
+            write_json_atomic(self.file_path, status)
+        return True
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+
+class StatusSubscriber:
+    """Client side of StatusPublisher: keeps a merged copy of the status up to date"""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.sock = None
+        self.buffer = b""
+        self.status = None
+        self.version = None
+
+    def connect(self):
+        try:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(self.socket_path)
+            return True
+        except OSError:
+            self.close()
+            return False
+
+    def _apply(self, message):
+        if message['type'] == 'snapshot':
+            self.status = message['status']
+        elif self.status is not None:
+            self.status.update(message['changed'])
+            for key in message['removed']:
+                self.status.pop(key, None)
+        self.version = message['version']
+
+    def wait(self, timeout):
+        """Block until at least one update arrives or timeout passes; returns True on update"""
+        if self.sock is None and not self.connect():
+            return False
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            data = self.sock.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self.close()
+            return False
+
+        self.buffer += data
+        updated = False
+        while b"\n" in self.buffer:
+            line, self.buffer = self.buffer.split(b"\n", 1)
+            self._apply(json.loads(line))
+            updated = True
+        return updated
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.buffer = b""
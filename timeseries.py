@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+import logging
+import math
+import mmap
+import os
+import struct
+
+logger = logging.getLogger("self-healing")
+
+MAGIC = b"SNTLTS02"
+HEADER = struct.Struct("<8sIIQI")  # magic, capacity, field count, samples written, offset of the rows
+ALIGN = 64
+
+
+def _row_struct(field_count):
+    # Every row is a timestamp followed by one double per field; NaN means no value
+    return struct.Struct(f"<{field_count + 1}d")
+
+
+def _data_offset(names):
+    # The NUL-separated field names follow the header; the rows start at the next aligned offset after them
+    return (HEADER.size + len(names) + ALIGN) // ALIGN * ALIGN
+
+
+class TimeSeriesWriter:
+    """Fixed-size ring buffer of samples in a memory-mapped file.
+
+    The file holds capacity rows of doubles, so its size never changes and
+    a reader can map it and slice any window without parsing. Changing the
+    field list writes a new file, carrying over the history of the fields
+    both lists share, and renames it into place, so a reader that still
+    maps the old file keeps a consistent view of it.
+    """
+
+    def __init__(self, path, fields, capacity=8640):
+        self.path = path
+        self.fields = list(fields)
+        self.capacity = capacity
+        self.row = _row_struct(len(self.fields))
+        names = "\0".join(self.fields).encode()
+        self.data_offset = _data_offset(names)
+        size = self.data_offset + capacity * self.row.size
+
+        if not self._matches(size, names):
+            self._create(size, names)
+        fd = os.open(path, os.O_RDWR)
+        try:
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.count = HEADER.unpack_from(self.mm)[3]
+
+    def _matches(self, size, names):
+        """Whether the file at path already has this capacity and field list"""
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size != size:
+                    return False
+                header = f.read(self.data_offset)
+        except OSError:
+            return False
+        magic, capacity, field_count, _, data_offset = HEADER.unpack_from(header)
+        return (magic == MAGIC and capacity == self.capacity and field_count == len(self.fields)
+                and data_offset == self.data_offset and header[HEADER.size:].rstrip(b"\0") == names)
+
+    def _create(self, size, names):
+        """Write a ring with the new layout next to the old one, copy its history over and swap it in"""
+        try:
+            with TimeSeriesReader(self.path) as old:
+                history = old.last(self.capacity)
+        except (OSError, ValueError, struct.error):
+            history = {'timestamp': []}
+
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        try:
+            count = len(history['timestamp'])
+            missing = [None] * count
+            columns = [history['timestamp']] + [history.get(field, missing) for field in self.fields]
+            for index, row in enumerate(zip(*columns)):
+                self.row.pack_into(mm, self.data_offset + index * self.row.size,
+                                   *(math.nan if value is None else value for value in row))
+            mm[HEADER.size:HEADER.size + len(names)] = names
+            HEADER.pack_into(mm, 0, MAGIC, self.capacity, len(self.fields), count, self.data_offset)
+            mm.flush()
+        finally:
+            mm.close()
+        os.replace(tmp_path, self.path)
+
+    def append(self, timestamp, values):
+        """Write one sample; fields missing from values are stored as NaN"""
+        row = [timestamp] + [float(values.get(field, math.nan)) for field in self.fields]
+        self.row.pack_into(self.mm, self.data_offset + (self.count % self.capacity) * self.row.size, *row)
+        # Publish the row only after it is fully written
+        self.count += 1
+        HEADER.pack_into(self.mm, 0, MAGIC, self.capacity, len(self.fields), self.count, self.data_offset)
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+
+
+class TimeSeriesReader:
+    """Reads windows out of a TimeSeriesWriter file without copying the whole ring"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.capacity, field_count, _, self.data_offset = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a time series file")
+        names = self.mm[HEADER.size:self.data_offset].rstrip(b"\0").decode()
+        self.fields = names.split("\0") if names else []
+        self.row = _row_struct(field_count)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _bounds(self):
+        count = HEADER.unpack_from(self.mm)[3]
+        return max(0, count - self.capacity), count
+
+    def _timestamp(self, index):
+        return struct.unpack_from("<d", self.mm, self.data_offset + (index % self.capacity) * self.row.size)[0]
+
+    def _rows(self, start, end):
+        columns = {field: [] for field in ["timestamp"] + self.fields}
+        names = list(columns)
+        for index in range(start, end):
+            values = self.row.unpack_from(self.mm, self.data_offset + (index % self.capacity) * self.row.size)
+            for name, value in zip(names, values):
+                columns[name].append(None if math.isnan(value) else value)
+        return columns
+
+    def last(self, n):
+        """The most recent n samples, as {field: [values]} with 'timestamp' first"""
+        first, count = self._bounds()
+        return self._rows(max(first, count - n), count)
+
+    def since(self, timestamp):
+        """Samples newer than timestamp; binary search for the start, then O(window) reads"""
+        low, high = self._bounds()
+        count = high
+        while low < high:
+            mid = (low + high) // 2
+            if self._timestamp(mid) <= timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return self._rows(low, count)
+
+    def close(self):
+        self.mm.close()